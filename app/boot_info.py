@@ -0,0 +1,94 @@
+"""主机启动信息模块
+
+从 /proc 读取内核的启动 ID（每次主机启动随机生成）和启动时间（/proc/stat
+中的 btime），启动检查与上次运行时保存的启动 ID 比较即可确定：
+
+- 启动 ID 相同：主机没有重启，只是容器或服务重启，不可能是断电
+- 启动 ID 不同：主机重启过，真实的通电时间是内核启动时间，而不是启动检查
+  运行的时间（后者还包含 BIOS、内核和 Docker 的启动耗时）
+
+两个值在一次启动内不会变化，每个进程只读取一次。上次的启动 ID 单独保存，
+心跳文件仍然只包含时间戳，旧版本和测试工具可以继续读取。
+"""
+
+import os
+from functools import lru_cache
+
+PROC_BOOT_ID = "/proc/sys/kernel/random/boot_id"
+PROC_STAT = "/proc/stat"
+BOOT_ID_STATE_FILE = os.getenv("BOOT_ID_STATE_FILE", "/data/boot_id")
+
+
+@lru_cache(maxsize=None)
+def boot_id():
+    """当前主机的启动 ID
+
+    Returns:
+        str 或 None: 非 Linux 或无法读取时返回 None
+    """
+    try:
+        with open(PROC_BOOT_ID, 'r') as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def boot_time():
+    """内核启动时间（Unix 时间戳）
+
+    Returns:
+        int 或 None: 非 Linux 或无法读取时返回 None
+    """
+    try:
+        with open(PROC_STAT, 'r') as f:
+            for line in f:
+                if line.startswith("btime "):
+                    return int(line.split()[1])
+    except (IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_stored_boot_id(path=None):
+    """读取上次运行时保存的启动 ID
+
+    Returns:
+        str 或 None: 没有保存过时返回 None
+    """
+    try:
+        with open(path or BOOT_ID_STATE_FILE, 'r') as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
+
+
+def store_boot_id(path=None):
+    """保存当前的启动 ID（心跳进程启动时调用，内容不变时不写入）
+
+    Returns:
+        bool: 写入了新的启动 ID 返回 True
+    """
+    current = boot_id()
+    path = path or BOOT_ID_STATE_FILE
+    if current is None or read_stored_boot_id(path) == current:
+        return False
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(current)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return True
+
+
+def host_rebooted(stored_boot_id=None):
+    """与上次保存的启动 ID 比较，判断主机是否重启过
+
+    Returns:
+        bool 或 None: 无法判断（没有保存过或无法读取当前启动 ID）时返回 None
+    """
+    current = boot_id()
+    if stored_boot_id is None or current is None:
+        return None
+    return stored_boot_id != current
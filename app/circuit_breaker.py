@@ -0,0 +1,175 @@
+"""熔断器模块
+
+Resend 持续失败（服务故障、API Key 被吊销等）时打开熔断器，发送请求
+立即失败而不再阻塞等待；冷却时间过后只放行一个探测请求（半开状态），
+成功则关闭熔断器，失败则重新打开。
+
+状态保存在数据目录的 JSON 文件中，main.py 和 heartbeat.py 共享，
+重启后仍然有效。
+"""
+
+import os
+import copy
+import json
+import time
+from file_lock import file_lock
+from logger_config import get_logger
+
+logger = get_logger("circuit_breaker")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 状态在指标中的数值
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时拒绝发送"""
+
+
+class CircuitBreaker:
+    """持久化的三态熔断器"""
+
+    def __init__(self, state_file, failure_threshold=5, cooldown=300):
+        """
+        初始化熔断器
+
+        Args:
+            state_file: 状态文件路径（为空则只保存在内存中）
+            failure_threshold: 连续失败多少次后打开熔断器
+            cooldown: 打开后等待多少秒再放行探测请求
+        """
+        self.state_file = state_file
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._memory_state = self._default_state()
+
+    @staticmethod
+    def _default_state():
+        return {
+            "state": STATE_CLOSED,
+            "failures": 0,
+            "opened_at": 0,
+            "probe_started_at": 0,
+            "transitions": {},
+        }
+
+    def _read(self):
+        """读取状态（调用方负责加锁）"""
+        if not self.state_file:
+            return self._memory_state
+        if not os.path.isfile(self.state_file):
+            return self._default_state()
+        try:
+            with open(self.state_file, 'r') as f:
+                return dict(self._default_state(), **json.load(f))
+        except (json.JSONDecodeError, IOError):
+            return self._default_state()
+
+    def _write(self, state):
+        """写入状态（调用方负责加锁）"""
+        if not self.state_file:
+            self._memory_state = state
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except (IOError, OSError) as e:
+            logger.error(f"保存熔断器状态失败: {e}")
+
+    def _update(self, func):
+        """在锁内读取-修改-写入状态（状态没有变化时不写文件）"""
+        if not self.state_file:
+            return func(self._memory_state)
+        with file_lock(self.state_file):
+            state = self._read()
+            before = copy.deepcopy(state)
+            result = func(state)
+            if state != before:
+                self._write(state)
+            return result
+
+    @staticmethod
+    def _transition(state, new_state, now):
+        """切换状态并累计切换次数"""
+        if state["state"] == new_state:
+            return
+        logger.warning(f"熔断器状态变化: {state['state']} -> {new_state}")
+        state["state"] = new_state
+        transitions = state.setdefault("transitions", {})
+        transitions[new_state] = transitions.get(new_state, 0) + 1
+        if new_state == STATE_OPEN:
+            state["opened_at"] = now
+        if new_state == STATE_HALF_OPEN:
+            state["probe_started_at"] = now
+
+    def allow_request(self, now=None):
+        """是否允许发送
+
+        Returns:
+            bool: 关闭状态允许；打开状态在冷却结束后切换为半开并只放行一个探测请求
+        """
+        now = time.time() if now is None else now
+
+        def decide(state):
+            if state["state"] == STATE_CLOSED:
+                return True
+            if state["state"] == STATE_OPEN:
+                if now - state["opened_at"] >= self.cooldown:
+                    self._transition(state, STATE_HALF_OPEN, now)
+                    return True
+                return False
+            # 半开：已有探测请求在进行中时拒绝；探测请求长时间无结果（进程崩溃）时重新放行
+            if now - state["probe_started_at"] >= self.cooldown:
+                state["probe_started_at"] = now
+                return True
+            return False
+
+        return self._update(decide)
+
+    def is_rejecting(self, now=None):
+        """当前是否会拒绝发送（只读取状态，不切换为半开，也不占用探测名额）"""
+        now = time.time() if now is None else now
+        state = self.snapshot()
+        if state["state"] == STATE_OPEN:
+            return now - state["opened_at"] < self.cooldown
+        if state["state"] == STATE_HALF_OPEN:
+            return now - state["probe_started_at"] < self.cooldown
+        return False
+
+    def record_success(self, now=None):
+        """记录一次成功发送，关闭熔断器"""
+        now = time.time() if now is None else now
+
+        def apply(state):
+            state["failures"] = 0
+            self._transition(state, STATE_CLOSED, now)
+
+        self._update(apply)
+
+    def record_failure(self, now=None):
+        """记录一次失败发送，达到阈值或探测失败时打开熔断器"""
+        now = time.time() if now is None else now
+
+        def apply(state):
+            state["failures"] += 1
+            if state["state"] == STATE_HALF_OPEN or state["failures"] >= self.failure_threshold:
+                self._transition(state, STATE_OPEN, now)
+                state["opened_at"] = now
+
+        self._update(apply)
+
+    def snapshot(self):
+        """返回当前状态（用于指标导出）"""
+        if not self.state_file:
+            return dict(self._memory_state)
+        try:
+            with file_lock(self.state_file):
+                return self._read()
+        except (IOError, TimeoutError):
+            return self._default_state()
@@ -0,0 +1,278 @@
+"""监控守护进程
+
+容器的唯一入口：启动时先执行一次断电检测（main.main），之后在同一个
+asyncio 事件循环中以独立任务运行各子系统，每个任务有自己的周期：
+
+- heartbeat：按 HEARTBEAT_INTERVAL 交替写入心跳文件，使用独立的单线程执行器，
+  不受网络探测占满线程池和邮件发送耗时的影响（心跳间隔变长会在下次启动时
+  被误判为断电）
+- probe：并发探测 DNS、内网和外网并保存网络状态（--watch 时同时检查状态
+  变化，变化通知加入队列由 sender 任务发送）；外网中断期间按
+  RECOVERY_PROBE_INTERVAL 快速探测恢复
+- sender：被唤醒（探测结果、唤醒套接字、队列文件变化）或空闲超时时发送
+  待处理通知，使用独立的单线程执行器，Resend API 的延迟不占用探测线程
+- metrics：导出发送指标
+- housekeeping：检查磁盘空间并在空间紧张时降载
+
+ping、文件读写和 HTTP 请求等阻塞操作都在线程池中执行，某个任务异常或
+变慢不会阻塞其他任务；任务异常退出后记录日志并在稍后重启。
+
+启动时保存主机的启动 ID（见 boot_info）并写入 running 停止标记，收到
+SIGTERM / SIGINT 时立即改写为 clean 标记（之后才停止任务：等待正在发送的
+邮件可能超过 docker stop 的宽限时间，被 SIGKILL 时标记已经写好），下次启动
+检查据此区分正常重启和异常断电（见 shutdown_marker）。
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import heartbeat
+import main as boot_check
+import email_sender
+import metrics
+import state_store
+import notification_queue
+import shutdown_marker
+import boot_info
+import logger_config
+from disk_monitor import DISK_SAMPLE_INTERVAL
+from sender_worker import WakeListener
+from file_watcher import FileWatcher
+from logger_config import get_logger
+
+logger = get_logger("daemon")
+
+# 任务异常退出后重启前等待的秒数
+TASK_RESTART_DELAY = 5
+# 探测使用的线程数（DNS、内网、外网并发）
+PROBE_WORKERS = 4
+
+
+class Daemon:
+    """在一个事件循环中运行所有子系统"""
+
+    def __init__(self, heartbeat_interval=None, probe_interval=None, watch_network=False):
+        """
+        初始化守护进程
+
+        Args:
+            heartbeat_interval: 心跳文件写入间隔（默认 HEARTBEAT_INTERVAL）
+            probe_interval: 网络探测间隔（默认 HEARTBEAT_INTERVAL）
+            watch_network: 每次探测后检查网络状态变化（相当于 main.py --watch）
+        """
+        self.heartbeat_interval = heartbeat_interval or heartbeat.HEARTBEAT_INTERVAL
+        self.probe_interval = probe_interval or heartbeat.HEARTBEAT_INTERVAL
+        self.watch_network = watch_network
+        self.network_status = None
+        self._loop = None
+        self._stopping = None
+        self._wake = None
+        self._stop_reason = None
+        self._io_executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="daemon-io")
+        self._send_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-send")
+        self._heartbeat_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-heartbeat")
+        self._threads = []
+
+    async def _run(self, func, *args, executor=None):
+        """在线程池中执行阻塞函数"""
+        return await self._loop.run_in_executor(executor or self._io_executor, func, *args)
+
+    async def _sleep(self, seconds):
+        """等待指定秒数
+
+        Returns:
+            bool: 等待期间收到停止请求返回 True
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=max(seconds, 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def wake_sender(self):
+        """唤醒发送任务（可在其他线程中调用）"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def stop(self, reason="stop"):
+        """请求停止所有任务
+
+        Args:
+            reason: 停止原因（信号名），写入停止标记
+        """
+        if self._stop_reason is None:
+            self._stop_reason = reason
+            logger.info(f"收到停止请求（{reason}），正在停止任务")
+            # 先写标记再停止任务：停止过程超过宽限时间被 SIGKILL 时不会误判为断电
+            try:
+                shutdown_marker.mark_clean(reason)
+            except OSError as e:
+                logger.error(f"写入停止标记失败: {e}")
+        self._stopping.set()
+        self._wake.set()
+
+    async def heartbeat_task(self):
+        """交替写入两个心跳文件"""
+        use_file_a = True
+        while not self._stopping.is_set():
+            target_file = heartbeat.HEARTBEAT_FILE_A if use_file_a else heartbeat.HEARTBEAT_FILE_B
+            try:
+                await self._run(heartbeat.write_heartbeat, target_file, executor=self._heartbeat_executor)
+            except OSError as e:
+                logger.error(f"心跳错误：写入心跳文件失败: {e}")
+            use_file_a = not use_file_a
+            if await self._sleep(self.heartbeat_interval):
+                return
+
+    async def _probe_once(self):
+        """完整探测一次网络，保存状态并唤醒发送任务"""
+        probe_started = time.monotonic()
+        status = await heartbeat.check_network_connectivity_async(self._io_executor)
+        await self._run(heartbeat.save_network_status, status)
+        self.network_status = status
+        logger.info(f"网络状态: 内网: {'正常' if status['internal_network'] else '异常'} - "
+                    f"外网: {'正常' if status['external_network'] else '异常'}",
+                    extra={
+                        "phase": "probe",
+                        "duration_ms": int((time.monotonic() - probe_started) * 1000),
+                        "internal_network": status["internal_network"],
+                        "external_network": status["external_network"],
+                    })
+        if self.watch_network:
+            # 只入队不发送：Resend API 的延迟不占用探测线程
+            await self._run(boot_check.check_network_status_changes, False)
+        self.wake_sender()
+        return status
+
+    async def probe_task(self):
+        """周期性探测网络；外网中断期间快速探测恢复"""
+        while not self._stopping.is_set():
+            deadline = time.monotonic() + self.probe_interval
+            status = await self._probe_once()
+
+            if not status["external_network"] and heartbeat.RECOVERY_PROBE_INTERVAL > 0:
+                while time.monotonic() < deadline:
+                    interval = min(heartbeat.RECOVERY_PROBE_INTERVAL, deadline - time.monotonic())
+                    if await self._sleep(interval):
+                        return
+                    if await self._run(heartbeat.probe_external_network):
+                        logger.info("外网已恢复，立即重新探测")
+                        break
+                continue
+
+            if await self._sleep(deadline - time.monotonic()):
+                return
+
+    async def sender_task(self):
+        """被唤醒或空闲超时时发送待处理通知"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.probe_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping.is_set():
+                return
+            if self.network_status is None:
+                continue
+            await self._run(heartbeat.check_and_send_pending_notifications, self.network_status,
+                            executor=self._send_executor)
+
+    async def metrics_task(self):
+        """导出发送指标"""
+        while not self._stopping.is_set():
+            await self._run(email_sender.export_metrics)
+            await self._run(metrics.write_textfile)
+            if await self._sleep(self.heartbeat_interval):
+                return
+
+    async def housekeeping_task(self):
+        """检查磁盘空间，空间紧张时降载"""
+        while not self._stopping.is_set():
+            await self._run(heartbeat.check_disk_pressure)
+            if await self._sleep(DISK_SAMPLE_INTERVAL):
+                return
+
+    async def _supervise(self, name, task_func):
+        """运行任务，异常退出后记录日志并重启"""
+        while not self._stopping.is_set():
+            try:
+                await task_func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"任务 {name} 异常退出，{TASK_RESTART_DELAY} 秒后重启: {e}", extra={"task": name})
+                if await self._sleep(TASK_RESTART_DELAY):
+                    return
+
+    def _start_threads(self):
+        """启动唤醒套接字和队列文件监听线程"""
+        wake_listener = WakeListener(self.wake_sender)
+        if wake_listener.bind():
+            wake_listener.start()
+            self._threads.append(wake_listener)
+        if state_store.STATE_BACKEND == "file":
+            # 发送时压缩队列文件是本进程的写入，不再唤醒自己（本进程入队时另行唤醒）
+            queue_watcher = FileWatcher([heartbeat.PENDING_NOTIFICATIONS_FILE], lambda path: self.wake_sender(),
+                                        ignore=notification_queue.written_by_this_process)
+            queue_watcher.start()
+            self._threads.append(queue_watcher)
+
+    async def run(self):
+        """运行直到收到 SIGTERM / SIGINT"""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._wake = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self._loop.add_signal_handler(sig, self.stop, sig.name)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Windows 或非主线程
+
+        try:
+            shutdown_marker.mark_running()
+            boot_info.store_boot_id()
+        except OSError as e:
+            logger.error(f"写入停止标记或启动 ID 失败: {e}")
+
+        self._start_threads()
+        tasks = [
+            asyncio.ensure_future(self._supervise(name, func))
+            for name, func in (
+                ("heartbeat", self.heartbeat_task),
+                ("probe", self.probe_task),
+                ("sender", self.sender_task),
+                ("metrics", self.metrics_task),
+                ("housekeeping", self.housekeeping_task),
+            )
+        ]
+        logger.info("--- 守护进程已启动 ---")
+        try:
+            await self._stopping.wait()
+            # 给正在进行的操作一点时间完成，之后取消
+            done, pending = await asyncio.wait(tasks, timeout=10)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            for thread in self._threads:
+                thread.stop(timeout=2)
+            self._io_executor.shutdown(wait=False)
+            self._heartbeat_executor.shutdown(wait=False)
+            self._send_executor.shutdown(wait=True)
+            logger.info("--- 守护进程已停止 ---")
+
+
+def run(watch_network=False):
+    """启动检查（读取上次运行的心跳文件）后运行守护进程"""
+    boot_check.main()
+    asyncio.run(Daemon(watch_network=watch_network).run())
+
+
+if __name__ == "__main__":
+    logger_config.setup_logging()
+    os.makedirs("/data", exist_ok=True)
+    run(watch_network="--watch" in sys.argv[1:])
@@ -1,10 +1,22 @@
 """磁盘监控模块
 
-提供磁盘空间监控功能
+提供磁盘空间监控功能。
+
+DiskMonitor 在心跳进程中持续采样剩余空间（结果缓存，不会每次调用都访问
+文件系统），剩余空间低于 DISK_LOW_MB 时进入空间紧张状态，回升到
+DISK_RECOVER_MB 以上才解除（避免在阈值附近反复切换），每次进入只告警一次。
 """
 
 import os
+import time
 import shutil
+from logger_config import get_logger
+
+logger = get_logger("disk_monitor")
+
+DISK_LOW_MB = int(os.getenv("DISK_LOW_MB", 100))  # 低于此值进入空间紧张状态
+DISK_RECOVER_MB = int(os.getenv("DISK_RECOVER_MB", 150))  # 高于此值解除空间紧张状态
+DISK_SAMPLE_INTERVAL = int(os.getenv("DISK_SAMPLE_INTERVAL", 60))  # 采样间隔（秒）
 
 
 def check_disk_space(path="/data", min_free_mb=100):
@@ -29,7 +41,7 @@ def check_disk_space(path="/data", min_free_mb=100):
         
         return has_enough, total_gb, used_gb, free_gb, free_mb
     except Exception as e:
-        print(f"检查磁盘空间失败: {e}")
+        logger.error(f"检查磁盘空间失败: {e}")
         return False, 0, 0, 0, 0
 
 
@@ -51,4 +63,80 @@ def get_disk_usage_str(path="/data"):
         
         return f"{used_gb:.1f}GB / {total_gb:.1f}GB ({percent:.1f}%), 剩余 {free_gb:.1f}GB"
     except Exception as e:
-        return f"无法获取磁盘使用情况: {e}"
\ No newline at end of file
+        return f"无法获取磁盘使用情况: {e}"
+
+
+def _free_bytes(path):
+    """读取剩余空间（字节）"""
+    if hasattr(os, "statvfs"):
+        stat = os.statvfs(path)
+        return stat.f_bavail * stat.f_frsize
+    return shutil.disk_usage(path).free
+
+
+class DiskMonitor:
+    """带缓存和滞后阈值的磁盘空间监控"""
+
+    def __init__(self, path="/data", low_mb=None, recover_mb=None, sample_interval=None):
+        """
+        初始化监控器
+
+        Args:
+            path: 要监控的路径
+            low_mb: 低于此值（MB）进入空间紧张状态
+            recover_mb: 高于此值（MB）解除空间紧张状态
+            sample_interval: 采样间隔（秒），间隔内返回缓存结果
+        """
+        self.path = path
+        self.low_mb = DISK_LOW_MB if low_mb is None else low_mb
+        self.recover_mb = max(DISK_RECOVER_MB if recover_mb is None else recover_mb, self.low_mb)
+        self.sample_interval = DISK_SAMPLE_INTERVAL if sample_interval is None else sample_interval
+        self.free_mb = None
+        self.under_pressure = False
+        self._sampled_at = None
+
+    def sample(self, now=None):
+        """采样剩余空间（采样间隔内返回缓存结果）
+
+        Returns:
+            float 或 None: 剩余空间（MB），读取失败时返回 None
+        """
+        now = time.monotonic() if now is None else now
+        if self._sampled_at is not None and now - self._sampled_at < self.sample_interval:
+            return self.free_mb
+        self._sampled_at = now
+        try:
+            self.free_mb = _free_bytes(self.path) / (1024**2)
+        except OSError as e:
+            logger.error(f"检查磁盘空间失败: {e}")
+            self.free_mb = None
+        return self.free_mb
+
+    def check(self, now=None):
+        """采样并更新空间紧张状态
+
+        Returns:
+            str 或 None: "entered" 刚进入空间紧张状态，"exited" 刚解除，其余情况为 None
+        """
+        free_mb = self.sample(now)
+        if free_mb is None:
+            return None
+        if not self.under_pressure and free_mb < self.low_mb:
+            self.under_pressure = True
+            logger.warning(f"警告：磁盘空间不足（剩余 {free_mb:.1f}MB < {self.low_mb}MB），开始降载",
+                           extra={"phase": "disk", "free_mb": round(free_mb, 1)})
+            return "entered"
+        if self.under_pressure and free_mb > self.recover_mb:
+            self.under_pressure = False
+            logger.info(f"磁盘空间已恢复（剩余 {free_mb:.1f}MB），解除降载",
+                        extra={"phase": "disk", "free_mb": round(free_mb, 1)})
+            return "exited"
+        return None
+
+
+def is_under_pressure(path="/data"):
+    """单次检查剩余空间是否低于 DISK_LOW_MB（供没有常驻监控器的进程使用）"""
+    try:
+        return _free_bytes(path) / (1024**2) < DISK_LOW_MB
+    except OSError:
+        return False
@@ -0,0 +1,134 @@
+"""DNS 缓存模块
+
+为主机名形式的网络检测目标提供带 TTL 和负缓存的解析结果缓存，
+让 ping 探测直接使用缓存的 IP，避免 DNS 延迟和故障影响连通性判断。
+缓存会持久化到数据目录，重启后第一次探测无需等待 DNS。
+"""
+
+import os
+import json
+import time
+import socket
+import ipaddress
+from logger_config import get_logger
+
+logger = get_logger("dns_cache")
+
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", 300))  # 解析成功结果的有效期（秒）
+DNS_NEGATIVE_TTL = int(os.getenv("DNS_NEGATIVE_TTL", 60))  # 解析失败结果的有效期（秒）
+
+
+def is_ip_address(host):
+    """判断目标是否已经是 IP 地址"""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """带 TTL、负缓存和持久化的解析结果缓存"""
+
+    def __init__(self, cache_file=None, ttl=DNS_CACHE_TTL, negative_ttl=DNS_NEGATIVE_TTL):
+        """
+        初始化 DNS 缓存
+
+        Args:
+            cache_file: 持久化文件路径（为空则不持久化）
+            ttl: 解析成功结果的有效期（秒）
+            negative_ttl: 解析失败结果的有效期（秒）
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = {}  # host -> {"addr": str 或 None, "expires": float}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """从持久化文件加载缓存（过期条目保留，作为过期可用的地址）"""
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                self._entries = entries
+        except (json.JSONDecodeError, IOError):
+            self._entries = {}
+
+    def save(self):
+        """将缓存写入持久化文件（仅在有变化时写入）"""
+        if not self.cache_file or not self._dirty:
+            return
+        tmp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_file)
+            self._dirty = False
+        except IOError as e:
+            logger.error(f"保存 DNS 缓存失败: {e}")
+
+    def update(self, host, addr, now=None):
+        """记录一次解析结果
+
+        Args:
+            host: 主机名
+            addr: 解析得到的 IP，失败时为 None
+        """
+        now = time.time() if now is None else now
+        previous = self._entries.get(host)
+        if addr is None and previous and previous.get("addr"):
+            # 解析失败时保留上一次成功的地址，只缩短下一次重试的时间
+            entry = {"addr": previous["addr"], "expires": now + self.negative_ttl}
+        else:
+            entry = {"addr": addr, "expires": now + (self.ttl if addr else self.negative_ttl)}
+        self._entries[host] = entry
+        self._dirty = True
+
+    def resolve(self, host, now=None):
+        """解析主机名（未过期时直接返回缓存结果）
+
+        Returns:
+            str: IP 地址，无法解析时返回 None
+        """
+        if is_ip_address(host):
+            return host
+        now = time.time() if now is None else now
+        entry = self._entries.get(host)
+        if entry and entry["expires"] > now:
+            return entry["addr"]
+
+        try:
+            addr = socket.gethostbyname(host)
+        except (OSError, UnicodeError):
+            addr = None
+        self.update(host, addr, now)
+        return self._entries[host]["addr"]
+
+    def probe_address(self, host):
+        """获取探测使用的地址
+
+        有缓存（即使已过期）时直接返回，不等待 DNS；只有从未解析过的主机名才同步解析。
+
+        Returns:
+            str: IP 地址，无法解析时返回 None
+        """
+        if is_ip_address(host):
+            return host
+        entry = self._entries.get(host)
+        if entry is not None:
+            return entry["addr"]
+        return self.resolve(host)
+
+    def refresh_stale(self, hosts, now=None):
+        """刷新已过期的条目（在探测结果确定之后调用）"""
+        now = time.time() if now is None else now
+        for host in hosts:
+            if is_ip_address(host):
+                continue
+            entry = self._entries.get(host)
+            if entry is None or entry["expires"] <= now:
+                self.resolve(host, now)
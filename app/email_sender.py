@@ -0,0 +1,171 @@
+"""邮件发送模块
+
+main.py 和 heartbeat.py 共用的 Resend 发送路径，统一处理限速、重试和熔断。
+"""
+
+import os
+import metrics
+import time
+from retry_utils import (retry_with_deadline, classify_error, get_status_code, get_retry_after,
+                         ERROR_PERMANENT)
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_VALUES
+from rate_limiter import TokenBucket, RateLimitExceeded
+from logger_config import get_logger
+
+logger = get_logger("email_sender")
+
+CIRCUIT_BREAKER_FILE = os.getenv("CIRCUIT_BREAKER_FILE", "/data/circuit_breaker.json")
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))  # 连续失败多少次后熔断
+CIRCUIT_COOLDOWN = int(os.getenv("CIRCUIT_COOLDOWN", 300))  # 熔断后多少秒放行探测请求
+SEND_RETRY_BUDGET = float(os.getenv("SEND_RETRY_BUDGET", 30))  # 单封邮件重试的总时间预算（秒）
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_MAX_ATTEMPTS", 4))  # 单封邮件最多尝试次数
+RATE_LIMITER_FILE = os.getenv("RATE_LIMITER_FILE", "/data/rate_limiter.json")
+SEND_RATE = float(os.getenv("SEND_RATE", 2))  # 每秒最多调用 API 次数（Resend 默认限制为 2 次/秒）
+SEND_BURST = float(os.getenv("SEND_BURST", 2))  # 允许的突发调用次数
+SEND_MIN_RATE = float(os.getenv("SEND_MIN_RATE", 0.1))  # 收到 429 后速率下调的下限
+
+# 只与单封邮件有关的错误（收件人无效等），说明 Resend 服务本身可用，不计入熔断
+ITEM_ERROR_TYPES = ('ValidationError', 'MissingRequiredFieldsError')
+
+_circuit_breaker = None
+_rate_limiter = None
+
+
+def get_circuit_breaker():
+    """获取共享的熔断器"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            CIRCUIT_BREAKER_FILE,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            cooldown=CIRCUIT_COOLDOWN
+        )
+    return _circuit_breaker
+
+
+def get_rate_limiter():
+    """获取共享的令牌桶"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket(
+            RATE_LIMITER_FILE,
+            rate=SEND_RATE,
+            burst=SEND_BURST,
+            min_rate=SEND_MIN_RATE
+        )
+    return _rate_limiter
+
+
+def _is_rate_limited(exception):
+    """是否为 Resend 返回的 429 限流错误"""
+    return type(exception).__name__ == 'RateLimitError' or get_status_code(exception) == 429
+
+
+def _classify(exception):
+    """本地限速超时不在本轮内重试，其余按 classify_error 分类"""
+    if isinstance(exception, RateLimitExceeded):
+        return ERROR_PERMANENT
+    return classify_error(exception)
+
+
+def deliver(api_key, sender, recipient, subject, html_body, idempotency_key=None):
+    """通过 Resend 发送一封邮件（带限速、重试和熔断）
+
+    Args:
+        api_key: Resend API Key
+        sender: 发件人地址
+        recipient: 收件人地址
+        subject: 邮件主题
+        html_body: 邮件正文
+        idempotency_key: Resend 幂等键，同一个键的重复请求只会发送一封邮件
+
+    Returns:
+        dict: Resend 返回的结果
+
+    Raises:
+        CircuitOpenError: 熔断器打开，未调用 API
+        RateLimitExceeded: 在时间预算内没有取得发送令牌
+        Exception: 所有重试均失败时的最后一个异常
+    """
+    breaker = get_circuit_breaker()
+    if not breaker.allow_request():
+        metrics.inc("email_send_rejected_total", reason="circuit_open")
+        raise CircuitOpenError("熔断器已打开，暂停调用 Resend API")
+
+    limiter = get_rate_limiter()
+    deadline = time.monotonic() + SEND_RETRY_BUDGET
+
+    def send_email():
+        """实际的发送邮件函数（每次调用 API 前先取得令牌）"""
+        import resend
+        limiter.acquire(timeout=max(deadline - time.monotonic(), 0))
+        resend.api_key = api_key
+        params = {
+            "from": sender,
+            "to": [recipient],
+            "subject": subject,
+            "html": html_body,
+        }
+        try:
+            if idempotency_key:
+                email = resend.Emails.send(params, {"idempotency_key": idempotency_key})
+            else:
+                email = resend.Emails.send(params)
+        except Exception as e:
+            if _is_rate_limited(e):
+                limiter.on_rate_limited(get_retry_after(e))
+                metrics.inc("email_rate_limited_total")
+            raise
+        logger.info(f"邮件已通过 Resend 发送成功！ Email ID: {email['id']}")
+        return email
+
+    try:
+        # 在总时间预算内重试（full jitter，遵循 Retry-After）；永久错误不重试
+        email = retry_with_deadline(
+            send_email,
+            max_attempts=SEND_MAX_ATTEMPTS,
+            budget=SEND_RETRY_BUDGET,
+            base_delay=1,
+            classify=_classify,
+        )
+    except RateLimitExceeded:
+        # 本地限速未调用 API，不影响熔断器
+        metrics.inc("email_send_rejected_total", reason="rate_limited")
+        raise
+    except Exception as e:
+        # 限流（429）同样说明服务可用，由令牌桶降速处理，不打开熔断器
+        if type(e).__name__ in ITEM_ERROR_TYPES or _is_rate_limited(e):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        metrics.inc("emails_failed_total", error=type(e).__name__)
+        raise
+
+    breaker.record_success()
+    limiter.on_success()
+    metrics.inc("emails_sent_total")
+    return email
+
+
+def send_paused():
+    """熔断器打开或 Retry-After 暂停超出重试预算时返回原因，否则返回 None
+
+    只读取共享状态：发送方据此在取出通知前停止本轮发送，不占用半开探测名额和令牌。
+    """
+    if get_circuit_breaker().is_rejecting():
+        return "熔断器已打开，暂停调用 Resend API"
+    blocked_for = get_rate_limiter().blocked_for()
+    if blocked_for > SEND_RETRY_BUDGET:
+        return f"发送限速：还需暂停 {blocked_for:.1f} 秒"
+    return None
+
+
+def export_metrics():
+    """将共享熔断器的状态写入指标（包括其他进程触发的状态变化）"""
+    state = get_circuit_breaker().snapshot()
+    metrics.set_gauge("circuit_breaker_state", STATE_VALUES.get(state["state"], 0))
+    metrics.set_gauge("circuit_breaker_consecutive_failures", state["failures"])
+    for to_state, count in state.get("transitions", {}).items():
+        metrics.set_gauge("circuit_breaker_transitions", count, to_state=to_state)
+    limit = get_rate_limiter().snapshot()
+    metrics.set_gauge("send_rate_limit", limit["rate"])
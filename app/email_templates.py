@@ -0,0 +1,166 @@
+"""邮件模板模块
+
+邮件正文模板保存在 templates/<locale>/<template_id>.html 中，首次使用时
+加载并编译为缓存的渲染函数，变量值通过 escape_html 自动转义。
+"""
+
+import os
+from datetime import datetime
+from functools import lru_cache
+from html_utils import compile_template, SafeHtml
+from notification_queue import body_of
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+DEFAULT_LOCALE = "zh_CN"
+EMAIL_LOCALE = os.getenv("EMAIL_LOCALE", DEFAULT_LOCALE)
+
+# 邮件主题（纯文本，不做 HTML 转义）
+SUBJECTS = {
+    "zh_CN": {
+        "power_outage": "[断电警报] 服务器 {server_name} 发生异常断电",
+        "network_status": "[网络状态] 服务器 {server_name} 网络连接变化",
+        "outage_incident": "[断电警报] {host_count} 台服务器发生异常断电（站点级事件）",
+    },
+    "en": {
+        "power_outage": "[Power Outage] Server {server_name} lost power unexpectedly",
+        "network_status": "[Network Status] Server {server_name} connectivity changed",
+        "outage_incident": "[Power Outage] {host_count} servers lost power (site-wide incident)",
+    },
+}
+
+# 模板中使用的状态文字
+LABELS = {
+    "zh_CN": {"up": "正常", "down": "中断", "dns_ok": "正常", "dns_fail": "异常",
+              "unclean_shutdown": "异常停止（没有正常停止记录）",
+              "unknown": "按心跳间隔判断",
+              "duration": "{h:02d} 小时 {m:02d} 分钟 {s:02d} 秒"},
+    "en": {"up": "Up", "down": "Down", "dns_ok": "OK", "dns_fail": "Failed",
+           "unclean_shutdown": "Unclean stop (no clean-shutdown record)",
+           "unknown": "Inferred from heartbeat gap",
+           "duration": "{h:02d} h {m:02d} min {s:02d} s"},
+}
+
+
+def _resolve_locale(locale):
+    """返回可用的语言，不支持时回退到默认语言"""
+    locale = locale or EMAIL_LOCALE
+    return locale if locale in SUBJECTS else DEFAULT_LOCALE
+
+
+@lru_cache(maxsize=None)
+def _load_body_renderer(template_id, locale):
+    """加载并编译正文模板（每个模板只读取一次文件）"""
+    path = os.path.join(TEMPLATE_DIR, locale, f"{template_id}.html")
+    if not os.path.isfile(path) and locale != DEFAULT_LOCALE:
+        path = os.path.join(TEMPLATE_DIR, DEFAULT_LOCALE, f"{template_id}.html")
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_template(f.read())
+
+
+def labels(locale=None):
+    """获取指定语言的状态文字"""
+    return LABELS[_resolve_locale(locale)]
+
+
+def render_subject(template_id, locale=None, **values):
+    """渲染邮件主题"""
+    locale = _resolve_locale(locale)
+    return compile_template(SUBJECTS[locale][template_id], escape=False)(**values)
+
+
+def render_body(template_id, locale=None, **values):
+    """渲染邮件正文，变量值自动转义
+
+    已渲染的 HTML 片段（如表格行）需包装为 SafeHtml 传入。
+    """
+    return _load_body_renderer(template_id, _resolve_locale(locale))(**values)
+
+
+def render(template_id, locale=None, **values):
+    """渲染邮件主题和正文
+
+    Returns:
+        (subject, html_body)
+    """
+    return (render_subject(template_id, locale, **values),
+            render_body(template_id, locale, **values))
+
+
+def render_rows(template_id, rows, locale=None):
+    """逐行渲染表格行模板并拼接为 SafeHtml"""
+    renderer = _load_body_renderer(template_id, _resolve_locale(locale))
+    return SafeHtml("".join(renderer(**row) for row in rows))
+
+
+def format_time(ts):
+    """格式化时间戳"""
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def format_duration(seconds, locale=None):
+    """按语言格式化持续时间"""
+    h, rem = divmod(max(int(seconds), 0), 3600)
+    m, s = divmod(rem, 60)
+    return labels(locale)["duration"].format(h=h, m=m, s=s)
+
+
+def _power_outage_values(notification, locale):
+    """断电通知的模板变量"""
+    return {
+        "server_name": notification["server_name"],
+        "power_off_time": format_time(notification["power_off_ts"]),
+        "power_on_time": format_time(notification["power_on_ts"]),
+        "duration_formatted": format_duration(notification["power_on_ts"] - notification["power_off_ts"], locale),
+        # 旧通知没有停止分类，当时按心跳间隔判断
+        "stop_classification": labels(locale)[notification.get("stop_classification", "unknown")],
+    }
+
+
+def _network_status_values(notification, locale):
+    """网络状态变化通知的模板变量"""
+    label = labels(locale)
+    current = notification["current_status"]
+    previous = notification["previous_status"]
+    return {
+        "server_name": notification["server_name"],
+        "previous_internal": label["up"] if previous["last_internal_network"] else label["down"],
+        "current_internal": label["up"] if current["internal_network"] else label["down"],
+        "previous_external": label["up"] if previous["last_external_network"] else label["down"],
+        "current_external": label["up"] if current["external_network"] else label["down"],
+        "changed_at": format_time(current["timestamp"]),
+        "dns_resolution": label["dns_ok"] if current["dns_resolution"] else label["dns_fail"],
+    }
+
+
+def _outage_incident_values(notification, locale):
+    """站点级断电事件的模板变量"""
+    records = notification["incident"]
+    rows = [_power_outage_values(record, locale) for record in records]
+    return {
+        "host_count": len(records),
+        "rows": render_rows("outage_incident_row", rows, locale),
+    }
+
+
+# 模板ID -> 从通知的结构化字段生成模板变量的函数
+VALUE_BUILDERS = {
+    "power_outage": _power_outage_values,
+    "network_status": _network_status_values,
+    "outage_incident": _outage_incident_values,
+}
+
+
+def render_notification(notification, locale=None):
+    """在发送时渲染队列中的通知
+
+    新格式的通知只保存结构化字段和 template_id；旧格式的通知直接使用
+    其中已渲染的 subject 和 html_body（队列中压缩保存的正文在此解压）。
+
+    Returns:
+        (subject, html_body)
+    """
+    template_id = notification.get("template_id")
+    if not template_id:
+        return notification["subject"], body_of(notification)
+    values = VALUE_BUILDERS[template_id](notification, locale)
+    return render(template_id, locale, **values)
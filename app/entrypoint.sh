@@ -1,4 +1,3 @@
 #!/bin/sh
 set -e
-python /app/main.py
-exec python /app/heartbeat.py
+exec python /app/daemon.py
@@ -8,6 +8,9 @@ import sys
 import time
 from contextlib import contextmanager
 from typing import Optional
+from logger_config import get_logger
+
+logger = get_logger("file_lock")
 
 # 从环境变量读取是否启用文件锁（测试环境可能需要禁用）
 ENABLE_FILE_LOCK = os.getenv('ENABLE_FILE_LOCK', 'true').lower() == 'true'
@@ -64,6 +67,9 @@ class FileLock:
                 
                 # 写入当前进程ID
                 os.write(self.fd, str(os.getpid()).encode())
+                waited = time.time() - start_time
+                if waited >= 0.1:
+                    logger.debug("等待文件锁", extra={"lock": self.filepath, "duration_ms": int(waited * 1000)})
                 return True
                 
             except (IOError, OSError, BlockingIOError):
@@ -74,6 +80,8 @@ class FileLock:
                 
                 # 检查是否超时
                 if time.time() - start_time >= self.timeout:
+                    logger.warning(f"获取文件锁超时: {self.filepath}",
+                                   extra={"lock": self.filepath, "duration_ms": int(self.timeout * 1000)})
                     return False
                 
                 # 等待一小段时间后重试
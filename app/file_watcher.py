@@ -0,0 +1,192 @@
+"""文件变化监听模块
+
+状态文件（网络状态、待发送通知队列）被写入后，监听方立即得到通知，不必
+等到下一轮轮询。Linux 上通过 ctypes 调用 inotify 监听文件所在目录的
+IN_CLOSE_WRITE（直接写入）和 IN_MOVED_TO（临时文件原子替换）事件，
+没有变化时线程阻塞在 select 上，不会产生额外唤醒；其他平台或 inotify
+不可用时退回到按 FILE_WATCH_POLL_INTERVAL 秒比较文件的修改时间。
+
+监听方自己也会写入被监听的文件（发送线程确认通知后压缩队列文件），ignore
+判断变化后的文件是否由本进程写入，这样的事件不再回调，监听方不会被自己的
+写入反复唤醒。
+"""
+
+import os
+import sys
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from logger_config import get_logger
+
+logger = get_logger("file_watcher")
+
+FILE_WATCH_POLL_INTERVAL = float(os.getenv("FILE_WATCH_POLL_INTERVAL", 5))
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len（之后是 len 字节的文件名）
+
+_libc = None
+
+
+def _load_libc():
+    """加载 libc 的 inotify 函数，不支持时返回 None"""
+    global _libc
+    if _libc is None:
+        _libc = False
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (OSError, AttributeError):
+                pass
+    return _libc or None
+
+
+def stat_key(path):
+    """用于判断文件是否变化的 (inode, 大小, 修改时间)"""
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+class FileWatcher(threading.Thread):
+    """监听一组文件，文件被写入或替换后调用回调"""
+
+    def __init__(self, paths, callback, poll_interval=None, use_inotify=True, ignore=None):
+        """
+        初始化监听线程
+
+        Args:
+            paths: 要监听的文件路径（文件可以尚不存在，所在目录需存在）
+            callback: 文件变化时调用，参数为文件路径
+            poll_interval: 退回轮询时的检查间隔（秒）
+            use_inotify: 为 False 时始终使用轮询
+            ignore: 参数为文件路径，返回 True 时不回调（如本进程自己的写入）
+        """
+        super().__init__(name="file-watcher", daemon=True)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self._callback = callback
+        self._ignore = ignore
+        self._poll_interval = FILE_WATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._use_inotify = use_inotify
+        self._stopping = threading.Event()
+        self._stop_r, self._stop_w = os.pipe()
+        self._fd = None
+        self._watches = {}  # wd -> {文件名: 路径}
+        self._last = {}  # 轮询模式：路径 -> 上次的 (inode, 大小, 修改时间)
+        self.mode = None
+
+    def _setup_inotify(self):
+        """创建 inotify 实例并监听各文件所在目录
+
+        Returns:
+            bool: 成功返回 True，否则退回轮询
+        """
+        libc = _load_libc() if self._use_inotify else None
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"警告：inotify 初始化失败，退回轮询: {os.strerror(ctypes.get_errno())}")
+            return False
+        directories = {}
+        for path in self.paths:
+            directories.setdefault(os.path.dirname(path), {})[os.path.basename(path)] = path
+        for directory, names in directories.items():
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                logger.warning(f"警告：无法监听目录 {directory}，退回轮询: {os.strerror(ctypes.get_errno())}")
+                os.close(fd)
+                return False
+            self._watches[wd] = names
+        self._fd = fd
+        return True
+
+    def start(self):
+        """开始监听（返回前已建立 inotify 监听，之后的写入不会遗漏）"""
+        self.mode = "inotify" if self._setup_inotify() else "poll"
+        self._last = {path: stat_key(path) for path in self.paths}
+        super().start()
+
+    def stop(self, timeout=None):
+        """停止监听"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        os.write(self._stop_w, b"x")
+        if self.is_alive():
+            self.join(timeout)
+        if not self.is_alive():
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+
+    def _notify(self, path):
+        try:
+            if self._ignore is not None and self._ignore(path):
+                return
+            self._callback(path)
+        except Exception as e:
+            logger.error(f"文件变化处理失败（{path}）: {e}")
+
+    def _parse(self, data):
+        """解析 inotify 事件，返回变化的文件路径（保持顺序、去重）"""
+        changed = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：无法确定哪些文件变化，全部通知一次
+                return list(self.paths)
+            path = self._watches.get(wd, {}).get(os.fsdecode(name))
+            if path and path not in changed:
+                changed.append(path)
+        return changed
+
+    def _run_inotify(self):
+        while not self._stopping.is_set():
+            readable, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in readable:
+                break
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    continue
+                raise
+            for path in self._parse(data):
+                self._notify(path)
+
+    def _run_poll(self):
+        while not self._stopping.wait(self._poll_interval):
+            for path in self.paths:
+                key = stat_key(path)
+                if key != self._last[path]:
+                    self._last[path] = key
+                    if key is not None:
+                        self._notify(path)
+
+    def run(self):
+        try:
+            if self.mode == "inotify":
+                self._run_inotify()
+            else:
+                self._run_poll()
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,108 @@
+"""队列发送调度模块
+
+外网恢复时为待发送队列的清空加入按主机固定种子的随机延迟，并在
+每次发送之间保持间隔，避免同一站点的所有主机在同一秒调用 Resend API。
+
+模拟模式：
+    python flush_scheduler.py --hosts 200 --window 30 --queue 3 --interval 1
+"""
+
+import os
+import sys
+import socket
+import random
+import hashlib
+import argparse
+
+# 开始清空队列前的随机延迟窗口（秒）
+FLUSH_JITTER_WINDOW = float(os.getenv("FLUSH_JITTER_WINDOW", 30))
+# 同一主机连续两次发送之间的间隔（秒）
+FLUSH_SEND_INTERVAL = float(os.getenv("FLUSH_SEND_INTERVAL", 1.0))
+
+
+def host_seed(server_name, hostname=None):
+    """根据服务器名称和主机名生成稳定的随机种子
+
+    Args:
+        server_name: 服务器名称（SERVER_NAME）
+        hostname: 主机名（默认使用 socket.gethostname()）
+
+    Returns:
+        int: 随机种子
+    """
+    hostname = socket.gethostname() if hostname is None else hostname
+    digest = hashlib.sha256(f"{server_name}|{hostname}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def compute_flush_delay(seed, epoch, window=None):
+    """计算本次清空队列前的延迟
+
+    同一主机对同一次恢复事件（epoch）得到相同的延迟，不同主机之间互相错开。
+
+    Args:
+        seed: host_seed() 生成的主机种子
+        epoch: 恢复事件标识（如外网恢复时的时间戳，按分钟取整）
+        window: 延迟窗口（秒），默认 FLUSH_JITTER_WINDOW
+
+    Returns:
+        float: 延迟秒数，范围 [0, window)
+    """
+    window = FLUSH_JITTER_WINDOW if window is None else window
+    if window <= 0:
+        return 0.0
+    return random.Random(seed ^ int(epoch)).uniform(0, window)
+
+
+def simulate(fleet_size, window=None, queue_len=1, send_interval=None, epoch=0):
+    """模拟一个站点的所有主机同时恢复外网后的请求分布
+
+    Args:
+        fleet_size: 主机数量
+        window: 延迟窗口（秒）
+        queue_len: 每台主机积压的通知数量
+        send_interval: 每台主机的发送间隔（秒）
+        epoch: 恢复事件标识
+
+    Returns:
+        dict: 每秒请求数 {"per_second": [...], "peak": int, "total": int}
+    """
+    window = FLUSH_JITTER_WINDOW if window is None else window
+    send_interval = FLUSH_SEND_INTERVAL if send_interval is None else send_interval
+
+    buckets = {}
+    for i in range(fleet_size):
+        seed = host_seed(f"host-{i}", hostname=f"host-{i}")
+        start = compute_flush_delay(seed, epoch, window)
+        for n in range(queue_len):
+            second = int(start + n * send_interval)
+            buckets[second] = buckets.get(second, 0) + 1
+
+    duration = max(buckets) + 1 if buckets else 0
+    per_second = [buckets.get(s, 0) for s in range(duration)]
+    return {
+        "per_second": per_second,
+        "peak": max(per_second) if per_second else 0,
+        "total": sum(per_second),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟外网恢复时整个站点的 Resend 请求速率")
+    parser.add_argument("--hosts", type=int, default=100, help="主机数量")
+    parser.add_argument("--window", type=float, default=FLUSH_JITTER_WINDOW, help="随机延迟窗口（秒）")
+    parser.add_argument("--queue", type=int, default=1, help="每台主机积压的通知数量")
+    parser.add_argument("--interval", type=float, default=FLUSH_SEND_INTERVAL, help="每台主机的发送间隔（秒）")
+    args = parser.parse_args(argv)
+
+    result = simulate(args.hosts, args.window, args.queue, args.interval)
+    for second, count in enumerate(result["per_second"]):
+        print(f"{second:4d}s {count:5d} {'#' * min(count, 60)}")
+    unjittered_peak = args.hosts
+    print(f"总请求数: {result['total']}，峰值: {result['peak']} 次/秒"
+          f"（无抖动时峰值: {unjittered_peak} 次/秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,40 @@
 import time
 import os
-import json
+import asyncio
 import subprocess
 import socket
 from file_lock import file_lock
-from retry_utils import retry_with_backoff, is_retryable_error
+from retry_utils import is_permanent_error
+import outage_correlation
+import flush_scheduler
+import email_templates
+import notification_queue
+import state_store
+import email_sender
+import metrics
+import boot_info
+from circuit_breaker import CircuitOpenError
+from rate_limiter import RateLimitExceeded
+from dns_cache import DNSCache
+from disk_monitor import DiskMonitor
+from sender_worker import SenderWorker, WakeListener
+from file_watcher import FileWatcher
+import logger_config
+from logger_config import get_logger
+
+logger = get_logger("heartbeat")
 
 HEARTBEAT_FILE_A = "/data/heartbeat_a.log"
 HEARTBEAT_FILE_B = "/data/heartbeat_b.log"
 NETWORK_STATUS_FILE = "/data/network_status.log"
 PENDING_NOTIFICATIONS_FILE = "/data/pending_notifications.log"
+DEAD_LETTER_FILE = "/data/dead_letter_notifications.log"
+DNS_CACHE_FILE = "/data/dns_cache.json"
 HEARTBEAT_INTERVAL = 60  # 秒
+# 磁盘空间紧张时死信文件保留的条数
+DEAD_LETTER_KEEP_UNDER_PRESSURE = 100
+# 外网中断期间快速探测外网是否恢复的间隔（秒），0 表示不启用
+RECOVERY_PROBE_INTERVAL = float(os.getenv("RECOVERY_PROBE_INTERVAL", 1))
 
 # 从环境变量获取邮件配置
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
@@ -18,6 +42,15 @@ SENDER_FROM_ADDRESS = os.getenv("SENDER_FROM_ADDRESS")
 RECIPIENT_EMAIL = os.getenv("RECIPIENT_EMAIL")
 SERVER_NAME = os.getenv("SERVER_NAME", "Unknown Server")
 
+# 探测目标的 DNS 缓存（首次使用时加载）
+_dns_cache = None
+
+# 数据目录的磁盘空间监控（首次使用时创建）
+_disk_monitor = None
+
+# 上一轮检测的外网状态（None 表示刚启动），用于识别外网恢复
+_last_external_network = None
+
 # 从环境变量获取网络检测配置
 def get_network_targets():
     """从环境变量获取网络检测目标"""
@@ -43,6 +76,44 @@ def get_network_targets():
         "dns": dns_target
     }
 
+def _get_dns_cache():
+    """获取探测目标的 DNS 缓存"""
+    global _dns_cache
+    if _dns_cache is None:
+        _dns_cache = DNSCache(DNS_CACHE_FILE)
+    return _dns_cache
+
+def _ping_args(timeout=2):
+    """检测操作系统类型，返回相应的ping参数"""
+    import platform
+    if platform.system().lower() == "windows":
+        return ["ping", "-n", "1", "-w", str(timeout * 1000)]
+    return ["ping", "-c", "1", "-W", str(timeout)]
+
+def _ping_any(hosts, dns_cache, ping_args):
+    """依次 ping 目标，任一可达即返回 True"""
+    for host in hosts:
+        addr = dns_cache.probe_address(host)
+        if addr is None:
+            continue
+        try:
+            cmd = ping_args + [addr]
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=5
+            )
+            if result.returncode == 0:
+                return True
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
+            continue
+    return False
+
+def probe_external_network():
+    """外网中断期间的轻量探测：只 ping 外网目标（1秒超时），不做 DNS 检测"""
+    return _ping_any(get_network_targets()["external"], _get_dns_cache(), _ping_args(timeout=1))
+
 def check_network_connectivity():
     """检查网络连接状态"""
     status = {
@@ -55,197 +126,437 @@ def check_network_connectivity():
     # 获取网络检测目标配置
     targets = get_network_targets()
     
-    # 检查DNS解析
+    dns_cache = _get_dns_cache()
+
+    # 检查DNS解析（独立的显式测量，不使用缓存）
     try:
-        socket.gethostbyname(targets["dns"])
+        addr = socket.gethostbyname(targets["dns"])
         status["dns_resolution"] = True
+        dns_cache.update(targets["dns"], addr)
     except socket.gaierror:
         status["dns_resolution"] = False
     
-    # 检测操作系统类型，使用相应的ping参数
-    import platform
-    if platform.system().lower() == "windows":
-        ping_args = ["ping", "-n", "1", "-w", "2000"]
-    else:
-        ping_args = ["ping", "-c", "1", "-W", "2"]
-    
+    ping_args = _ping_args()
+
     # 检查内网连接
-    for host in targets["internal"]:
-        try:
-            cmd = ping_args + [host]
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=5
-            )
-            if result.returncode == 0:
-                status["internal_network"] = True
-                break
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-            continue
-    
+    status["internal_network"] = _ping_any(targets["internal"], dns_cache, ping_args)
+
     # 检查外网连接
-    for host in targets["external"]:
-        try:
-            cmd = ping_args + [host]
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=5
-            )
-            if result.returncode == 0:
-                status["external_network"] = True
-                break
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-            continue
+    status["external_network"] = _ping_any(targets["external"], dns_cache, ping_args)
+
+    # 探测结果确定后再刷新过期的解析结果，DNS 延迟不影响本轮判断
+    dns_cache.refresh_stale(targets["internal"] + targets["external"])
+    dns_cache.save()
     
     return status
 
+async def check_network_connectivity_async(executor=None):
+    """并发检查网络连接状态（DNS、内网、外网同时探测，在线程池中执行）
+
+    结果与 check_network_connectivity 相同，耗时取决于最慢的一项而不是三项之和。
+    """
+    loop = asyncio.get_running_loop()
+    timestamp = int(time.time())
+    targets = get_network_targets()
+    dns_cache = _get_dns_cache()
+    ping_args = _ping_args()
+
+    def resolve():
+        try:
+            dns_cache.update(targets["dns"], socket.gethostbyname(targets["dns"]))
+            return True
+        except socket.gaierror:
+            return False
+
+    dns_ok, internal_ok, external_ok = await asyncio.gather(
+        loop.run_in_executor(executor, resolve),
+        loop.run_in_executor(executor, _ping_any, targets["internal"], dns_cache, ping_args),
+        loop.run_in_executor(executor, _ping_any, targets["external"], dns_cache, ping_args),
+    )
+
+    def refresh():
+        dns_cache.refresh_stale(targets["internal"] + targets["external"])
+        dns_cache.save()
+
+    await loop.run_in_executor(executor, refresh)
+    return {
+        "timestamp": timestamp,
+        "internal_network": internal_ok,
+        "external_network": external_ok,
+        "dns_resolution": dns_ok,
+    }
+
+def write_heartbeat(path):
+    """写入心跳文件（当前时间戳）"""
+    os.makedirs("/data", exist_ok=True)
+    with file_lock(path):
+        with open(path, 'w') as f:
+            f.write(str(int(time.time())))
+
+def _get_store():
+    """获取状态存储后端（STATE_BACKEND）"""
+    return state_store.open_store(PENDING_NOTIFICATIONS_FILE, status_path=NETWORK_STATUS_FILE,
+                                  server_name=SERVER_NAME)
+
 def save_network_status(status):
-    """保存网络状态到文件"""
+    """保存网络状态"""
     try:
         os.makedirs("/data", exist_ok=True)
-        with file_lock(NETWORK_STATUS_FILE):
-            with open(NETWORK_STATUS_FILE, 'w') as f:
-                json.dump(status, f)
+        _get_store().write_state(state_store.STATE_NETWORK_STATUS, status)
     except Exception as e:
-        print(f"保存网络状态错误: {e}")
+        logger.error(f"保存网络状态错误: {e}")
 
 def _load_pending_notifications():
     """加载待发送通知队列"""
-    if not os.path.isfile(PENDING_NOTIFICATIONS_FILE):
-        return []
-    
-    try:
-        with file_lock(PENDING_NOTIFICATIONS_FILE):
-            with open(PENDING_NOTIFICATIONS_FILE, 'r') as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return []
+    return _get_store().load_queue()
 
 def _save_pending_notifications(notifications):
     """保存待发送通知队列"""
-    try:
-        with file_lock(PENDING_NOTIFICATIONS_FILE):
-            with open(PENDING_NOTIFICATIONS_FILE, 'w') as f:
-                json.dump(notifications, f)
-    except IOError as e:
-        print(f"保存待发送通知失败: {e}")
+    _get_store().save_queue(notifications)
 
-def send_email_with_resend(subject, html_body):
-    """使用 Resend API 发送邮件（带重试机制）"""
+def send_email_with_resend(subject, html_body, idempotency_key=None):
+    """使用 Resend API 发送邮件（带重试机制）
+
+    Args:
+        subject: 邮件主题
+        html_body: 邮件正文
+        idempotency_key: Resend 幂等键（重复请求只发送一次）
+
+    Returns:
+        (是否发送成功, 失败时的异常)：异常用于区分临时错误和永久错误，配置不完整时为 None
+    """
     if not all([RESEND_API_KEY, SENDER_FROM_ADDRESS, RECIPIENT_EMAIL]):
-        print("错误：邮件配置环境变量不完整。无法发送邮件。")
-        return False
+        logger.error("错误：邮件配置环境变量不完整。无法发送邮件。")
+        return False, None
 
-    def send_email():
-        """实际的发送邮件函数"""
-        import resend
-        resend.api_key = RESEND_API_KEY
-        params = {
-            "from": SENDER_FROM_ADDRESS,
-            "to": [RECIPIENT_EMAIL],
-            "subject": subject,
-            "html": html_body,
-        }
-        email = resend.Emails.send(params)
-        print(f"邮件已通过 Resend 发送成功！ Email ID: {email['id']}")
-        return True
-    
     try:
-        # 使用重试机制：最多3次，初始延迟1秒，指数退避
-        retry_with_backoff(
-            send_email,
-            max_retries=3,
-            initial_delay=1,
-            backoff_factor=2,
-            exceptions=(Exception,),
-            should_retry_func=is_retryable_error
-        )
-        return True
+        email_sender.deliver(RESEND_API_KEY, SENDER_FROM_ADDRESS, RECIPIENT_EMAIL, subject, html_body,
+                             idempotency_key=idempotency_key)
+        return True, None
+    except (CircuitOpenError, RateLimitExceeded) as e:
+        logger.warning(f"跳过发送: {e}")
+        return False, e
     except Exception as e:
-        print(f"使用 Resend 发送邮件失败（所有重试均失败）: {e}")
-        return False
+        logger.error(f"使用 Resend 发送邮件失败（所有重试均失败）: {e}")
+        return False, e
+
+def _correlate_outage(notification):
+    """对断电通知做站点级关联
+
+    Returns:
+        str: "send" 发送（可能已合并为站点级事件），"defer" 等待关联窗口结束，
+        "merged" 已由其他主机在站点级事件中报告
+    """
+    if (not outage_correlation.is_enabled() or notification.get("type") != "power_outage"
+            or "power_on_ts" not in notification or notification.get("correlated")):
+        return "send"
+
+    if not outage_correlation.is_settled(notification):
+        return "defer"
+
+    try:
+        records, owner = outage_correlation.claim_incident(
+            notification.get("server_name", SERVER_NAME),
+            notification["power_off_ts"],
+            notification["power_on_ts"]
+        )
+    except TimeoutError as e:
+        logger.warning(f"认领站点级事件失败，下次再试: {e}")
+        return "defer"
+    if not records:
+        logger.info(f"断电通知已并入服务器 {owner} 的站点级事件，不再单独发送")
+        return "merged"
+
+    # 记录关联结果，发送失败重试时沿用同一份事件内容
+    notification["correlated"] = True
+    if len(records) > 1:
+        notification["template_id"] = "outage_incident"
+        notification["incident"] = records
+        notification.pop("subject", None)
+        notification.pop("html_body", None)
+        notification.pop("html_body_z", None)
+        logger.info(f"已将 {len(records)} 台服务器的断电合并为一个站点级事件")
+    return "send"
 
 def process_pending_notifications():
-    """处理待发送的通知队列"""
-    # 在同一个锁内完成读取操作
-    with file_lock(PENDING_NOTIFICATIONS_FILE):
-        try:
-            if not os.path.isfile(PENDING_NOTIFICATIONS_FILE):
-                return  # 文件不存在，无需处理
-            
-            with open(PENDING_NOTIFICATIONS_FILE, 'r') as f:
-                notifications = json.load(f)
-            
-            if not notifications:
-                return  # 队列为空，无需处理
-        except (json.JSONDecodeError, IOError):
-            return  # 读取失败，跳过处理
+    """处理待发送的通知队列
+
+    逐条发送，每条通知处理完成后立即按 id 确认（删除、更新重试状态或移入
+    死信）。文件后端写入确认日志而不是整体覆盖队列文件，队列按优先级分多趟
+    流式读取，结束后将确认日志合并到队列文件；SQLite 后端在事务中逐条领取
+    和确认。两种方式的内存占用都不随队列长度增长。
+    """
+    store = _get_store()
+    try:
+        avoided_sends = store.pop_avoided_sends()
+    except IOError:
+        return  # 读取失败，跳过处理
+    if avoided_sends:
+        logger.info(f"外网中断期间合并/取消了通知，避免了 {avoided_sends} 次发送")
     
-    # 在锁外发送邮件，避免长时间持有锁
-    print(f"发现 {len(notifications)} 个待发送通知，尝试发送...")
+    # 只处理已到重试时间的通知，其余通知保持不动
+    now = time.time()
+    if not _has_due_notifications(now):
+        return
     
-    successful_notifications = []
-    failed_notifications = []
+    # 在锁外发送邮件，避免长时间持有锁
+    logger.info("发现已到发送时间的待发送通知，尝试发送...", extra={"phase": "drain"})
+    drain_started = time.monotonic()
     
-    for notification in notifications:
-        if send_email_with_resend(notification["subject"], notification["html_body"]):
-            successful_notifications.append(notification)
-        else:
-            failed_notifications.append(notification)
+    successful_count = 0
+    failed_count = 0
+    deferred_count = 0
+    dead_count = 0
     
-    # 保存发送失败的通知（用于重试）
-    _save_pending_notifications(failed_notifications)
+    sent_count = 0
+    try:
+        # 按优先级发送：积压较多时先发送断电通知，再发送网络和信息类通知
+        for notification in store.iter_due(now):
+            was_correlated = notification.get("correlated")
+            action = _correlate_outage(notification)
+            if action == "defer":
+                deferred_count += 1
+                continue
+            if action == "merged":
+                store.ack(notification["id"])
+                successful_count += 1
+                continue
+            if notification.get("correlated") and not was_correlated:
+                # 先保存关联结果，崩溃重启后以相同的内容和幂等键重新发送
+                store.update(notification)
+
+            # 同一主机的连续发送之间保持间隔，分散整个站点的请求
+            if sent_count and flush_scheduler.FLUSH_SEND_INTERVAL > 0:
+                time.sleep(flush_scheduler.FLUSH_SEND_INTERVAL)
+            sent_count += 1
+
+            # 发送时才渲染邮件主题和正文；通知 id 作为幂等键，重复发送不会产生重复邮件
+            try:
+                subject, html_body = email_templates.render_notification(notification)
+            except ValueError as e:
+                # 压缩保存的正文损坏，重试也无法恢复
+                logger.error(f"无法读取通知正文，移入死信文件: {e}")
+                notification_queue.append_dead_letters(DEAD_LETTER_FILE, [notification])
+                store.ack(notification["id"])
+                dead_count += 1
+                continue
+            paused = email_sender.send_paused()
+            if paused:
+                # 不标记为发送中，也不改写队列：熔断或限速期间不会反复触发发送
+                logger.warning(f"暂停发送剩余通知: {paused}")
+                break
+            if not store.begin_send(notification):
+                # 读取之后被新通知取消或替代
+                logger.info("通知已被取消或替代，跳过发送", extra={"phase": "drain"})
+                continue
+            sent, error = send_email_with_resend(
+                subject, html_body, idempotency_key=notification_queue.idempotency_key(notification))
+            if sent:
+                store.ack(notification["id"])
+                successful_count += 1
+                continue
+
+            if isinstance(error, (CircuitOpenError, RateLimitExceeded)):
+                # 熔断器打开或限速等待超出时限：本轮不再调用 API，剩余通知原样保留，不计入尝试次数
+                logger.warning(f"暂停发送剩余通知: {error}")
+                store.end_send(notification)
+                break
+
+            # 记录失败并安排下一次尝试；永久错误或超过最大尝试次数的通知移入死信文件
+            error_class = type(error).__name__ if error is not None else "SendFailed"
+            can_retry = notification_queue.schedule_retry(notification, error_class)
+            if (error is not None and is_permanent_error(error)) or not can_retry:
+                notification_queue.append_dead_letters(DEAD_LETTER_FILE, [notification])
+                store.ack(notification["id"])
+                dead_count += 1
+            else:
+                store.update(notification)
+                failed_count += 1
+    except (ValueError, IOError) as e:
+        logger.error(f"读取待发送通知失败: {e}")
+    finally:
+        # 检查点：将本轮的确认合并到队列文件（SQLite 后端写回 WAL）
+        store.checkpoint()
     
-    if successful_notifications:
-        print(f"成功发送 {len(successful_notifications)} 个通知")
-    if failed_notifications:
-        print(f"仍有 {len(failed_notifications)} 个通知发送失败，将在下次重试")
+    logger.debug("待发送通知处理完成", extra={
+        "phase": "drain",
+        "duration_ms": int((time.monotonic() - drain_started) * 1000),
+        "sent": successful_count,
+        "failed": failed_count,
+        "dead": dead_count,
+        "deferred": deferred_count,
+    })
+    if successful_count:
+        logger.info(f"成功发送 {successful_count} 个通知")
+    if failed_count:
+        logger.warning(f"仍有 {failed_count} 个通知发送失败，将按退避时间重试")
+    if dead_count:
+        logger.warning(f"{dead_count} 个通知永久失败，已移入死信文件 {DEAD_LETTER_FILE}")
+    if deferred_count:
+        logger.info(f"{deferred_count} 个断电通知等待站点级关联窗口结束")
+
+def _has_due_notifications(now=None):
+    """队列中是否有已到发送时间的通知（找到第一条即返回）"""
+    try:
+        return _get_store().has_due(now)
+    except (ValueError, IOError):
+        return False
 
 def check_and_send_pending_notifications(network_status):
     """检查网络状态并发送待处理通知"""
+    global _last_external_network
+
+    recovered = network_status["external_network"] and _last_external_network is not True
+    _last_external_network = network_status["external_network"]
+
     # 只有在外网正常时才尝试发送通知
     if network_status["external_network"]:
+        # 外网刚恢复（或刚启动）时，整个站点的主机会同时清空队列，先随机等待一段时间
+        if recovered and _has_due_notifications():
+            seed = flush_scheduler.host_seed(SERVER_NAME)
+            delay = flush_scheduler.compute_flush_delay(seed, int(time.time()) // 60)
+            if delay > 0:
+                logger.info(f"外网恢复，等待 {delay:.1f} 秒后发送待处理通知（错开站点内其他主机）")
+                time.sleep(delay)
         process_pending_notifications()
 
+def _get_disk_monitor():
+    """获取数据目录的磁盘空间监控"""
+    global _disk_monitor
+    if _disk_monitor is None:
+        _disk_monitor = DiskMonitor("/data")
+    return _disk_monitor
+
+def _shed_load():
+    """磁盘空间紧张时降载：丢弃信息类通知、裁剪历史记录、减少日志"""
+    try:
+        dropped = _get_store().drop(
+            lambda n: notification_queue.priority_of(n) == notification_queue.PRIORITY_INFO)
+    except IOError as e:
+        logger.error(f"删除信息类通知失败: {e}")
+        dropped = 0
+    trimmed = notification_queue.trim_dead_letters(DEAD_LETTER_FILE, DEAD_LETTER_KEEP_UNDER_PRESSURE)
+    if outage_correlation.is_enabled():
+        outage_correlation.cleanup_spool()
+    logger_config.set_disk_pressure(True)
+    logger.warning(f"降载：丢弃 {dropped} 个信息类通知，裁剪 {trimmed} 条死信，文件日志只记录 WARNING 及以上",
+                   extra={"phase": "disk", "dropped": dropped, "trimmed": trimmed})
+
+def check_disk_pressure():
+    """检查磁盘空间并在进入/解除空间紧张状态时调整降载
+
+    Returns:
+        bool: 当前是否处于空间紧张状态
+    """
+    monitor = _get_disk_monitor()
+    transition = monitor.check()
+    if monitor.free_mb is not None:
+        metrics.set_gauge("disk_free_bytes", int(monitor.free_mb * 1024 * 1024))
+    metrics.set_gauge("disk_pressure", int(monitor.under_pressure))
+
+    if transition == "entered":
+        _shed_load()
+    elif transition == "exited":
+        logger_config.set_disk_pressure(False)
+    return monitor.under_pressure
+
+def wait_for_next_cycle(sender, network_status):
+    """等待到下一轮心跳
+
+    外网中断时每隔 RECOVERY_PROBE_INTERVAL 秒探测一次外网，一旦恢复立即
+    完整检测网络、保存状态并唤醒发送线程，不必等到下一轮心跳。
+    """
+    deadline = time.monotonic() + HEARTBEAT_INTERVAL
+    if not network_status or network_status["external_network"] or RECOVERY_PROBE_INTERVAL <= 0:
+        time.sleep(HEARTBEAT_INTERVAL)
+        return
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(RECOVERY_PROBE_INTERVAL, remaining))
+        if time.monotonic() >= deadline or not probe_external_network():
+            continue
+
+        status = check_network_connectivity()
+        save_network_status(status)
+        if status["external_network"]:
+            logger.info("外网已恢复，立即唤醒发送线程")
+            sender.notify(status)
+            time.sleep(max(deadline - time.monotonic(), 0))
+            return
+
 if __name__ == "__main__":
-    print("--- 后台任务：心跳服务已启动（增强版）---")
+    logger_config.setup_logging()
+    logger.info("--- 后台任务：心跳服务已启动（增强版）---")
     
     # 确保数据目录存在并设置正确的权限
     os.makedirs("/data", exist_ok=True)
     try:
         os.chmod("/data", 0o700)  # 仅所有者可读写执行
     except Exception as e:
-        print(f"警告：无法设置目录权限: {e}")
+        logger.warning(f"警告：无法设置目录权限: {e}")
     
+    # 保存主机的启动 ID，下次启动检查据此判断主机是否重启过
+    try:
+        boot_info.store_boot_id()
+    except OSError as e:
+        logger.warning(f"警告：无法保存启动 ID: {e}")
+
     use_file_a = True
+    network_status = None
+
+    # 待发送通知由独立线程处理，心跳写入不等待 Resend API
+    sender = SenderWorker(check_and_send_pending_notifications, idle_interval=HEARTBEAT_INTERVAL)
+    sender.start()
+
+    # 其他进程入队后通过套接字唤醒发送线程
+    wake_listener = WakeListener(sender.notify)
+    if wake_listener.bind():
+        wake_listener.start()
+
+    # 其他工具直接写入队列文件时同样立即唤醒发送线程（SQLite 后端依赖套接字唤醒）；
+    # 发送线程自己压缩队列文件不再唤醒自己
+    if state_store.STATE_BACKEND == "file":
+        queue_watcher = FileWatcher([PENDING_NOTIFICATIONS_FILE], lambda path: sender.notify(),
+                                    ignore=notification_queue.written_by_this_process)
+        queue_watcher.start()
 
     while True:
         target_file = HEARTBEAT_FILE_A if use_file_a else HEARTBEAT_FILE_B
 
         try:
             # 更新心跳文件
-            os.makedirs("/data", exist_ok=True)
-            with file_lock(target_file):
-                with open(target_file, 'w') as f:
-                    f.write(str(int(time.time())))
+            write_heartbeat(target_file)
 
             # 检查并保存网络状态
+            probe_started = time.monotonic()
             network_status = check_network_connectivity()
             save_network_status(network_status)
 
-            print(f"心跳更新: {time.strftime('%Y-%m-%d %H:%M:%S')} - "
-                  f"内网: {'正常' if network_status['internal_network'] else '异常'} - "
-                  f"外网: {'正常' if network_status['external_network'] else '异常'}")
+            logger.info(f"心跳更新: {time.strftime('%Y-%m-%d %H:%M:%S')} - "
+                        f"内网: {'正常' if network_status['internal_network'] else '异常'} - "
+                        f"外网: {'正常' if network_status['external_network'] else '异常'}",
+                        extra={
+                            "phase": "heartbeat",
+                            "duration_ms": int((time.monotonic() - probe_started) * 1000),
+                            "internal_network": network_status["internal_network"],
+                            "external_network": network_status["external_network"],
+                        })
 
-            # 检查并发送待处理通知
-            check_and_send_pending_notifications(network_status)
+            # 唤醒发送线程检查并发送待处理通知
+            sender.notify(network_status)
+
+            # 检查磁盘空间（结果缓存），空间紧张时降载
+            check_disk_pressure()
+
+            # 导出指标
+            email_sender.export_metrics()
+            metrics.write_textfile()
 
         except Exception as e:
-            print(f"心跳错误：更新失败: {e}")
+            logger.error(f"心跳错误：更新失败: {e}")
 
         use_file_a = not use_file_a
-        time.sleep(HEARTBEAT_INTERVAL)
+        wait_for_next_cycle(sender, network_status)
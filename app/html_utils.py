@@ -4,6 +4,12 @@
 """
 
 import html
+import string
+from functools import lru_cache
+
+
+class SafeHtml(str):
+    """已经过转义或由模板生成的 HTML 片段，escape_html 不会再次转义"""
 
 
 def escape_html(text):
@@ -17,9 +23,44 @@ def escape_html(text):
     """
     if text is None:
         return ""
+    if isinstance(text, SafeHtml):
+        return text
     return html.escape(str(text))
 
 
+@lru_cache(maxsize=128)
+def compile_template(template, escape=True):
+    """将模板编译为渲染函数（结果被缓存，同一模板只解析一次）
+    
+    Args:
+        template: 模板字符串（支持 {variable} 占位符及格式说明）
+        escape: 是否对变量值做 HTML 转义（纯文本模板如邮件主题传 False）
+        
+    Returns:
+        callable: render(**kwargs) -> str
+    """
+    formatter = string.Formatter()
+    parts = []
+    for literal, field_name, format_spec, conversion in formatter.parse(template):
+        parts.append((literal, field_name, format_spec, conversion))
+
+    def render(**kwargs):
+        out = []
+        for literal, field_name, format_spec, conversion in parts:
+            out.append(literal)
+            if field_name is None:
+                continue
+            value, _ = formatter.get_field(field_name, (), kwargs)
+            if conversion:
+                value = formatter.convert_field(value, conversion)
+            if format_spec:
+                value = format(value, format_spec)
+            out.append(escape_html(value) if escape else str(value))
+        return "".join(out)
+
+    return render
+
+
 def safe_format_email_content(template, **kwargs):
     """安全地格式化邮件内容，自动转义变量
     
@@ -30,11 +71,8 @@ def safe_format_email_content(template, **kwargs):
     Returns:
         str: 格式化并转义后的内容
     """
-    # 转义所有变量值
-    safe_kwargs = {k: escape_html(v) for k, v in kwargs.items()}
-    
-    # 格式化模板
-    return template.format(**safe_kwargs)
+    # 使用缓存的编译结果，变量值在渲染时自动转义
+    return compile_template(template)(**kwargs)
 
 
 def validate_html_content(content, allowed_tags=['html', 'body', 'h3', 'p', 'table', 'tr', 'td', 'strong']):
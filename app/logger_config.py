@@ -1,61 +1,312 @@
 """日志配置模块
 
-提供日志轮转和格式化功能
+提供日志轮转和格式化功能。
+
+各模块通过 get_logger 获取日志记录器，记录只放入内存队列（QueueHandler），
+格式化、写控制台和写文件都在后台线程（QueueListener）中完成，心跳循环不会
+因为 Docker 日志驱动或磁盘 I/O 阻塞。文件日志为每行一条 JSON，extra 中的
+字段（phase、duration_ms、queue_len 等）作为独立字段输出。
+
+日志文件与心跳文件共用 /data 卷：轮转出的日志段在后台线程中压缩（gzip，
+安装 zstandard 后可选 zstd），压缩后的日志总大小超出预算时删除最旧的日志段；
+心跳进程的磁盘监控（disk_monitor.DiskMonitor）进入空间紧张状态时停止
+DEBUG 日志，文件日志只记录 WARNING 及以上级别。
 """
 
-import logging
+import os
 import sys
-from logging.handlers import RotatingFileHandler
+import json
+import gzip
+import time
+import queue
+import shutil
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ROOT_LOGGER = "power_monitor"
+LOG_FILE = os.getenv("LOG_FILE", "/data/power_monitor.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 按模块设置日志级别，例如 "heartbeat=DEBUG,file_lock=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# 控制台输出格式：text（便于阅读）或 json
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10*1024*1024))  # 单个日志段大小
+LOG_RETENTION_BYTES = int(os.getenv("LOG_RETENTION_BYTES", 20*1024*1024))  # 压缩后日志段的总大小预算
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip")  # gzip、zstd 或 none
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# LogRecord 自带的属性，其余属性视为 extra 结构化字段
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_disk_pressure = False
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """只在调用线程中合并消息参数和异常堆栈，格式化留给后台线程"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """按大小轮转，轮转出的日志段在后台线程中压缩并按总大小保留"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, retention_bytes=LOG_RETENTION_BYTES,
+                 compression=LOG_COMPRESSION):
+        """
+        初始化处理器
+
+        Args:
+            filename: 日志文件路径
+            max_bytes: 单个日志段大小
+            retention_bytes: 轮转出的日志段（压缩后）的总大小预算
+            compression: gzip、zstd 或 none（未安装 zstandard 时 zstd 退回 gzip）
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=0, encoding='utf-8')
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+        self.compression = compression
+        self.retention_bytes = retention_bytes
+        self._jobs = queue.SimpleQueue()
+        self._compressor = threading.Thread(target=self._compress_loop, name="log-compressor", daemon=True)
+        self._compressor.start()
+
+        # 上次退出时未压缩完的日志段
+        for path in self._segments():
+            if not path.endswith((".gz", ".zst")):
+                self._jobs.put(path)
+        self._jobs.put("")  # 空任务：只执行保留策略
+
+    @property
+    def _suffix(self):
+        return {"gzip": ".gz", "zstd": ".zst"}.get(self.compression, "")
+
+    def _segments(self):
+        """已轮转的日志段（按修改时间从旧到新）"""
+        directory, base = os.path.split(self.baseFilename)
+        prefix = base + "."
+        try:
+            names = [name for name in os.listdir(directory or ".")
+                     if name.startswith(prefix) and not name.endswith((".lock", ".tmp"))]
+        except OSError:
+            return []
+        paths = [os.path.join(directory, name) for name in names]
+        return sorted(paths, key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+
+    def doRollover(self):
+        """重命名当前日志段后立即打开新文件，压缩交给后台线程"""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        segment = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+        candidate, n = segment, 1
+        while os.path.exists(candidate) or os.path.exists(candidate + self._suffix):
+            candidate = f"{segment}-{n}"
+            n += 1
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, candidate)
+            self._jobs.put(candidate)
+        self.stream = self._open()
+
+    def _compress(self, path):
+        """压缩一个日志段并删除原文件"""
+        if not self._suffix:
+            return
+        target = path + self._suffix
+        tmp_path = target + ".tmp"
+        with open(path, 'rb') as src:
+            if self.compression == "zstd":
+                with open(tmp_path, 'wb') as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.open(tmp_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, target)
+        os.remove(path)
+
+    def enforce_retention(self):
+        """删除最旧的日志段，直到总大小不超过预算"""
+        segments = [(path, os.path.getsize(path)) for path in self._segments() if os.path.exists(path)]
+        total = sum(size for _, size in segments)
+        for path, size in segments:
+            if total <= self.retention_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def _compress_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if isinstance(job, threading.Event):
+                job.set()
+                continue
+            try:
+                if job:
+                    self._compress(job)
+                self.enforce_retention()
+            except OSError as e:
+                sys.stderr.write(f"压缩日志段失败: {e}\n")
 
+    def wait_idle(self, timeout=None):
+        """等待已提交的压缩任务完成
+
+        Returns:
+            bool: 是否在超时前完成
+        """
+        marker = threading.Event()
+        self._jobs.put(marker)
+        return marker.wait(timeout)
+
+    def close(self):
+        super().close()
+        if self._compressor.is_alive():
+            self._jobs.put(None)
+            self._compressor.join(10)
+
+
+def set_disk_pressure(under_pressure):
+    """设置磁盘空间紧张状态（由磁盘监控在进入/解除空间紧张状态时调用）
+
+    空间紧张时停止输出 DEBUG 日志（包括单独设置为 DEBUG 级别的模块），
+    文件日志只记录 WARNING 及以上级别。
+    """
+    global _disk_pressure
+    _disk_pressure = under_pressure
+
+
+def _debug_filter(record):
+    return not (_disk_pressure and record.levelno < logging.INFO)
+
+
+def _file_filter(record):
+    return not (_disk_pressure and record.levelno < logging.WARNING)
+
+
+def get_logger(name):
+    """获取模块的日志记录器（power_monitor.<name>）"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def parse_levels(spec):
+    """解析按模块设置的日志级别
+
+    Returns:
+        dict: 模块名 -> 日志级别
+    """
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        level = logging.getLevelName(level.strip().upper())
+        if isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(log_file=None, level=None, module_levels=None, console=True):
+    """启动日志管道（重复调用无效果）
 
-def setup_logger(name="power_monitor", log_file="/data/power_monitor.log", 
-                 max_bytes=10*1024*1024, backup_count=5):
-    """设置日志记录器
-    
     Args:
-        name: 日志记录器名称
-        log_file: 日志文件路径
-        max_bytes: 单个日志文件最大字节数（默认10MB）
-        backup_count: 保留的备份文件数量（默认5个）
-        
+        log_file: 日志文件路径（默认 LOG_FILE，为空则不写文件）
+        level: 默认日志级别（默认 LOG_LEVEL）
+        module_levels: 按模块设置的日志级别（默认解析 LOG_LEVELS）
+        console: 是否输出到控制台
+
     Returns:
-        logging.Logger: 配置好的日志记录器
+        logging.Logger: 根日志记录器
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # 避免重复添加handler
-    if logger.handlers:
-        return logger
-    
-    # 创建格式化器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # 控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
-    # 文件处理器（带轮转）
-    try:
-        file_handler = RotatingFileHandler(
-            log_file,
-            maxBytes=max_bytes,
-            backupCount=backup_count,
-            encoding='utf-8'
-        )
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    except Exception as e:
-        print(f"无法创建日志文件处理器: {e}")
-    
-    return logger
-
-
-# 全局日志记录器
-logger = setup_logger()
\ No newline at end of file
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return root
+
+    root.setLevel(logging.getLevelName((level or LOG_LEVEL).upper()))
+    for name, module_level in (module_levels if module_levels is not None else parse_levels(LOG_LEVELS)).items():
+        get_logger(name).setLevel(module_level)
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        if LOG_CONSOLE_FORMAT == "json":
+            console_handler.setFormatter(JsonFormatter())
+        else:
+            console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+        handlers.append(console_handler)
+
+    log_file = LOG_FILE if log_file is None else log_file
+    if log_file:
+        try:
+            file_handler = CompressingRotatingFileHandler(log_file)
+            file_handler.setFormatter(JsonFormatter())
+            file_handler.addFilter(_file_filter)
+            handlers.append(file_handler)
+        except Exception as e:
+            sys.stderr.write(f"无法创建日志文件处理器: {e}\n")
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_debug_filter)
+    root.addHandler(queue_handler)
+    root.propagate = False
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    root.propagate = True
+    _listener = None
@@ -1,12 +1,24 @@
 import os
-import resend
+import sys
 import time
-import json
 from datetime import datetime
 from file_lock import file_lock
-from retry_utils import retry_with_backoff, is_retryable_error
-from disk_monitor import check_disk_space, get_disk_usage_str
-from html_utils import escape_html
+import email_sender
+from circuit_breaker import CircuitOpenError
+from rate_limiter import RateLimitExceeded
+from disk_monitor import check_disk_space, get_disk_usage_str, is_under_pressure
+import email_templates
+import notification_queue
+import state_store
+import outage_correlation
+import shutdown_marker
+import boot_info
+import sender_worker
+from file_watcher import FileWatcher
+import logger_config
+from logger_config import get_logger
+
+logger = get_logger("main")
 
 # --- 配置：从环境变量读取 ---
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
@@ -23,37 +35,25 @@ NETWORK_OUTAGE_THRESHOLD = int(os.getenv("NETWORK_OUTAGE_THRESHOLD", 300))  # 5
 SERVER_NAME = os.getenv("SERVER_NAME", "Unknown Server")
 MAX_PENDING_NOTIFICATIONS = int(os.getenv("MAX_PENDING_NOTIFICATIONS", 1000))  # 最大待发送通知数量
 
-def send_email_with_resend(subject, html_body):
-    """使用 Resend API 发送邮件（带重试机制）"""
+def send_email_with_resend(subject, html_body, idempotency_key=None):
+    """使用 Resend API 发送邮件（带重试机制）
+
+    Args:
+        subject: 邮件主题
+        html_body: 邮件正文
+        idempotency_key: Resend 幂等键（超时后重试不会产生重复邮件）
+    """
     if not all([RESEND_API_KEY, SENDER_FROM_ADDRESS, RECIPIENT_EMAIL]):
-        print("错误：邮件配置环境变量不完整。无法发送邮件。")
+        logger.error("错误：邮件配置环境变量不完整。无法发送邮件。")
         return
 
-    def send_email():
-        """实际的发送邮件函数"""
-        resend.api_key = RESEND_API_KEY
-        params = {
-            "from": SENDER_FROM_ADDRESS,
-            "to": [RECIPIENT_EMAIL],
-            "subject": subject,
-            "html": html_body,
-        }
-        email = resend.Emails.send(params)
-        print(f"邮件已通过 Resend 发送成功！ Email ID: {email['id']}")
-        return email
-    
     try:
-        # 使用重试机制：最多3次，初始延迟1秒，指数退避
-        retry_with_backoff(
-            send_email,
-            max_retries=3,
-            initial_delay=1,
-            backoff_factor=2,
-            exceptions=(Exception,),
-            should_retry_func=is_retryable_error
-        )
+        email_sender.deliver(RESEND_API_KEY, SENDER_FROM_ADDRESS, RECIPIENT_EMAIL, subject, html_body,
+                             idempotency_key=idempotency_key)
+    except (CircuitOpenError, RateLimitExceeded) as e:
+        logger.warning(f"跳过发送: {e}")
     except Exception as e:
-        print(f"使用 Resend 发送邮件失败（所有重试均失败）: {e}")
+        logger.error(f"使用 Resend 发送邮件失败（所有重试均失败）: {e}")
 
 def _get_valid_timestamp(filepath):
     """安全地从文件中读取时间戳，返回(时间戳, 状态)"""
@@ -75,107 +75,103 @@ def _write_timestamp(filepath, ts):
         with file_lock(filepath):
             with open(filepath, 'w') as f:
                 f.write(str(ts))
-        print(f"修复日志：已将时间戳 {ts} 写入文件 {filepath}。")
+        logger.info(f"修复日志：已将时间戳 {ts} 写入文件 {filepath}。")
     except IOError as e:
-        print(f"错误：写入文件 {filepath} 失败: {e}")
+        logger.error(f"错误：写入文件 {filepath} 失败: {e}")
 
 def _remove_file(filepath):
     """安全地删除文件，用于清理"""
     try:
         if os.path.exists(filepath):
             os.remove(filepath)
-            print(f"修复日志：已删除无效文件 {filepath}。")
+            logger.info(f"修复日志：已删除无效文件 {filepath}。")
     except OSError as e:
-        print(f"错误：删除文件 {filepath} 失败: {e}")
+        logger.error(f"错误：删除文件 {filepath} 失败: {e}")
+
+def _get_store():
+    """获取状态存储后端（STATE_BACKEND）"""
+    return state_store.open_store(PENDING_NOTIFICATIONS_FILE, status_path=NETWORK_STATUS_FILE,
+                                  history_path=NETWORK_HISTORY_FILE, server_name=SERVER_NAME)
 
 def _load_network_status():
-    """加载网络状态文件"""
-    if not os.path.isfile(NETWORK_STATUS_FILE):
-        return None
-    
+    """加载网络状态"""
     try:
-        with file_lock(NETWORK_STATUS_FILE):
-            with open(NETWORK_STATUS_FILE, 'r') as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
+        return _get_store().read_state(state_store.STATE_NETWORK_STATUS)
+    except (ValueError, IOError):
         return None
 
 def _load_network_history():
     """加载网络历史记录"""
-    if not os.path.isfile(NETWORK_HISTORY_FILE):
-        return {"last_internal_network": True, "last_external_network": True}
-    
+    default = {"last_internal_network": True, "last_external_network": True}
     try:
-        with file_lock(NETWORK_HISTORY_FILE):
-            with open(NETWORK_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {"last_internal_network": True, "last_external_network": True}
+        return _get_store().read_state(state_store.STATE_NETWORK_HISTORY) or default
+    except (ValueError, IOError):
+        return default
 
 def _save_network_history(history):
     """保存网络历史记录"""
     try:
-        with file_lock(NETWORK_HISTORY_FILE):
-            with open(NETWORK_HISTORY_FILE, 'w') as f:
-                json.dump(history, f)
+        _get_store().write_state(state_store.STATE_NETWORK_HISTORY, history)
     except IOError as e:
-        print(f"保存网络历史记录失败: {e}")
+        logger.error(f"保存网络历史记录失败: {e}")
 
 def _load_pending_notifications():
     """加载待发送通知队列"""
-    if not os.path.isfile(PENDING_NOTIFICATIONS_FILE):
-        return []
-    
-    try:
-        with file_lock(PENDING_NOTIFICATIONS_FILE):
-            with open(PENDING_NOTIFICATIONS_FILE, 'r') as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return []
+    return _get_store().load_queue()
 
 def _save_pending_notifications(notifications):
     """保存待发送通知队列"""
-    try:
-        with file_lock(PENDING_NOTIFICATIONS_FILE):
-            with open(PENDING_NOTIFICATIONS_FILE, 'w') as f:
-                json.dump(notifications, f)
-    except IOError as e:
-        print(f"保存待发送通知失败: {e}")
+    _get_store().save_queue(notifications)
 
 def _add_pending_notification(notification):
     """添加待发送通知到队列（带大小限制）"""
-    # 在同一个锁内完成读取-修改-写入操作，防止竞态条件
-    with file_lock(PENDING_NOTIFICATIONS_FILE):
-        try:
-            if not os.path.isfile(PENDING_NOTIFICATIONS_FILE):
-                notifications = []
-            else:
-                with open(PENDING_NOTIFICATIONS_FILE, 'r') as f:
-                    notifications = json.load(f)
-            
-            # 检查队列大小，如果超过限制，丢弃最旧的通知
-            if len(notifications) >= MAX_PENDING_NOTIFICATIONS:
-                print(f"警告：待发送通知队列已满（{MAX_PENDING_NOTIFICATIONS}条），丢弃最旧的通知")
-                discarded_count = len(notifications) - MAX_PENDING_NOTIFICATIONS + 1
-                notifications = notifications[discarded_count:]  # 保留最新的通知
-            
-            notifications.append(notification)
-            
-            with open(PENDING_NOTIFICATIONS_FILE, 'w') as f:
-                json.dump(notifications, f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"添加待发送通知失败: {e}")
-            return False
-    
-    print(f"已将断电通知添加到待发送队列，当前队列长度: {len(notifications)}")
+    # 磁盘空间紧张时不再积压信息类通知
+    if (notification_queue.priority_of(notification) == notification_queue.PRIORITY_INFO
+            and is_under_pressure("/data")):
+        logger.warning(f"磁盘空间不足，丢弃信息类通知（{notification.get('type', 'unknown')}）")
+        return False
+
+    # 在同一个锁（事务）内完成查找同类通知、合并或取消、淘汰，防止竞态条件
+    store = _get_store()
+    try:
+        # 队列中仍有同类通知时合并或相互抵消，只保留净变化；超过上限时先丢弃最不重要的最旧通知
+        result, queue_len, dropped = store.push(notification, MAX_PENDING_NOTIFICATIONS)
+    except (ValueError, IOError) as e:
+        logger.error(f"添加待发送通知失败: {e}")
+        return False
+
+    if dropped:
+        dropped_types = ", ".join(sorted({n.get("type", "unknown") for n in dropped}))
+        logger.warning(f"警告：待发送通知队列已满（{MAX_PENDING_NOTIFICATIONS}条），"
+                       f"丢弃 {len(dropped)} 条低优先级通知（{dropped_types}）")
+    if result == "superseded":
+        logger.info(f"队列中已有同类通知，已合并为净变化，当前队列长度: {queue_len}",
+                    extra={"phase": "enqueue", "queue_len": queue_len, "result": result})
+    elif result == "cancelled":
+        logger.info(f"新通知与队列中的通知相互抵消，已取消，当前队列长度: {queue_len}",
+                    extra={"phase": "enqueue", "queue_len": queue_len, "result": result})
+    elif result == "duplicate":
+        logger.info(f"队列中已有相同的通知，忽略重复通知，当前队列长度: {queue_len}",
+                    extra={"phase": "enqueue", "queue_len": queue_len, "result": result})
+    else:
+        logger.info(f"已将通知添加到待发送队列，当前队列长度: {queue_len}",
+                    extra={"phase": "enqueue", "queue_len": queue_len, "result": result})
+
+    # 唤醒心跳服务的发送线程立即处理，不必等到下一轮心跳
+    if result in ("added", "superseded"):
+        sender_worker.wake_sender()
     return True
-    print(f"已将断电通知添加到待发送队列，当前队列长度: {len(notifications)}")
 
-def check_network_status_changes():
-    """检查网络状态变化并发送通知"""
+def check_network_status_changes(send_immediately=True):
+    """检查网络状态变化并发送通知
+
+    Args:
+        send_immediately: 外网正常时直接发送；为 False 时总是加入待发送队列，
+            由发送线程（守护进程的 sender 任务）发送，调用方不会被 Resend API 阻塞
+    """
     current_status = _load_network_status()
     if not current_status:
-        print("无法读取当前网络状态，跳过网络检查")
+        logger.warning("无法读取当前网络状态，跳过网络检查")
         return
     
     history = _load_network_history()
@@ -185,7 +181,7 @@ def check_network_status_changes():
     
     # 如果状态数据太旧（超过5分钟），认为网络检测可能有问题
     if status_age > 300:
-        print(f"警告：网络状态数据已过期 ({status_age} 秒)，可能网络检测服务异常")
+        logger.warning(f"警告：网络状态数据已过期 ({status_age} 秒)，可能网络检测服务异常")
         return
     
     # 检查内网状态变化
@@ -193,22 +189,27 @@ def check_network_status_changes():
     external_changed = (current_status["external_network"] != history["last_external_network"])
 
     if internal_changed or external_changed:
-        # 创建网络状态变化通知对象
+        # 创建网络状态变化通知对象（只保存结构化字段，发送时再渲染邮件）
         notification = {
             "type": "network_status",
+            "template_id": "network_status",
             "timestamp": int(time.time()),
+            "server_name": SERVER_NAME,
             "current_status": current_status,
-            "previous_status": history,
-            "subject": f"[网络状态] 服务器 {SERVER_NAME} 网络连接变化",
-            "html_body": _generate_network_status_email_body(current_status, history)
+            "previous_status": dict(history)
         }
 
         # 只有在外网正常时才立即发送，否则添加到待发送队列
-        if current_status["external_network"]:
-            print("外网正常，立即发送网络状态变化通知...")
-            send_email_with_resend(notification["subject"], notification["html_body"])
+        if current_status["external_network"] and send_immediately:
+            logger.info("外网正常，立即发送网络状态变化通知...")
+            subject, html_body = email_templates.render_notification(notification)
+            send_email_with_resend(subject, html_body,
+                                   idempotency_key=notification_queue.idempotency_key(notification))
+        elif not current_status["external_network"]:
+            logger.info("外网断开，将网络状态变化通知添加到待发送队列...")
+            _add_pending_notification(notification)
         else:
-            print("外网断开，将网络状态变化通知添加到待发送队列...")
+            logger.info("将网络状态变化通知添加到待发送队列，由发送线程发送...")
             _add_pending_notification(notification)
 
         # 更新历史记录
@@ -216,43 +217,18 @@ def check_network_status_changes():
         history["last_external_network"] = current_status["external_network"]
         _save_network_history(history)
 
-        print("网络状态变化已检测")
+        logger.info("网络状态变化已检测")
     else:
-        print("网络状态无变化")
+        logger.info("网络状态无变化")
 
 def _generate_network_status_email_body(current_status, previous_status):
     """生成网络状态变化邮件内容"""
-    internal_status = "恢复正常" if current_status["internal_network"] else "中断"
-    external_status = "恢复正常" if current_status["external_network"] else "中断"
-
-    html_body = f"""
-    <html><body>
-        <h3>服务器网络状态变化通知</h3>
-        <p>服务器 <strong>{escape_html(SERVER_NAME)}</strong> 的网络连接状态发生变化：</p>
-        <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">
-            <tr>
-                <td style="background-color:#f2f2f2;"><strong>网络类型</strong></td>
-                <td style="background-color:#f2f2f2;"><strong>之前状态</strong></td>
-                <td style="background-color:#f2f2f2;"><strong>当前状态</strong></td>
-                <td style="background-color:#f2f2f2;"><strong>变化时间</strong></td>
-            </tr>
-            <tr>
-                <td><strong>内网连接</strong></td>
-                <td>{'正常' if previous_status['last_internal_network'] else '中断'}</td>
-                <td>{'正常' if current_status['internal_network'] else '中断'}</td>
-                <td>{datetime.fromtimestamp(current_status['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}</td>
-            </tr>
-            <tr>
-                <td><strong>外网连接</strong></td>
-                <td>{'正常' if previous_status['last_external_network'] else '中断'}</td>
-                <td>{'正常' if current_status['external_network'] else '中断'}</td>
-                <td>{datetime.fromtimestamp(current_status['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}</td>
-            </tr>
-        </table>
-        <p>DNS解析: {'正常' if current_status['dns_resolution'] else '异常'}</p>
-    </body></html>
-    """
-
+    _, html_body = email_templates.render_notification({
+        "template_id": "network_status",
+        "server_name": SERVER_NAME,
+        "current_status": current_status,
+        "previous_status": previous_status
+    })
     return html_body
 
 def _validate_timestamp(ts):
@@ -281,44 +257,58 @@ def _validate_timestamp(ts):
     return True, None
 
 def main():
-    print("--- 启动检查：断电监控服务（自愈模式） ---")
+    logger.info("--- 启动检查：断电监控服务（自愈模式） ---")
     os.makedirs("/data", exist_ok=True)
     
     # 设置数据目录权限
     try:
         os.chmod("/data", 0o700)  # 仅所有者可读写执行
     except Exception as e:
-        print(f"警告：无法设置目录权限: {e}")
+        logger.warning(f"警告：无法设置目录权限: {e}")
     
     # 检查磁盘空间
     has_enough, total, used, free_gb, free_mb = check_disk_space("/data")
-    print(f"磁盘空间: {get_disk_usage_str('/data')}")
+    logger.info(f"磁盘空间: {get_disk_usage_str('/data')}")
     if not has_enough:
-        print(f"警告：磁盘空间不足（剩余 {free_mb:.1f}MB < 100MB），可能影响正常运行")
+        logger.warning(f"警告：磁盘空间不足（剩余 {free_mb:.1f}MB < 100MB），可能影响正常运行")
     
+    # 读取上次的停止标记（读取后删除，守护进程启动时重新写入）
+    marker = shutdown_marker.read_marker()
+    shutdown_marker.clear()
+    stop_classification = shutdown_marker.classify(marker)
+
+    # 与上次保存的启动 ID 比较，判断主机是否重启过（None 表示无法判断）
+    rebooted = boot_info.host_rebooted(boot_info.read_stored_boot_id())
+
     # 读取两个心跳文件的状态
     ts_a, status_a = _get_valid_timestamp(HEARTBEAT_FILE_A)
     ts_b, status_b = _get_valid_timestamp(HEARTBEAT_FILE_B)
 
     # 自动修复逻辑
     if status_a != "valid" and status_b == "valid":
-        print(f"状态：检测到文件A损坏（{status_a}），文件B正常。")
+        logger.info(f"状态：检测到文件A损坏（{status_a}），文件B正常。")
         _write_timestamp(HEARTBEAT_FILE_A, ts_b)
         ts_a = ts_b
     elif status_b != "valid" and status_a == "valid":
-        print(f"状态：检测到文件B损坏（{status_b}），文件A正常。")
+        logger.info(f"状态：检测到文件B损坏（{status_b}），文件A正常。")
         _write_timestamp(HEARTBEAT_FILE_B, ts_a)
         ts_b = ts_a
     elif status_a != "valid" and status_b != "valid":
-        print("警告：两个心跳文件均无效！")
+        logger.warning("警告：两个心跳文件均无效！")
         _remove_file(HEARTBEAT_FILE_A)
         _remove_file(HEARTBEAT_FILE_B)
-        print("状态：已清理现场。可能是首次运行，本次跳过检查。")
+        logger.info("状态：已清理现场。可能是首次运行，本次跳过检查。")
         return
 
     # 确定最新的有效时间戳
     last_alive_ts = max(ts_a, ts_b)
     power_on_ts = int(time.time())
+
+    # 主机重启过时，真实的通电时间是内核启动时间（不含 BIOS、内核和 Docker 的启动耗时）
+    if rebooted:
+        btime = boot_info.boot_time()
+        if btime is not None and last_alive_ts <= btime <= power_on_ts:
+            power_on_ts = btime
     
     # 验证时间戳合理性
     ts_a_valid, ts_a_error = _validate_timestamp(ts_a)
@@ -326,8 +316,8 @@ def main():
     
     if not ts_a_valid or not ts_b_valid:
         error_msg = ts_a_error if not ts_a_valid else ts_b_error
-        print(f"警告：检测到异常时间戳 - {error_msg}")
-        print("提示：可能是系统时间被调整，使用当前时间作为基准")
+        logger.warning(f"警告：检测到异常时间戳 - {error_msg}")
+        logger.info("提示：可能是系统时间被调整，使用当前时间作为基准")
         # 使用当前时间作为基准，避免负数duration
         last_alive_ts = power_on_ts - OUTAGE_THRESHOLD - 1
     
@@ -335,56 +325,85 @@ def main():
     
     # 再次检查duration，确保不为负数
     if duration_seconds < 0:
-        print(f"警告：检测到时间回拨（duration={duration_seconds}秒）")
-        print("提示：跳过断电检测，可能是系统时间被调回")
+        logger.warning(f"警告：检测到时间回拨（duration={duration_seconds}秒）")
+        logger.info("提示：跳过断电检测，可能是系统时间被调回")
         return
 
-    print(f"最后心跳: {datetime.fromtimestamp(last_alive_ts)}")
-    print(f"当前启动: {datetime.fromtimestamp(power_on_ts)}")
-    print(f"时间差: {duration_seconds} 秒")
+    logger.info(f"最后心跳: {datetime.fromtimestamp(last_alive_ts)}")
+    logger.info(f"当前启动: {datetime.fromtimestamp(power_on_ts)}")
+    logger.info(f"时间差: {duration_seconds} 秒")
+
+    # 主机没有重启时不可能是断电；否则有停止标记时直接按标记判断，没有时退回按心跳间隔判断
+    if rebooted is False:
+        logger.info("上次停止: 主机没有重启（启动 ID 相同），只是容器或服务重启")
+        if stop_classification == shutdown_marker.UNCLEAN_SHUTDOWN:
+            logger.warning("警告：服务上次没有正常退出（进程崩溃或被强制终止）")
+        is_outage = False
+    elif stop_classification == shutdown_marker.CLEAN_SHUTDOWN:
+        logger.info(f"上次停止: 正常停止（{marker.get('reason')}，"
+                    f"{datetime.fromtimestamp(marker['timestamp'])}）")
+        is_outage = False
+    elif stop_classification == shutdown_marker.UNCLEAN_SHUTDOWN:
+        logger.info("上次停止: 异常停止（没有正常停止标记）")
+        is_outage = True
+    else:
+        logger.info(f"上次停止: 没有停止标记，按心跳间隔判断（阈值 {OUTAGE_THRESHOLD} 秒）")
+        is_outage = duration_seconds > OUTAGE_THRESHOLD
 
     # 判断是否为异常断电并发送邮件
-    if duration_seconds > OUTAGE_THRESHOLD:
-        power_off_time = datetime.fromtimestamp(last_alive_ts).strftime('%Y-%m-%d %H:%M:%S')
-        power_on_time = datetime.fromtimestamp(power_on_ts).strftime('%Y-%m-%d %H:%M:%S')
-        h, rem = divmod(duration_seconds, 3600)
-        m, s = divmod(rem, 60)
-        duration_formatted = f"{h:02d} 小时 {m:02d} 分钟 {s:02d} 秒"
-
-        subject = f"[断电警报] 服务器 {SERVER_NAME} 发生异常断电"
-        html_body = f"""
-        <html><body>
-            <h3>服务器断电警报</h3>
-            <p>服务器 <strong>{SERVER_NAME}</strong> 在经历一次异常断电后已恢复运行。</p>
-            <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">
-                <tr><td style="background-color:#f2f2f2;"><strong>大致断电时间</strong></td><td>{power_off_time}</td></tr>
-                <tr><td style="background-color:#f2f2f2;"><strong>恢复通电时间</strong></td><td>{power_on_time}</td></tr>
-                <tr><td style="background-color:#f2f2f2;"><strong>断电持续时间</strong></td><td>{duration_formatted}</td></tr>
-            </table>
-        </body></html>
-        """
-        print("检测到异常断电，添加到待发送队列...")
+    if is_outage:
+        logger.warning("检测到异常断电，添加到待发送队列...")
         
-        # 创建断电通知对象
+        # 创建断电通知对象（只保存结构化字段，发送时再渲染邮件）
         outage_notification = {
             "type": "power_outage",
+            "template_id": "power_outage",
             "timestamp": int(time.time()),
-            "power_off_time": power_off_time,
-            "power_on_time": power_on_time,
-            "duration_formatted": duration_formatted,
+            "server_name": SERVER_NAME,
+            "power_off_ts": last_alive_ts,
+            "power_on_ts": power_on_ts,
             "duration_seconds": duration_seconds,
-            "subject": subject,
-            "html_body": html_body
+            "stop_classification": stop_classification,
+            "host_rebooted": rebooted,
+            "boot_id": boot_info.boot_id()
         }
         
+        # 多台主机共享 spool 目录时，登记本次断电以便合并为站点级事件
+        if outage_correlation.is_enabled():
+            outage_correlation.record_outage(SERVER_NAME, last_alive_ts, power_on_ts)
+        
         # 添加到待发送队列
         _add_pending_notification(outage_notification)
+    elif rebooted is False:
+        logger.info("状态：主机没有重启，判定为服务重启。")
+    elif stop_classification == shutdown_marker.CLEAN_SHUTDOWN:
+        logger.info("状态：上次为正常停止，判定为正常重启或服务重启。")
     else:
-        print("状态：时间差在阈值内，判定为正常重启或服务重启。")
+        logger.info("状态：时间差在阈值内，判定为正常重启或服务重启。")
     
     # 检查网络状态变化
-    print("\n--- 检查网络状态变化 ---")
+    logger.info("--- 检查网络状态变化 ---")
     check_network_status_changes()
 
+def watch_network_status():
+    """持续监听网络状态文件，心跳服务每次写入后立即检查状态变化
+
+    SQLite 后端没有独立的状态文件，按 FILE_WATCH_POLL_INTERVAL 轮询数据库的 WAL 文件。
+
+    Returns:
+        FileWatcher: 已启动的监听线程
+    """
+    if state_store.STATE_BACKEND == "sqlite":
+        watcher = FileWatcher([f"{state_store.STATE_DB}-wal"], lambda path: check_network_status_changes(),
+                              use_inotify=False)
+    else:
+        watcher = FileWatcher([NETWORK_STATUS_FILE], lambda path: check_network_status_changes())
+    watcher.start()
+    logger.info(f"开始监听网络状态变化（{watcher.mode}）")
+    return watcher
+
 if __name__ == "__main__":
+    logger_config.setup_logging()
     main()
+    if "--watch" in sys.argv[1:]:
+        watch_network_status().join()
@@ -0,0 +1,73 @@
+"""指标模块
+
+进程内的计数器和仪表盘，定期以 Prometheus 文本格式写入数据目录，
+可由 node_exporter 的 textfile collector 等工具采集。
+"""
+
+import os
+import threading
+from logger_config import get_logger
+
+logger = get_logger("metrics")
+
+METRICS_FILE = os.getenv("METRICS_FILE", "/data/metrics.prom")
+
+_lock = threading.Lock()
+_counters = {}  # (名称, 标签) -> 数值
+_gauges = {}  # (名称, 标签) -> 数值
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """累加计数器"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """设置仪表盘数值"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def snapshot():
+    """返回当前全部指标 {"counters": {...}, "gauges": {...}}"""
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def _format_line(name, labels, value):
+    if labels:
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{label_str}}} {value}"
+    return f"{name} {value}"
+
+
+def render_text():
+    """以 Prometheus 文本格式输出全部指标"""
+    data = snapshot()
+    lines = []
+    for kind, metrics in (("counter", data["counters"]), ("gauge", data["gauges"])):
+        seen = set()
+        for (name, labels), value in sorted(metrics.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} {kind}")
+                seen.add(name)
+            lines.append(_format_line(name, labels, value))
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    """将指标原子地写入文件"""
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(render_text())
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.error(f"写入指标文件失败: {e}")
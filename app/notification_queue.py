@@ -0,0 +1,853 @@
+"""待发送通知队列模块
+
+main.py 和 heartbeat.py 共用的队列读写。队列中的通知只保存结构化的事件
+字段和 template_id，邮件主题和正文在发送时才渲染；旧版本写入的带
+html_body 的通知在加载时迁移为新格式。
+
+每条通知带有去重键（类型 + 网络类别），NotificationQueue 通过键索引在
+O(1) 时间内找到仍在队列中的旧通知，合并、取消或丢弃重复的新通知。
+队列按优先级（断电 > 网络 > 信息类）发送，超出上限时先淘汰最不重要的通知。
+
+每条通知有稳定的 id（同时作为 Resend 的幂等键），发送成功后立即按 id 确认；
+发送过程中崩溃重启不会重复发送已送达的通知，也不会覆盖发送期间新加入的通知。
+发送方在发送前把通知标记为发送中（sending_until），入队时不再合并或取消
+发送中的通知；被取消或替代的通知 id 记录在 <队列文件>.removed 中，发送方
+读取的队列快照中已被取消的通知不会再发出。
+
+确认、重试状态和发送中标记（只记录 id 和到期时间）以追加方式写入日志文件
+（<队列文件>.journal，每行一条 JSON），读取时合并到队列中；整体重写队列文件
+（入队、压缩）后清空日志。发送时通过 iter_notifications 逐条解析，内存占用
+与队列长度无关。队列文件是 JSON 数组。
+
+仍带已渲染正文的通知（无法迁移的旧通知、临时通知）写入文件时，较大的
+html_body 用带预设字典的 zlib 压缩后保存为 html_body_z，只在发送时解压。
+
+离线压缩：python notification_queue.py compact [队列文件]
+"""
+
+import os
+import sys
+import json
+import argparse
+import time
+import uuid
+import zlib
+import base64
+import hashlib
+from datetime import datetime
+from file_lock import file_lock
+from file_watcher import stat_key
+from logger_config import get_logger
+
+logger = get_logger("notification_queue")
+
+# 跨周期重试：第 n 次失败后等待 RETRY_BASE_DELAY * 2^(n-1) 秒，不超过 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = int(os.getenv("RETRY_BASE_DELAY", 60))
+RETRY_MAX_DELAY = int(os.getenv("RETRY_MAX_DELAY", 6 * 3600))
+# 失败次数达到上限后移入死信文件
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 20))
+# 被取消或替代的通知 id 保留的秒数（发送方读取的队列快照不会比这更旧）
+REMOVED_IDS_TTL = 24 * 3600
+
+# 已渲染正文的存储压缩：zlib 或 none
+QUEUE_COMPRESSION = os.getenv("QUEUE_COMPRESSION", "zlib")
+# 小于此大小（字节）的正文不压缩
+QUEUE_COMPRESS_MIN_BYTES = int(os.getenv("QUEUE_COMPRESS_MIN_BYTES", 256))
+
+# 压缩用的预设字典（邮件正文中常见的 HTML 片段）。字典内容决定了能否解压
+# 已写入的数据，修改时必须使用新的版本前缀并保留旧字典。
+_ZDICT_V1 = (
+    '<html><body>\n    <h3></h3>\n    <p>服务器 <strong></strong> </p>\n'
+    '    <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">\n'
+    '        <tr>\n            <td style="background-color:#f2f2f2;"><strong></strong></td>\n'
+    '            <td></td>\n        </tr>\n    </table>\n</body></html>'
+    '断电时间恢复通电时间断电持续时间网络状态内网连接外网连接正常中断异常'
+    'Server Network Status Power Outage Internal External network Up Down'
+).encode('utf-8')
+_ZDICTS = {"z1": _ZDICT_V1}
+_ZDICT_CURRENT = "z1"
+
+# 本进程最近一次写入各队列文件后的 (inode, 大小, 修改时间)
+_written_versions = {}
+
+# 旧格式中断电时间的字符串格式
+_LEGACY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def compress_body(notification):
+    """压缩通知中较大的已渲染正文
+
+    Returns:
+        dict: 正文已压缩的通知（无需压缩时返回原对象）
+    """
+    body = notification.get("html_body")
+    if QUEUE_COMPRESSION != "zlib" or not isinstance(body, str):
+        return notification
+    raw = body.encode('utf-8')
+    if len(raw) < QUEUE_COMPRESS_MIN_BYTES:
+        return notification
+    compressor = zlib.compressobj(6, zdict=_ZDICTS[_ZDICT_CURRENT])
+    data = compressor.compress(raw) + compressor.flush()
+    compressed = {k: v for k, v in notification.items() if k != "html_body"}
+    compressed["html_body_z"] = f"{_ZDICT_CURRENT}:{base64.b64encode(data).decode('ascii')}"
+    return compressed
+
+
+def body_of(notification):
+    """读取通知的已渲染正文（发送时按需解压）
+
+    Raises:
+        KeyError: 通知没有已渲染的正文
+        ValueError: 压缩数据损坏或字典版本未知
+    """
+    if "html_body" in notification:
+        return notification["html_body"]
+    version, _, encoded = notification["html_body_z"].partition(":")
+    if version not in _ZDICTS:
+        raise ValueError(f"未知的正文压缩格式: {version}")
+    try:
+        decompressor = zlib.decompressobj(zdict=_ZDICTS[version])
+        data = decompressor.decompress(base64.b64decode(encoded)) + decompressor.flush()
+    except (zlib.error, base64.binascii.Error) as e:
+        raise ValueError(f"正文压缩数据损坏: {e}")
+    return data.decode('utf-8')
+
+
+def _parse_legacy_time(value):
+    """将旧格式的时间字符串转换为时间戳"""
+    return int(datetime.strptime(value, _LEGACY_TIME_FORMAT).timestamp())
+
+
+def migrate_notification(notification, server_name):
+    """将旧格式（带已渲染 html_body）的通知迁移为结构化格式
+
+    缺少结构化字段、无法迁移的通知原样保留，发送时直接使用已渲染的内容。
+
+    Args:
+        notification: 通知对象
+        server_name: 旧格式中缺少服务器名称时使用的默认值
+
+    Returns:
+        dict: 迁移后的通知
+    """
+    if "template_id" in notification or ("html_body" not in notification and "html_body_z" not in notification):
+        return notification
+
+    migrated = None
+    try:
+        if notification.get("type") == "power_outage":
+            migrated = {
+                "type": "power_outage",
+                "template_id": "power_outage",
+                "timestamp": notification.get("timestamp"),
+                "server_name": notification.get("server_name", server_name),
+                "power_off_ts": notification.get("power_off_ts") or _parse_legacy_time(notification["power_off_time"]),
+                "power_on_ts": notification.get("power_on_ts") or _parse_legacy_time(notification["power_on_time"]),
+            }
+        elif notification.get("type") == "network_status":
+            migrated = {
+                "type": "network_status",
+                "template_id": "network_status",
+                "timestamp": notification.get("timestamp"),
+                "server_name": notification.get("server_name", server_name),
+                "current_status": notification["current_status"],
+                "previous_status": notification["previous_status"],
+            }
+    except (KeyError, TypeError, ValueError):
+        migrated = None
+
+    return migrated or notification
+
+
+# 计算旧通知内容哈希时忽略的字段（发送状态和队列内部字段）
+_VOLATILE_FIELDS = frozenset({
+    "id", "attempts", "last_error", "last_attempt_at", "next_attempt_at",
+    "dedup_key", "superseded_count", "sending_until",
+})
+
+
+def new_id():
+    """为新通知生成 id"""
+    return uuid.uuid4().hex
+
+
+def legacy_id(notification):
+    """为没有 id 的旧通知从内容计算 id（重复读取得到相同的 id）"""
+    content = {k: v for k, v in notification.items() if k not in _VOLATILE_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def ensure_id(notification):
+    """确保通知有 id 并返回"""
+    if not notification.get("id"):
+        notification["id"] = legacy_id(notification)
+    return notification["id"]
+
+
+def idempotency_key(notification):
+    """通知对应的 Resend 幂等键"""
+    return f"notification/{ensure_id(notification)}"
+
+
+def dedup_key(notification):
+    """计算通知的去重键
+
+    - 网络状态变化：类型 + 发生变化的网络类别（internal / external / all），
+      同一类别的后续变化会合并到队列中较早的通知
+    - 断电：类型 + 服务器 + 断电时间，同一次断电只保留一条
+    - 其他通知不去重
+
+    Returns:
+        str 或 None
+    """
+    kind = notification.get("type")
+    try:
+        if kind == "network_status":
+            current = notification["current_status"]
+            previous = notification["previous_status"]
+            internal = current["internal_network"] != previous["last_internal_network"]
+            external = current["external_network"] != previous["last_external_network"]
+            network_class = "all" if internal and external else ("internal" if internal else "external")
+            return f"network_status:{network_class}"
+        if kind == "power_outage" and "power_off_ts" in notification:
+            return f"power_outage:{notification.get('server_name', '')}:{notification['power_off_ts']}"
+    except (KeyError, TypeError):
+        return None
+    return None
+
+
+def _net_change_is_zero(notification):
+    """合并后的网络状态变化是否已抵消（前后状态一致）"""
+    current = notification["current_status"]
+    previous = notification["previous_status"]
+    return (current["internal_network"] == previous["last_internal_network"] and
+            current["external_network"] == previous["last_external_network"])
+
+
+# 每种入队结果避免的发送次数
+AVOIDED_SENDS = {"added": 0, "duplicate": 1, "superseded": 1, "cancelled": 2}
+
+
+def prepare_push(notification):
+    """入队前补全去重键和 id，返回去重键（可能为 None）"""
+    key = notification.get("dedup_key") or dedup_key(notification)
+    if key:
+        notification["dedup_key"] = key
+    if not notification.get("id"):
+        notification["id"] = new_id()
+    return key
+
+
+def is_sending(notification, now=None):
+    """通知是否已被发送方标记为发送中（标记在租期结束后失效）"""
+    now = time.time() if now is None else now
+    return notification.get("sending_until", 0) > now
+
+
+def resolve_push(existing, notification, in_flight=False):
+    """决定新通知如何与队列中同一去重键的较早通知合并
+
+    Args:
+        existing: 队列中同一去重键的通知（没有时为 None）
+        notification: 新通知（已经过 prepare_push）
+        in_flight: existing 可能正在发送，此时新的网络通知单独入队
+
+    Returns:
+        (结果, 合并后的通知): 结果为 "added"、"duplicate"、"cancelled" 或
+        "superseded"；只有 "superseded" 时返回替换 existing 的合并通知
+    """
+    if existing is None:
+        return "added", None
+    if notification.get("type") != "network_status":
+        return "duplicate", None
+    if in_flight:
+        # 较早的通知可能已经送达：取消或改写它会丢失之后的变化
+        return "added", None
+
+    # 保留最早的之前状态和最新的当前状态，只发送净变化
+    merged = dict(notification, previous_status=existing["previous_status"])
+    if _net_change_is_zero(merged):
+        return "cancelled", None
+
+    merged["superseded_count"] = existing.get("superseded_count", 0) + 1
+    # 内容已变化，使用新的 id：正在发送的旧通知确认时不会误删合并后的通知
+    merged["id"] = new_id()
+    return "superseded", merged
+
+
+# 优先级（数值越小越重要）：断电 > 网络 > 信息类
+PRIORITY_POWER_OUTAGE = 0
+PRIORITY_NETWORK = 1
+PRIORITY_INFO = 2
+PRIORITY_LEVELS = (PRIORITY_POWER_OUTAGE, PRIORITY_NETWORK, PRIORITY_INFO)
+
+_TYPE_PRIORITIES = {
+    "power_outage": PRIORITY_POWER_OUTAGE,
+    "network_status": PRIORITY_NETWORK,
+}
+
+
+def priority_of(notification):
+    """获取通知的优先级（可由通知的 priority 字段显式指定）"""
+    priority = notification.get("priority")
+    if priority in PRIORITY_LEVELS:
+        return priority
+    return _TYPE_PRIORITIES.get(notification.get("type"), PRIORITY_INFO)
+
+
+class NotificationQueue:
+    """按优先级分桶、带去重/替代索引的通知队列
+
+    每个优先级一个按插入顺序排列的桶，优先级数量固定，因此入队、出队
+    （最重要的最旧通知）和淘汰（最不重要的最旧通知）均为 O(1)；去重键
+    索引指向仍在队列中的通知，查找、替换和取消同样为 O(1)。
+    """
+
+    def __init__(self, notifications=()):
+        self._buckets = {priority: {} for priority in PRIORITY_LEVELS}  # 优先级 -> {序号: 通知}
+        self._index = {}  # 去重键 -> (优先级, 序号)
+        self._seq = 0
+        self.avoided_sends = 0  # 本次操作中因合并/取消/重复而避免的发送次数
+        for notification in notifications:
+            self._append(notification)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def _append(self, notification):
+        priority = priority_of(notification)
+        seq = self._seq
+        self._seq += 1
+        self._buckets[priority][seq] = notification
+        key = notification.get("dedup_key")
+        if key:
+            self._index[key] = (priority, seq)
+        return priority, seq
+
+    def _remove(self, priority, seq):
+        notification = self._buckets[priority].pop(seq)
+        key = notification.get("dedup_key")
+        if key and self._index.get(key) == (priority, seq):
+            del self._index[key]
+        return notification
+
+    def find(self, key):
+        """按去重键查找仍在队列中的通知"""
+        location = self._index.get(key)
+        if location is None:
+            return None
+        priority, seq = location
+        return self._buckets[priority][seq]
+
+    def push(self, notification):
+        """加入通知，必要时合并或取消队列中较早的同类通知
+
+        Returns:
+            str: "added" 新增，"superseded" 合并到较早的通知，
+            "cancelled" 与较早的通知相互抵消，"duplicate" 重复通知被丢弃
+        """
+        key = prepare_push(notification)
+        location = self._index.get(key) if key else None
+        existing = self._buckets[location[0]][location[1]] if location else None
+        result, merged = resolve_push(existing, notification, existing is not None and is_sending(existing))
+        self.avoided_sends += AVOIDED_SENDS[result]
+        if result == "added":
+            self._append(notification)
+        elif result == "cancelled":
+            self._remove(*location)
+        elif result == "superseded":
+            self._buckets[location[0]][location[1]] = merged
+        return result
+
+    def pop(self):
+        """取出最重要的最旧通知，队列为空时返回 None"""
+        for priority in PRIORITY_LEVELS:
+            bucket = self._buckets[priority]
+            if bucket:
+                return self._remove(priority, next(iter(bucket)))
+        return None
+
+    def trim(self, max_size):
+        """队列超过上限时优先丢弃最不重要的最旧通知
+
+        Returns:
+            list: 被丢弃的通知
+        """
+        dropped = []
+        excess = len(self) - max_size
+        for priority in reversed(PRIORITY_LEVELS):
+            bucket = self._buckets[priority]
+            while excess > 0 and bucket:
+                dropped.append(self._remove(priority, next(iter(bucket))))
+                excess -= 1
+        return dropped
+
+    def to_list(self):
+        """按发送顺序（优先级，其次入队顺序）返回通知列表"""
+        notifications = []
+        for priority in PRIORITY_LEVELS:
+            notifications.extend(self._buckets[priority].values())
+        return notifications
+
+
+def is_due(notification, now=None):
+    """通知是否已到下一次尝试时间"""
+    now = time.time() if now is None else now
+    return notification.get("next_attempt_at", 0) <= now
+
+
+def schedule_retry(notification, error_class, now=None):
+    """记录一次发送失败并计算下一次尝试时间
+
+    尝试次数和下一次尝试时间保存在通知中，随队列持久化，重启后退避继续生效。
+
+    Args:
+        notification: 通知对象（原地更新）
+        error_class: 失败的错误类别（异常类名）
+
+    Returns:
+        bool: 还可以继续重试返回 True，已达到最大尝试次数返回 False
+    """
+    now = int(time.time()) if now is None else int(now)
+    attempts = notification.get("attempts", 0) + 1
+    notification["attempts"] = attempts
+    notification["last_error"] = error_class
+    notification["last_attempt_at"] = now
+    delay = min(RETRY_BASE_DELAY * (2 ** (attempts - 1)), RETRY_MAX_DELAY)
+    notification["next_attempt_at"] = now + delay
+    return attempts < RETRY_MAX_ATTEMPTS
+
+
+def append_dead_letters(path, notifications):
+    """将永久失败的通知追加到死信文件"""
+    if not notifications:
+        return
+    try:
+        with file_lock(path):
+            dead_letters = []
+            if os.path.isfile(path):
+                try:
+                    with open(path, 'r') as f:
+                        dead_letters = json.load(f)
+                except json.JSONDecodeError:
+                    dead_letters = []
+            dead_letters.extend(notifications)
+            with open(path, 'w') as f:
+                json.dump(dead_letters, f, separators=(',', ':'), ensure_ascii=False)
+    except IOError as e:
+        logger.error(f"写入死信文件失败: {e}")
+
+
+def trim_dead_letters(path, keep):
+    """只保留最近的 keep 条死信（磁盘空间紧张时降载）
+
+    Returns:
+        int: 删除的条数
+    """
+    try:
+        with file_lock(path):
+            if not os.path.isfile(path):
+                return 0
+            with open(path, 'r') as f:
+                dead_letters = json.load(f)
+            removed = max(len(dead_letters) - keep, 0)
+            if removed:
+                _write_array(path, dead_letters[removed:])
+            return removed
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"裁剪死信文件失败: {e}")
+        return 0
+
+
+def _stats_path(path):
+    """队列统计文件路径"""
+    return f"{path}.stats"
+
+
+def record_avoided_sends(path, count):
+    """累加因合并/取消而避免的发送次数（调用方负责加锁）"""
+    if count <= 0:
+        return
+    stats_path = _stats_path(path)
+    stats = {"avoided_sends": 0}
+    try:
+        with open(stats_path, 'r') as f:
+            stats = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        pass
+    stats["avoided_sends"] = stats.get("avoided_sends", 0) + count
+    try:
+        with open(stats_path, 'w') as f:
+            json.dump(stats, f)
+    except IOError as e:
+        logger.error(f"保存队列统计失败: {e}")
+
+
+def pop_avoided_sends(path):
+    """读取并清零避免的发送次数（调用方负责加锁）"""
+    stats_path = _stats_path(path)
+    try:
+        with open(stats_path, 'r') as f:
+            count = json.load(f).get("avoided_sends", 0)
+        os.remove(stats_path)
+        return count
+    except (json.JSONDecodeError, IOError, OSError):
+        return 0
+
+
+def _removed_path(path):
+    """已取消或替代的通知 id 文件路径"""
+    return f"{path}.removed"
+
+
+def load_removed_ids(path):
+    """读取已取消或替代的通知 id（调用方负责加锁）
+
+    Returns:
+        dict: id -> 移除时间
+    """
+    try:
+        with open(_removed_path(path), 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+
+def record_removed_ids(path, notification_ids, now=None):
+    """记录被取消或替代的通知 id，同时清理超过 REMOVED_IDS_TTL 的旧记录（调用方负责加锁）"""
+    if not notification_ids:
+        return
+    now = int(time.time()) if now is None else int(now)
+    removed = {notification_id: ts for notification_id, ts in load_removed_ids(path).items()
+               if now - ts < REMOVED_IDS_TTL}
+    removed.update((notification_id, now) for notification_id in notification_ids)
+    try:
+        with open(_removed_path(path), 'w') as f:
+            json.dump(removed, f)
+    except IOError as e:
+        logger.error(f"保存已取消的通知失败: {e}")
+
+
+def mark_sending(path, notification, until):
+    """将仍在队列中的通知标记为发送中
+
+    Returns:
+        bool: 通知已被取消或替代时返回 False，不应再发送
+    """
+    with file_lock(path):
+        if notification["id"] in load_removed_ids(path):
+            return False
+        _append_journal(path, {"sending": notification["id"], "until": until})
+    return True
+
+
+def clear_sending(path, notification):
+    """清除发送中标记（本轮没有调用 API 就停止发送时）"""
+    with file_lock(path):
+        _append_journal(path, {"sending": notification["id"], "until": None})
+
+
+def _journal_path(path):
+    """确认日志文件路径"""
+    return f"{path}.journal"
+
+
+def load_journal(path):
+    """读取确认日志
+
+    Returns:
+        (acked, updates, sending): 已确认的 id 集合，id -> 更新后的通知，
+        id -> 发送中标记的到期时间（None 表示已清除）
+    """
+    acked = set()
+    updates = {}
+    sending = {}
+    try:
+        with open(_journal_path(path), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 写入一半时崩溃留下的不完整行
+                if "ack" in entry:
+                    acked.add(entry["ack"])
+                    updates.pop(entry["ack"], None)
+                    sending.pop(entry["ack"], None)
+                elif "update" in entry and entry["update"].get("id") not in acked:
+                    updates[entry["update"]["id"]] = entry["update"]
+                    sending.pop(entry["update"]["id"], None)
+                elif "sending" in entry and entry["sending"] not in acked:
+                    sending[entry["sending"]] = entry.get("until")
+    except (IOError, OSError):
+        pass
+    return acked, updates, sending
+
+
+def _append_journal(path, entry):
+    """追加一条确认日志（调用方负责加锁）"""
+    if "update" in entry:
+        entry = {"update": compress_body(entry["update"])}
+    with open(_journal_path(path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + "\n")
+
+
+def _clear_journal(path):
+    """删除确认日志（队列文件已整体重写）"""
+    try:
+        os.remove(_journal_path(path))
+    except OSError:
+        pass
+
+
+def _prepare(notification, server_name, acked, updates, sending):
+    """迁移通知、补全 id 并应用确认日志，已确认的通知返回 None"""
+    notification = migrate_notification(notification, server_name)
+    notification_id = ensure_id(notification)
+    if notification_id in acked:
+        return None
+    notification = updates.get(notification_id, notification)
+    if notification_id in sending:
+        until = sending[notification_id]
+        notification = {k: v for k, v in notification.items() if k != "sending_until"}
+        if until is not None:
+            notification["sending_until"] = until
+    return notification
+
+
+def iter_json_array(f, chunk_size=64 * 1024):
+    """逐个解析文件中 JSON 数组的元素，内存占用只取决于单个元素的大小
+
+    Args:
+        f: 以文本模式打开的文件
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        数组元素
+
+    Raises:
+        json.JSONDecodeError: 文件格式错误或不完整
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    state = "start"  # start -> value_or_end -> comma_or_end <-> value
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+
+        if pos >= len(buf):
+            if state == "start":
+                return  # 空文件
+            raise json.JSONDecodeError("Unterminated array", buf, pos)
+
+        char = buf[pos]
+        if state == "start":
+            if char != "[":
+                raise json.JSONDecodeError("Expecting '['", buf, pos)
+            pos += 1
+            state = "value_or_end"
+        elif state in ("value_or_end", "comma_or_end") and char == "]":
+            return
+        elif state == "comma_or_end":
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+            pos += 1
+            state = "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end >= len(buf) and not eof:
+                fill()  # 元素可能恰好在缓冲区末尾被截断（如数字），读入更多内容后重新解析
+                continue
+            yield value
+            pos = end
+            state = "comma_or_end"
+
+
+def iter_notifications(path, server_name="Unknown Server", chunk_size=64 * 1024):
+    """逐条读取队列（不加锁，已应用确认日志）
+
+    队列文件通过原子替换更新，迭代期间读取的始终是打开时的完整版本。
+
+    Yields:
+        dict: 通知（已迁移为新格式）
+    """
+    if not os.path.isfile(path):
+        return
+    acked, updates, sending = load_journal(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        for notification in iter_json_array(f, chunk_size):
+            notification = _prepare(notification, server_name, acked, updates, sending)
+            if notification is not None:
+                yield notification
+
+
+def read_notifications(path, server_name="Unknown Server"):
+    """读取队列文件（调用方负责加锁）
+
+    Returns:
+        list: 通知列表（已迁移为新格式，已应用确认日志）
+
+    Raises:
+        ValueError, IOError: 文件损坏（json.JSONDecodeError）或读取失败
+    """
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        notifications = json.load(f)
+    acked, updates, sending = load_journal(path)
+    prepared = (_prepare(n, server_name, acked, updates, sending) for n in notifications)
+    return [n for n in prepared if n is not None]
+
+
+def _write_array(path, notifications):
+    """逐条写入 JSON 数组到临时文件后原子替换（调用方负责加锁）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for i, notification in enumerate(notifications):
+            if i:
+                f.write(",")
+            f.write(json.dumps(compress_body(notification), separators=(',', ':'), ensure_ascii=False))
+        f.write("]")
+    os.replace(tmp_path, path)
+    _written_versions[os.path.abspath(path)] = stat_key(path)
+
+
+def written_by_this_process(path):
+    """队列文件的当前版本是否由本进程写入（队列文件监听据此忽略发送线程自己的压缩）
+
+    在文件锁内比较：正在进行的写入完成并记录版本后才判断，不会把自己的写入误认为外部变化。
+    """
+    try:
+        with file_lock(path):
+            key = stat_key(path)
+    except TimeoutError:
+        return False
+    return key is not None and _written_versions.get(os.path.abspath(path)) == key
+
+
+def write_notifications(path, notifications):
+    """原子地写入队列文件（调用方负责加锁，通知需已应用确认日志）"""
+    _write_array(path, notifications)
+    _clear_journal(path)
+
+
+def compact_notifications(path, server_name="Unknown Server"):
+    """将确认日志合并到队列文件中（流式处理，内存占用与队列长度无关）
+
+    Returns:
+        int: 压缩后的通知数量；读取失败时返回 None
+    """
+    try:
+        with file_lock(path):
+            if not os.path.isfile(_journal_path(path)):
+                return None
+            count = 0
+
+            def counted():
+                nonlocal count
+                for notification in iter_notifications(path, server_name):
+                    count += 1
+                    yield notification
+
+            _write_array(path, counted())
+            _clear_journal(path)
+            return count
+    except (ValueError, IOError) as e:
+        logger.error(f"压缩待发送通知失败: {e}")
+        return None
+
+
+def drop_notifications(path, predicate, server_name="Unknown Server"):
+    """删除队列中满足条件的通知
+
+    Returns:
+        int: 删除的条数
+    """
+    try:
+        with file_lock(path):
+            notifications = read_notifications(path, server_name)
+            kept = [n for n in notifications if not predicate(n)]
+            if len(kept) != len(notifications):
+                write_notifications(path, kept)
+            return len(notifications) - len(kept)
+    except (ValueError, IOError) as e:
+        logger.error(f"删除待发送通知失败: {e}")
+        return 0
+
+
+def ack_notification(path, notification_id):
+    """确认通知已处理（发送成功、已合并或移入死信）"""
+    try:
+        with file_lock(path):
+            _append_journal(path, {"ack": notification_id})
+    except IOError as e:
+        logger.error(f"确认通知失败: {e}")
+
+
+def update_notification(path, notification):
+    """保存通知的重试状态；通知已被取消或替代时在读取时忽略"""
+    try:
+        with file_lock(path):
+            _append_journal(path, {"update": notification})
+    except IOError as e:
+        logger.error(f"更新待发送通知失败: {e}")
+
+
+def load_notifications(path, server_name="Unknown Server"):
+    """加锁读取队列，读取失败时返回空列表"""
+    try:
+        with file_lock(path):
+            return read_notifications(path, server_name)
+    except (ValueError, IOError):
+        return []
+
+
+def save_notifications(path, notifications):
+    """加锁写入队列"""
+    try:
+        with file_lock(path):
+            write_notifications(path, notifications)
+    except IOError as e:
+        logger.error(f"保存待发送通知失败: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="待发送通知队列维护工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="合并确认日志，删除已确认的通知")
+    compact_parser.add_argument("path", nargs="?", default="/data/pending_notifications.log", help="队列文件")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        count = compact_notifications(args.path)
+        if count is None:
+            print("没有需要合并的确认日志")
+        else:
+            print(f"压缩完成，队列中剩余 {count} 个通知")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
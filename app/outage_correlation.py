@@ -0,0 +1,193 @@
+"""断电事件关联模块
+
+多台服务器共享同一个 spool 目录时，把断电时间窗口相互重叠的多条
+power_outage 通知合并为一个站点级事件，只发送一封列出全部受影响
+主机的邮件。
+
+认领在 spool 目录的文件锁内完成：同时结束关联窗口的多台主机依次认领，
+先拿到锁的主机认领全部重叠记录（包括其他主机自己的记录），其余主机随后
+发现自己的记录已被认领，不会各自发送一封只包含部分主机的邮件。
+"""
+
+import os
+import json
+import time
+import hashlib
+import email_templates
+from file_lock import file_lock
+from logger_config import get_logger
+
+logger = get_logger("outage_correlation")
+
+# 共享 spool 目录（为空表示不启用关联，每台主机独立发送）
+OUTAGE_SPOOL_DIR = os.getenv("OUTAGE_SPOOL_DIR", "")
+# 关联窗口（秒）：恢复通电后等待其他主机登记的时间，也是判断窗口重叠的容差
+OUTAGE_CORRELATION_WINDOW = int(os.getenv("OUTAGE_CORRELATION_WINDOW", 120))
+# spool 记录保留时间（秒）
+OUTAGE_SPOOL_RETENTION = int(os.getenv("OUTAGE_SPOOL_RETENTION", 7 * 24 * 3600))
+
+
+def is_enabled():
+    """是否启用了跨主机断电关联"""
+    return bool(OUTAGE_SPOOL_DIR)
+
+
+def _record_path(server_name, power_on_ts):
+    """根据服务器名称和通电时间生成 spool 记录路径
+
+    服务器名称可能包含中文等字符，使用哈希生成安全的文件名。
+    """
+    name_hash = hashlib.sha1(server_name.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(OUTAGE_SPOOL_DIR, f"outage_{name_hash}_{power_on_ts}.json")
+
+
+def record_outage(server_name, power_off_ts, power_on_ts):
+    """在共享 spool 目录中登记一次断电
+
+    Args:
+        server_name: 服务器名称
+        power_off_ts: 最后心跳时间戳（大致断电时间）
+        power_on_ts: 恢复通电时间戳
+
+    Returns:
+        bool: 是否登记成功
+    """
+    if not is_enabled():
+        return False
+
+    record = {
+        "server_name": server_name,
+        "power_off_ts": power_off_ts,
+        "power_on_ts": power_on_ts,
+    }
+    path = _record_path(server_name, power_on_ts)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(OUTAGE_SPOOL_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)  # 原子替换，其他主机不会读到半写的记录
+    except OSError as e:
+        logger.error(f"登记断电事件到共享目录失败: {e}")
+        return False
+
+    cleanup_spool()
+    return True
+
+
+def _load_records():
+    """读取 spool 目录中的全部断电记录，返回 [(路径, 记录)]"""
+    records = []
+    try:
+        names = os.listdir(OUTAGE_SPOOL_DIR)
+    except OSError:
+        return records
+
+    for name in names:
+        if not (name.startswith("outage_") and name.endswith(".json")):
+            continue
+        path = os.path.join(OUTAGE_SPOOL_DIR, name)
+        try:
+            with open(path, 'r') as f:
+                records.append((path, json.load(f)))
+        except (json.JSONDecodeError, IOError):
+            continue
+    return records
+
+
+def _incident_lock_path():
+    """站点级事件认领共用的锁路径（spool 目录中的 incident.lock）"""
+    return os.path.join(OUTAGE_SPOOL_DIR, "incident")
+
+
+def _windows_overlap(a, b, tolerance):
+    """判断两个断电窗口是否重叠（带容差）"""
+    return (a["power_off_ts"] <= b["power_on_ts"] + tolerance and
+            b["power_off_ts"] <= a["power_on_ts"] + tolerance)
+
+
+def _try_claim(record_path, claimer):
+    """原子地认领一条记录，返回认领者名称
+
+    使用 O_EXCL 创建认领文件，保证每条记录只被一台主机报告。
+    """
+    claim_path = f"{record_path}.claim"
+    try:
+        fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        try:
+            with open(claim_path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except IOError:
+            return ""
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(claimer)
+    return claimer
+
+
+def is_settled(notification, now=None):
+    """关联窗口是否已结束（其他主机应已完成登记）"""
+    now = int(time.time()) if now is None else now
+    return now >= notification["power_on_ts"] + OUTAGE_CORRELATION_WINDOW
+
+
+def claim_incident(server_name, power_off_ts, power_on_ts):
+    """认领与本机断电窗口重叠的全部未报告记录
+
+    Args:
+        server_name: 本机服务器名称
+        power_off_ts: 本机断电时间戳
+        power_on_ts: 本机通电时间戳
+
+    Returns:
+        (claimed_records, owner): 本机负责报告的记录列表；如果本机记录已被
+        其他主机认领，返回 ([], 认领者名称)
+
+    Raises:
+        TimeoutError: 无法获取 spool 目录的文件锁
+    """
+    own = {"server_name": server_name, "power_off_ts": power_off_ts, "power_on_ts": power_on_ts}
+    own_path = _record_path(server_name, power_on_ts)
+
+    # 检查本机记录和认领重叠记录在同一个锁内完成，不会有两台主机各自认领一部分
+    with file_lock(_incident_lock_path()):
+        owner = _try_claim(own_path, server_name)
+        if owner != server_name:
+            return [], owner
+
+        claimed = [own]
+        for path, record in _load_records():
+            if path == own_path:
+                continue
+            if not _windows_overlap(own, record, OUTAGE_CORRELATION_WINDOW):
+                continue
+            if _try_claim(path, server_name) == server_name:
+                claimed.append(record)
+
+    claimed.sort(key=lambda r: (r["power_off_ts"], r["server_name"]))
+    return claimed, server_name
+
+
+def cleanup_spool(now=None):
+    """删除超过保留期限的 spool 记录及其认领文件"""
+    now = int(time.time()) if now is None else now
+    for path, record in _load_records():
+        if now - record.get("power_on_ts", now) <= OUTAGE_SPOOL_RETENTION:
+            continue
+        for stale in (path, f"{path}.claim"):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def generate_incident_email(records):
+    """生成站点级断电事件邮件
+
+    Args:
+        records: claim_incident 返回的记录列表
+
+    Returns:
+        (subject, html_body)
+    """
+    return email_templates.render_notification({"template_id": "outage_incident", "incident": records})
@@ -0,0 +1,177 @@
+"""发送限速模块
+
+令牌桶限制调用 Resend API 的速率：令牌按 rate 个/秒补充，最多积攒 burst 个，
+每次调用消耗一个。收到 429 时速率减半并在 Retry-After 期间暂停，之后每次
+成功发送逐步恢复到配置的速率（AIMD）。
+
+状态保存在数据目录的 JSON 文件中并通过文件锁读写，共享 /data 的多个进程
+（main.py、heartbeat.py 及其他发送路径）使用同一个令牌桶。
+"""
+
+import os
+import json
+import time
+from file_lock import file_lock
+from logger_config import get_logger
+
+logger = get_logger("rate_limiter")
+
+
+class RateLimitExceeded(Exception):
+    """在等待时限内没有获得令牌"""
+
+
+class TokenBucket:
+    """持久化、自适应的令牌桶"""
+
+    def __init__(self, state_file, rate=2.0, burst=2, min_rate=0.1):
+        """
+        初始化令牌桶
+
+        Args:
+            state_file: 状态文件路径（为空则只保存在内存中）
+            rate: 配置的速率（个/秒）
+            burst: 令牌桶容量
+            min_rate: 收到 429 后速率下调的下限
+        """
+        self.state_file = state_file
+        self.max_rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self._memory_state = self._default_state()
+
+    def _default_state(self):
+        return {
+            "tokens": self.burst,
+            "updated_at": 0,
+            "rate": self.max_rate,
+            "blocked_until": 0,
+        }
+
+    def _read(self):
+        """读取状态（调用方负责加锁）"""
+        if not self.state_file:
+            return self._memory_state
+        if not os.path.isfile(self.state_file):
+            return self._default_state()
+        try:
+            with open(self.state_file, 'r') as f:
+                return dict(self._default_state(), **json.load(f))
+        except (json.JSONDecodeError, IOError):
+            return self._default_state()
+
+    def _write(self, state):
+        """写入状态（调用方负责加锁）"""
+        if not self.state_file:
+            self._memory_state = state
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        except (IOError, OSError) as e:
+            logger.error(f"保存限速状态失败: {e}")
+
+    def _update(self, func):
+        """在锁内读取-修改-写入状态（状态没有变化时不写文件）"""
+        if not self.state_file:
+            return func(self._memory_state)
+        with file_lock(self.state_file):
+            state = self._read()
+            before = dict(state)
+            result = func(state)
+            if state != before:
+                self._write(state)
+            return result
+
+    def _refill(self, state, now):
+        """按经过的时间补充令牌"""
+        # 配置变小时（如重新部署）以当前配置为准
+        state["rate"] = min(max(state["rate"], self.min_rate), self.max_rate)
+        elapsed = max(now - state["updated_at"], 0)
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+        state["updated_at"] = now
+
+    def reserve(self, now=None):
+        """尝试取得一个令牌
+
+        Returns:
+            float: 0 表示已取得令牌；否则为还需等待的秒数
+        """
+        now = time.time() if now is None else now
+
+        def take(state):
+            tokens, updated_at = state["tokens"], state["updated_at"]
+            self._refill(state, now)
+            if now >= state["blocked_until"] and state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0.0
+            if now < state["blocked_until"]:
+                wait = state["blocked_until"] - now
+            else:
+                wait = (1 - state["tokens"]) / state["rate"]
+            # 没有取得令牌：补充的令牌之后可按时间重新计算，不必写回
+            state["tokens"], state["updated_at"] = tokens, updated_at
+            return wait
+
+        return self._update(take)
+
+    def acquire(self, timeout=None):
+        """阻塞直到取得令牌
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Raises:
+            RateLimitExceeded: 在 timeout 内没有取得令牌
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"发送限速：需要等待 {wait:.1f} 秒，超出等待时限")
+            time.sleep(wait)
+
+    def blocked_for(self, now=None):
+        """Retry-After 暂停还剩多少秒（只读取状态，不消耗令牌）"""
+        now = time.time() if now is None else now
+        return max(self.snapshot()["blocked_until"] - now, 0)
+
+    def on_rate_limited(self, retry_after=None, now=None):
+        """收到 429：速率减半，清空令牌，并在 Retry-After 期间暂停发送"""
+        now = time.time() if now is None else now
+
+        def apply(state):
+            self._refill(state, now)
+            state["rate"] = max(state["rate"] / 2, self.min_rate)
+            state["tokens"] = 0
+            if retry_after:
+                state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+            logger.warning(f"收到限流响应，发送速率降至 {state['rate']:.2f} 封/秒")
+
+        self._update(apply)
+
+    def on_success(self):
+        """发送成功：速率逐步恢复到配置值"""
+
+        def apply(state):
+            if state["rate"] < self.max_rate:
+                # 先按旧速率补充令牌，新速率只作用于之后的时间
+                self._refill(state, time.time())
+                state["rate"] = min(self.max_rate, state["rate"] + self.max_rate / 10)
+
+        self._update(apply)
+
+    def snapshot(self):
+        """返回当前状态（用于指标导出）"""
+        if not self.state_file:
+            return dict(self._memory_state)
+        try:
+            with file_lock(self.state_file):
+                return self._read()
+        except (IOError, TimeoutError):
+            return self._default_state()
@@ -1,87 +1,203 @@
 """重试工具模块
 
-提供带指数退避的重试机制
+retry_with_deadline / async_retry_with_deadline 在总时间预算内重试，
+使用 full jitter 退避并遵循服务端返回的 Retry-After；错误按异常类型和
+HTTP 状态码分类（classify_error），不匹配异常文本。
 """
 
 import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from logger_config import get_logger
 
+logger = get_logger("retry_utils")
+
+# 重试也无法成功的错误类型（收件人/参数无效、认证失败等）
+PERMANENT_ERROR_TYPES = (
+    'ValidationError', 'InvalidApiKeyError', 'MissingApiKeyError',
+    'MissingRequiredFieldsError', 'RestrictedApiKeyError',
+)
+
+# 可以重试的异常类型（限流、服务端错误、网络错误）
+RETRYABLE_ERROR_TYPES = (
+    'RateLimitError', 'ApplicationError',
+    'ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout',
+)
+
+# 按 HTTP 状态码分类：4xx 中只有超时和限流可以重试，5xx 均可重试
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429})
+
+ERROR_PERMANENT = "permanent"
+ERROR_RETRYABLE = "retryable"
+
+
+def get_status_code(exception):
+    """从异常中取出 HTTP 状态码（resend 的 code、requests 的 response.status_code 等）
+
+    Returns:
+        int 或 None
+    """
+    candidates = [
+        getattr(exception, "status_code", None),
+        getattr(exception, "code", None),
+        getattr(getattr(exception, "response", None), "status_code", None),
+    ]
+    for value in candidates:
+        try:
+            code = int(value)
+        except (TypeError, ValueError):
+            continue
+        if 100 <= code <= 599:
+            return code
+    return None
+
+
+def classify_error(exception):
+    """按异常类型和状态码判断错误类别
+
+    Returns:
+        str: ERROR_PERMANENT（重试也不会成功）或 ERROR_RETRYABLE
+    """
+    name = type(exception).__name__
+    if name in PERMANENT_ERROR_TYPES:
+        return ERROR_PERMANENT
+    if name in RETRYABLE_ERROR_TYPES or isinstance(exception, (ConnectionError, TimeoutError)):
+        return ERROR_RETRYABLE
+
+    code = get_status_code(exception)
+    if code is not None:
+        if code >= 500 or code in RETRYABLE_STATUS_CODES:
+            return ERROR_RETRYABLE
+        if code >= 400:
+            return ERROR_PERMANENT
+
+    # 未知错误（包括 OSError 等网络层错误）默认重试
+    return ERROR_RETRYABLE
+
+
+def get_retry_after(exception, now=None):
+    """读取异常携带的 Retry-After（秒数或 HTTP 日期）
+
+    Returns:
+        float 或 None: 服务端要求的等待秒数
+    """
+    value = getattr(exception, "retry_after", None)
+    if value is None:
+        headers = getattr(exception, "headers", None) or \
+            getattr(getattr(exception, "response", None), "headers", None)
+        if headers:
+            try:
+                value = headers.get("Retry-After") or headers.get("retry-after")
+            except AttributeError:
+                value = None
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value)).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    now = time.time() if now is None else now
+    return max(retry_at - now, 0.0)
+
+
+def compute_backoff(attempt, base_delay=1.0, max_delay=30.0, rng=random):
+    """full jitter 退避：在 [0, min(max_delay, base_delay * 2^attempt)] 中均匀取值"""
+    return rng.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def _next_delay(exception, attempt, max_attempts, deadline, base_delay, max_delay, classify):
+    """计算下一次重试前的等待时间，不应再重试时返回 None"""
+    if attempt + 1 >= max_attempts:
+        return None
+    if classify(exception) == ERROR_PERMANENT:
+        return None
+
+    delay = compute_backoff(attempt, base_delay, max_delay)
+    retry_after = get_retry_after(exception)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    # 等待后已超出总时间预算则直接放弃
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def retry_with_deadline(func, max_attempts=4, budget=30.0, base_delay=1.0, max_delay=30.0,
+                        exceptions=(Exception,), classify=classify_error):
+    """在总时间预算内重试（full jitter 退避，遵循 Retry-After）
 
-def retry_with_backoff(func, max_retries=3, initial_delay=1, backoff_factor=2, 
-                       exceptions=(Exception,), should_retry_func=None):
-    """带指数退避的重试函数
-    
     Args:
         func: 要重试的函数
-        max_retries: 最大重试次数（默认3次）
-        initial_delay: 初始延迟秒数（默认1秒）
-        backoff_factor: 退避因子（每次重试延迟乘以这个值，默认2）
-        exceptions: 需要重试的异常类型（默认所有异常）
-        should_retry_func: 判断是否应该重试的函数，返回True则重试
-        
+        max_attempts: 最多尝试次数（包括第一次）
+        budget: 总时间预算（秒），None 表示不限制；等待会超出预算时不再重试
+        base_delay: 退避基准延迟（秒）
+        max_delay: 单次等待上限（秒）
+        exceptions: 需要处理的异常类型
+        classify: 错误分类函数，返回 ERROR_PERMANENT 时不再重试
+
     Returns:
         函数执行结果
-        
+
     Raises:
-        最后一次异常（如果所有重试都失败）
+        最后一次异常（永久错误、次数用尽或超出时间预算）
     """
-    last_exception = None
-    delay = initial_delay
-    
-    for attempt in range(max_retries + 1):
+    deadline = time.monotonic() + budget if budget is not None else None
+    attempt = 0
+    while True:
         try:
             return func()
         except exceptions as e:
-            last_exception = e
-            
-            # 如果是最后一次尝试，不再重试
-            if attempt >= max_retries:
-                raise
-            
-            # 如果提供了should_retry_func且返回False，不再重试
-            if should_retry_func and not should_retry_func(e, attempt):
+            delay = _next_delay(e, attempt, max_attempts, deadline, base_delay, max_delay, classify)
+            if delay is None:
                 raise
-            
-            # 打印重试信息
-            print(f"邮件发送失败 (尝试 {attempt + 1}/{max_retries + 1}): {e}")
-            print(f"等待 {delay:.1f} 秒后重试...")
-            
-            # 等待一段时间后重试
+            logger.warning(f"邮件发送失败 (尝试 {attempt + 1}/{max_attempts}): {e}",
+                           extra={"phase": "send_retry", "attempt": attempt + 1, "error": type(e).__name__})
+            logger.info(f"等待 {delay:.1f} 秒后重试...", extra={"phase": "send_retry", "duration_ms": int(delay * 1000)})
             time.sleep(delay)
-            delay *= backoff_factor  # 指数退避
-    
-    # 如果所有重试都失败，抛出最后一个异常
-    if last_exception:
-        raise last_exception
+            attempt += 1
+
 
+async def async_retry_with_deadline(func, max_attempts=4, budget=30.0, base_delay=1.0, max_delay=30.0,
+                                    exceptions=(Exception,), classify=classify_error):
+    """retry_with_deadline 的 asyncio 版本
 
-def is_retryable_error(exception, attempt):
-    """判断错误是否可以重试
+    Args:
+        func: 返回协程的函数（每次尝试调用一次）
+        其余参数同 retry_with_deadline
+
+    Returns:
+        协程的执行结果
+    """
+    deadline = time.monotonic() + budget if budget is not None else None
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except exceptions as e:
+            delay = _next_delay(e, attempt, max_attempts, deadline, base_delay, max_delay, classify)
+            if delay is None:
+                raise
+            logger.warning(f"邮件发送失败 (尝试 {attempt + 1}/{max_attempts}): {e}",
+                           extra={"phase": "send_retry", "attempt": attempt + 1, "error": type(e).__name__})
+            logger.info(f"等待 {delay:.1f} 秒后重试...", extra={"phase": "send_retry", "duration_ms": int(delay * 1000)})
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def is_permanent_error(exception):
+    """判断错误是否为永久性错误（跨周期重试也不会成功）
     
     Args:
         exception: 异常对象
-        attempt: 当前尝试次数（从0开始）
         
     Returns:
-        bool: 如果应该重试返回True
+        bool: 如果是永久性错误返回True
     """
-    # 某些错误不应该重试（如认证失败）
-    error_str = str(exception).lower()
-    
-    # 认证相关错误不重试
-    if 'authentication' in error_str or 'unauthorized' in error_str or 'invalid api key' in error_str:
-        return False
-    
-    # 速率限制应该重试
-    if 'rate limit' in error_str or '429' in error_str:
-        return True
-    
-    # 网络错误应该重试
-    if 'connection' in error_str or 'timeout' in error_str or 'network' in error_str:
-        return True
-    
-    # 服务器错误（5xx）应该重试
-    if any(code in error_str for code in ['500', '502', '503', '504']):
-        return True
-    
-    # 默认重试
-    return True
\ No newline at end of file
+    return classify_error(exception) == ERROR_PERMANENT
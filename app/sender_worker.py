@@ -0,0 +1,167 @@
+"""发送线程模块
+
+心跳循环只负责写心跳文件和网络探测，待发送通知由独立的发送线程处理：
+心跳循环每轮把最新的网络状态交给发送线程并唤醒它，Resend API 的延迟、
+重试和限速等待都发生在发送线程中，不会推迟下一次心跳写入（心跳间隔
+变长会在下次启动时被误判为断电）。
+
+其他进程（main.py）入队后通过 Unix 数据报套接字唤醒发送线程，不必等到
+下一轮心跳；不支持 Unix 套接字的平台（Windows）退回到按心跳周期轮询。
+"""
+
+import os
+import select
+import socket
+import threading
+from logger_config import get_logger
+
+logger = get_logger("sender_worker")
+
+SENDER_WAKE_SOCKET = os.getenv("SENDER_WAKE_SOCKET", "/data/sender_wake.sock")
+
+
+class SenderWorker(threading.Thread):
+    """后台发送线程
+
+    被唤醒（或空闲超时）时，以最近一次收到的网络状态调用 drain 函数。
+    """
+
+    def __init__(self, drain, idle_interval=60):
+        """
+        初始化发送线程
+
+        Args:
+            drain: 发送函数，参数为网络状态字典
+            idle_interval: 没有唤醒时每隔多少秒检查一次队列（处理退避到期的通知）
+        """
+        super().__init__(name="sender-worker", daemon=True)
+        self._drain = drain
+        self._idle_interval = idle_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._status_lock = threading.Lock()
+        self._network_status = None
+
+    def notify(self, network_status=None):
+        """唤醒发送线程
+
+        Args:
+            network_status: 最新的网络状态（为 None 时沿用上一次的状态）
+        """
+        if network_status is not None:
+            with self._status_lock:
+                self._network_status = network_status
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """停止发送线程（等待当前发送完成）"""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self._idle_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+
+            with self._status_lock:
+                network_status = self._network_status
+            if network_status is None:
+                continue
+
+            try:
+                self._drain(network_status)
+            except Exception as e:
+                logger.error(f"发送线程错误：处理待发送通知失败: {e}")
+
+
+def wake_sender(path=None):
+    """通知发送线程队列中有新通知（发送线程未运行时静默忽略）
+
+    Returns:
+        bool: 是否已送达
+    """
+    path = path or SENDER_WAKE_SOCKET
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"wake", path)
+        return True
+    except OSError:
+        return False
+
+
+class WakeListener(threading.Thread):
+    """监听唤醒套接字，收到数据报时调用回调
+
+    在套接字和停止管道上阻塞等待，空闲时不会周期性唤醒。
+    """
+
+    def __init__(self, callback, path=None):
+        """
+        初始化监听线程
+
+        Args:
+            callback: 收到唤醒时调用的函数（无参数）
+            path: 套接字路径
+        """
+        super().__init__(name="sender-wake-listener", daemon=True)
+        self._callback = callback
+        self.path = path or SENDER_WAKE_SOCKET
+        self._stopping = threading.Event()
+        self._sock = None
+        self._stop_r = self._stop_w = None
+
+    def bind(self):
+        """创建并绑定套接字
+
+        Returns:
+            bool: 成功返回 True；平台不支持或绑定失败时返回 False（退回轮询）
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+        try:
+            # 上次运行残留的套接字文件
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+        except OSError as e:
+            logger.warning(f"警告：无法创建唤醒套接字 {self.path}，退回按周期轮询: {e}")
+            return False
+        self._sock = sock
+        self._stop_r, self._stop_w = os.pipe()
+        return True
+
+    def stop(self, timeout=None):
+        """停止监听并删除套接字文件"""
+        if self._stopping.is_set() or self._sock is None:
+            return
+        self._stopping.set()
+        os.write(self._stop_w, b"x")
+        if self.is_alive():
+            self.join(timeout)
+        if not self.is_alive():
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+
+    def run(self):
+        try:
+            while not self._stopping.is_set():
+                readable, _, _ = select.select([self._sock, self._stop_r], [], [])
+                if self._stop_r in readable:
+                    break
+                try:
+                    self._sock.recv(64)
+                except OSError:
+                    break
+                self._callback()
+        finally:
+            self._sock.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
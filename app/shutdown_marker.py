@@ -0,0 +1,108 @@
+"""停止标记模块
+
+守护进程启动时写入 running 标记，收到 SIGTERM / SIGINT 正常退出时改写为
+clean 标记（时间和原因）。启动检查读取标记后即可确定上次是如何停止的，
+不必根据心跳间隔和 OUTAGE_THRESHOLD 推测：
+
+- clean：正常停止（docker stop、主机正常关机），即使停机很久也不是断电
+- running：进程没有机会写入 clean 标记（断电、内核崩溃、SIGKILL），
+  即使很快恢复也是异常停止
+- 无标记：首次运行或未使用守护进程（旧版本），退回按心跳间隔判断
+
+标记通过临时文件 + fsync + 原子替换写入，写入后断电也不会丢失或损坏。
+"""
+
+import os
+import json
+import time
+
+SHUTDOWN_MARKER_FILE = os.getenv("SHUTDOWN_MARKER_FILE", "/data/shutdown_marker.json")
+
+STATE_RUNNING = "running"
+STATE_CLEAN = "clean"
+
+# 上次停止的分类
+CLEAN_SHUTDOWN = "clean_shutdown"
+UNCLEAN_SHUTDOWN = "unclean_shutdown"
+UNKNOWN = "unknown"
+
+
+def _write(path, record):
+    """持久化写入标记（fsync 文件和所在目录）"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def mark_running(path=None):
+    """守护进程启动时写入 running 标记"""
+    _write(path or SHUTDOWN_MARKER_FILE, {
+        "state": STATE_RUNNING,
+        "started_at": int(time.time()),
+        "pid": os.getpid(),
+    })
+
+
+def mark_clean(reason, path=None):
+    """正常停止时写入 clean 标记
+
+    Args:
+        reason: 停止原因（如 SIGTERM）
+    """
+    _write(path or SHUTDOWN_MARKER_FILE, {
+        "state": STATE_CLEAN,
+        "timestamp": int(time.time()),
+        "reason": reason,
+    })
+
+
+def read_marker(path=None):
+    """读取标记
+
+    Returns:
+        dict 或 None: 标记内容；不存在或已损坏时返回 None
+    """
+    try:
+        with open(path or SHUTDOWN_MARKER_FILE, 'r') as f:
+            marker = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(marker, dict) or marker.get("state") not in (STATE_RUNNING, STATE_CLEAN):
+        return None
+    return marker
+
+
+def clear(path=None):
+    """删除标记（启动检查读取后调用，避免旧标记影响之后的判断）"""
+    try:
+        os.remove(path or SHUTDOWN_MARKER_FILE)
+    except OSError:
+        pass
+
+
+def classify(marker):
+    """根据标记判断上次是如何停止的
+
+    Returns:
+        str: CLEAN_SHUTDOWN、UNCLEAN_SHUTDOWN 或 UNKNOWN（没有标记）
+    """
+    if marker is None:
+        return UNKNOWN
+    if marker["state"] == STATE_CLEAN:
+        return CLEAN_SHUTDOWN
+    return UNCLEAN_SHUTDOWN
@@ -0,0 +1,214 @@
+"""状态文件编码模块
+
+network_status.log 和 network_history.log 默认保存为 JSON；STATE_FORMAT=binary
+时改用带版本号的二进制格式：
+
+    文件头   magic "PMST" | 版本 (u8) | 记录类型 (u8)
+    网络状态 时间戳 (i64) | 标志位 (u8: 内网 / 外网 / DNS)
+    网络历史 标志位 (u8: 上次内网 / 上次外网)
+
+读取时根据文件头自动识别格式，切换 STATE_FORMAT 后旧的 JSON 文件仍可读取，
+下次写入时转换为新格式。待发送通知队列不使用本模块，始终保存为 JSON 数组。
+
+查看文件内容：python state_codec.py dump [--follow] <文件>...
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+
+STATE_FORMAT = os.getenv("STATE_FORMAT", "json")  # json 或 binary
+
+MAGIC = b"PMST"
+VERSION = 1
+
+KIND_NETWORK_STATUS = 1
+KIND_NETWORK_HISTORY = 2
+KIND_NAMES = {
+    KIND_NETWORK_STATUS: "network_status",
+    KIND_NETWORK_HISTORY: "network_history",
+}
+
+_HEADER = struct.Struct("<4sBB")
+_STATUS = struct.Struct("<qB")
+_HISTORY = struct.Struct("<B")
+
+# 网络状态标志位
+_INTERNAL = 0x01
+_EXTERNAL = 0x02
+_DNS = 0x04
+
+
+class StateFormatError(ValueError):
+    """文件格式错误、版本不支持或记录类型不符"""
+
+
+def _flags(*values):
+    """将布尔值按顺序编码为标志位"""
+    return sum(1 << i for i, value in enumerate(values) if value)
+
+
+def encode_network_status(status):
+    """编码网络状态（固定长度记录）"""
+    flags = _flags(status["internal_network"], status["external_network"], status["dns_resolution"])
+    return _STATUS.pack(int(status["timestamp"]), flags)
+
+
+def decode_network_status(payload):
+    """解码网络状态"""
+    try:
+        timestamp, flags = _STATUS.unpack(payload)
+    except struct.error as e:
+        raise StateFormatError(f"网络状态记录损坏: {e}")
+    return {
+        "timestamp": timestamp,
+        "internal_network": bool(flags & _INTERNAL),
+        "external_network": bool(flags & _EXTERNAL),
+        "dns_resolution": bool(flags & _DNS),
+    }
+
+
+def encode_network_history(history):
+    """编码网络历史记录（固定长度记录）"""
+    return _HISTORY.pack(_flags(history["last_internal_network"], history["last_external_network"]))
+
+
+def decode_network_history(payload):
+    """解码网络历史记录"""
+    try:
+        (flags,) = _HISTORY.unpack(payload)
+    except struct.error as e:
+        raise StateFormatError(f"网络历史记录损坏: {e}")
+    return {
+        "last_internal_network": bool(flags & _INTERNAL),
+        "last_external_network": bool(flags & _EXTERNAL),
+    }
+
+
+_ENCODERS = {
+    KIND_NETWORK_STATUS: encode_network_status,
+    KIND_NETWORK_HISTORY: encode_network_history,
+}
+_DECODERS = {
+    KIND_NETWORK_STATUS: decode_network_status,
+    KIND_NETWORK_HISTORY: decode_network_history,
+}
+
+
+def read_header(f):
+    """读取二进制文件头
+
+    Args:
+        f: 以二进制模式打开的文件
+
+    Returns:
+        int 或 None: 记录类型；不是二进制格式时返回 None 并回到文件开头
+    """
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:4] != MAGIC:
+        f.seek(0)
+        return None
+    _, version, kind = _HEADER.unpack(header)
+    if version != VERSION:
+        raise StateFormatError(f"不支持的状态文件版本: {version}")
+    return kind
+
+
+def write_header(f, kind):
+    """写入二进制文件头"""
+    f.write(_HEADER.pack(MAGIC, VERSION, kind))
+
+
+def read_state(path, kind):
+    """读取状态文件（自动识别 JSON 和二进制格式，调用方负责加锁）
+
+    Raises:
+        ValueError: 文件损坏或记录类型不符（json.JSONDecodeError 或 StateFormatError）
+        IOError: 读取失败
+    """
+    with open(path, 'rb') as f:
+        file_kind = read_header(f)
+        if file_kind is None:
+            return json.loads(f.read().decode('utf-8'))
+        if file_kind != kind:
+            raise StateFormatError(f"记录类型不符: {KIND_NAMES.get(file_kind, file_kind)}")
+        return _DECODERS[kind](f.read())
+
+
+def write_state(path, kind, value, fmt=None):
+    """原子地写入状态文件（调用方负责加锁）
+
+    Args:
+        path: 文件路径
+        kind: 记录类型
+        value: 状态字典
+        fmt: json 或 binary（默认 STATE_FORMAT）
+    """
+    fmt = fmt or STATE_FORMAT
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        if fmt == "binary":
+            write_header(f, kind)
+            f.write(_ENCODERS[kind](value))
+        else:
+            f.write(json.dumps(value).encode('utf-8'))
+    os.replace(tmp_path, path)
+
+
+def load_any(path):
+    """读取任意状态文件（用于 dump）
+
+    Returns:
+        (格式描述, 内容)
+    """
+    with open(path, 'rb') as f:
+        kind = read_header(f)
+        if kind is None:
+            return "json", json.loads(f.read().decode('utf-8'))
+        name = f"binary v{VERSION} {KIND_NAMES.get(kind, kind)}"
+        if kind not in _DECODERS:
+            raise StateFormatError(f"未知的记录类型: {kind}")
+        return name, _DECODERS[kind](f.read())
+
+
+def _dump(path):
+    """输出一个状态文件，读取失败时返回 False"""
+    try:
+        fmt, value = load_any(path)
+    except (ValueError, IOError) as e:
+        print(f"{path}: 无法读取: {e}", file=sys.stderr)
+        return False
+    print(f"# {path} ({fmt})")
+    print(json.dumps(value, indent=2, ensure_ascii=False), flush=True)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="状态文件查看工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    dump_parser = subparsers.add_parser("dump", help="以 JSON 格式输出状态文件内容")
+    dump_parser.add_argument("paths", nargs="+", help="状态文件")
+    dump_parser.add_argument("--follow", action="store_true", help="文件每次被写入后重新输出")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for path in args.paths:
+        if not _dump(path):
+            exit_code = 1
+
+    if args.follow:
+        # 延迟导入：file_watcher 依赖日志模块，dump 本身不需要
+        from file_watcher import FileWatcher
+        watcher = FileWatcher(args.paths, _dump)
+        watcher.start()
+        try:
+            watcher.join()
+        except KeyboardInterrupt:
+            watcher.stop()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,542 @@
+"""状态存储后端模块
+
+网络状态、网络历史和待发送通知队列的读写通过 StateStore 接口完成，
+STATE_BACKEND 选择后端：
+
+- file（默认）：现有实现，每个状态一个文件（网络状态和历史的格式由 STATE_FORMAT 决定），
+  并发由 .lock 文件锁控制，队列确认写入追加日志
+- sqlite：所有状态保存在一个 WAL 模式的 SQLite 数据库（STATE_DB）中，
+  读写互不阻塞；队列按 (优先级, 下一次尝试时间) 建立索引，发送时在事务中
+  领取（claim）一条已到时间的通知，发送后确认或更新重试状态；入队时按
+  去重键索引查找同类通知，新增、合并、取消和淘汰都只改动相关的行
+
+两个后端的接口相同，main.py 和 heartbeat.py 不关心具体实现。心跳文件和死信
+文件始终为普通文件：心跳文件是判断断电的依据，不依赖数据库是否完好。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from file_lock import file_lock
+import notification_queue
+import state_codec
+from logger_config import get_logger
+
+logger = get_logger("state_store")
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "file")  # file 或 sqlite
+STATE_DB = os.getenv("STATE_DB", "/data/state.db")
+# 领取的通知在此时间（秒）内不会被其他发送方再次领取（发送方崩溃后自动释放）
+CLAIM_LEASE = int(os.getenv("CLAIM_LEASE", 300))
+
+STATE_NETWORK_STATUS = "network_status"
+STATE_NETWORK_HISTORY = "network_history"
+_STATE_KINDS = {
+    STATE_NETWORK_STATUS: state_codec.KIND_NETWORK_STATUS,
+    STATE_NETWORK_HISTORY: state_codec.KIND_NETWORK_HISTORY,
+}
+
+
+class StateStoreError(IOError):
+    """存储后端读写失败（与文件后端的 IOError 一样处理）"""
+
+
+class FileStateStore:
+    """文件后端"""
+
+    def __init__(self, queue_path, status_path="/data/network_status.log",
+                 history_path="/data/network_history.log", server_name="Unknown Server"):
+        """
+        初始化文件后端
+
+        Args:
+            queue_path: 待发送通知队列文件
+            status_path: 网络状态文件
+            history_path: 网络历史记录文件
+            server_name: 迁移旧格式通知时使用的服务器名称
+        """
+        self.queue_path = queue_path
+        self.server_name = server_name
+        self._dirty = False  # 上次检查点之后是否确认、更新或删除过通知
+        self._state_paths = {STATE_NETWORK_STATUS: status_path, STATE_NETWORK_HISTORY: history_path}
+
+    def read_state(self, name):
+        """读取状态，不存在时返回 None
+
+        Raises:
+            ValueError, IOError: 文件损坏或读取失败
+        """
+        path = self._state_paths[name]
+        if not os.path.isfile(path):
+            return None
+        with file_lock(path):
+            return state_codec.read_state(path, _STATE_KINDS[name])
+
+    def write_state(self, name, value):
+        """写入状态"""
+        path = self._state_paths[name]
+        with file_lock(path):
+            state_codec.write_state(path, _STATE_KINDS[name], value)
+
+    def load_queue(self):
+        """读取整个队列，读取失败时返回空列表"""
+        return notification_queue.load_notifications(self.queue_path, self.server_name)
+
+    def save_queue(self, notifications):
+        """整体替换队列"""
+        notification_queue.save_notifications(self.queue_path, notifications)
+
+    def modify_queue(self, func):
+        """在锁内读取-修改-写入队列
+
+        Args:
+            func: 参数为通知列表，返回 (新的通知列表, 结果)
+
+        Returns:
+            func 返回的结果
+        """
+        with file_lock(self.queue_path):
+            notifications, result = func(notification_queue.read_notifications(self.queue_path, self.server_name))
+            notification_queue.write_notifications(self.queue_path, notifications)
+            return result
+
+    def push(self, notification, max_size):
+        """加入通知（合并或取消同类通知），超出上限时淘汰最不重要的最旧通知
+
+        Returns:
+            (结果, 队列长度, 被淘汰的通知列表)：结果同 NotificationQueue.push
+        """
+        with file_lock(self.queue_path):
+            queue = notification_queue.NotificationQueue(
+                notification_queue.read_notifications(self.queue_path, self.server_name))
+            key = notification_queue.prepare_push(notification)
+            existing = queue.find(key) if key else None
+            result = queue.push(notification)
+            dropped = queue.trim(max_size)
+            notification_queue.write_notifications(self.queue_path, queue.to_list())
+            notification_queue.record_avoided_sends(self.queue_path, queue.avoided_sends)
+            if result in ("cancelled", "superseded"):
+                # 发送方可能已读取到旧通知，发送前据此跳过
+                notification_queue.record_removed_ids(self.queue_path, [existing["id"]])
+            return result, len(queue), dropped
+
+    def iter_due(self, now=None):
+        """按优先级逐条返回已到发送时间的通知（每个优先级流式读取一趟）"""
+        now = time.time() if now is None else now
+        for priority in notification_queue.PRIORITY_LEVELS:
+            for notification in notification_queue.iter_notifications(self.queue_path, self.server_name):
+                if (notification_queue.priority_of(notification) == priority
+                        and notification_queue.is_due(notification, now)):
+                    yield notification
+
+    def has_due(self, now=None):
+        """是否有已到发送时间的通知"""
+        now = time.time() if now is None else now
+        return any(notification_queue.is_due(n, now)
+                   for n in notification_queue.iter_notifications(self.queue_path, self.server_name))
+
+    def begin_send(self, notification, now=None):
+        """发送前将通知标记为发送中，之后入队的同类通知不会再取消或合并它
+
+        Returns:
+            bool: 通知已被取消或替代时返回 False，不应再发送
+        """
+        now = time.time() if now is None else now
+        try:
+            return notification_queue.mark_sending(self.queue_path, notification, now + CLAIM_LEASE)
+        except IOError as e:
+            logger.error(f"标记通知为发送中失败: {e}")
+            return False
+
+    def end_send(self, notification):
+        """没有发送就停止时清除发送中标记"""
+        try:
+            notification_queue.clear_sending(self.queue_path, notification)
+        except IOError as e:
+            logger.error(f"清除发送中标记失败: {e}")
+
+    def ack(self, notification_id):
+        """确认通知已处理"""
+        notification_queue.ack_notification(self.queue_path, notification_id)
+        self._dirty = True
+
+    def update(self, notification):
+        """保存通知的重试状态（同时清除发送中标记）"""
+        notification = {k: v for k, v in notification.items() if k != "sending_until"}
+        notification_queue.update_notification(self.queue_path, notification)
+        self._dirty = True
+
+    def drop(self, predicate):
+        """删除满足条件的通知，返回删除的条数"""
+        return notification_queue.drop_notifications(self.queue_path, predicate, self.server_name)
+
+    def checkpoint(self):
+        """将确认日志合并到队列文件；没有确认或更新过通知时不改写队列文件
+
+        只有发送中标记的确认日志留到下次合并，读取时照常应用。
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        notification_queue.compact_notifications(self.queue_path, self.server_name)
+
+    def record_avoided_sends(self, count):
+        """累加因合并/取消而避免的发送次数"""
+        with file_lock(self.queue_path):
+            notification_queue.record_avoided_sends(self.queue_path, count)
+
+    def pop_avoided_sends(self):
+        """读取并清零避免的发送次数"""
+        with file_lock(self.queue_path):
+            return notification_queue.pop_avoided_sends(self.queue_path)
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS queue ("
+    " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " id TEXT NOT NULL UNIQUE,"
+    " priority INTEGER NOT NULL,"
+    " next_attempt_at REAL NOT NULL DEFAULT 0,"
+    " claimed_until REAL NOT NULL DEFAULT 0,"
+    " dedup_key TEXT,"
+    " body TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS queue_due ON queue (priority, next_attempt_at, seq)",
+)
+# 旧版本创建的数据库没有 dedup_key 列，打开时补上并回填
+_SQL_ADD_DEDUP_KEY = "ALTER TABLE queue ADD COLUMN dedup_key TEXT"
+_SQL_DEDUP_INDEX = "CREATE INDEX IF NOT EXISTS queue_dedup ON queue (dedup_key)"
+
+# 固定的 SQL 语句：sqlite3 按语句文本缓存编译结果，重复执行时不再解析
+_SQL_GET_STATE = "SELECT value FROM state WHERE name = ?"
+_SQL_PUT_STATE = "INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)"
+_SQL_ALL = "SELECT id, body FROM queue ORDER BY priority, seq"
+_SQL_INSERT = "INSERT INTO queue (id, priority, next_attempt_at, dedup_key, body) VALUES (?, ?, ?, ?, ?)"
+_SQL_UPDATE = "UPDATE queue SET priority = ?, next_attempt_at = ?, dedup_key = ?, body = ? WHERE id = ?"
+_SQL_FIND_KEY = "SELECT id, body, claimed_until FROM queue WHERE dedup_key = ? ORDER BY seq DESC LIMIT 1"
+_SQL_SUPERSEDE = ("UPDATE queue SET id = ?, priority = ?, next_attempt_at = ?, dedup_key = ?, body = ?, "
+                  "claimed_until = 0 WHERE id = ?")
+_SQL_COUNT = "SELECT COUNT(*) FROM queue"
+_SQL_OLDEST = "SELECT seq, body FROM queue WHERE priority = ? ORDER BY seq LIMIT ?"
+_SQL_DELETE_SEQ = "DELETE FROM queue WHERE seq = ?"
+_SQL_DELETE = "DELETE FROM queue WHERE id = ?"
+_SQL_CLAIM = ("SELECT seq, body FROM queue WHERE priority = ? AND next_attempt_at <= ? AND claimed_until <= ? "
+              "ORDER BY next_attempt_at, seq LIMIT 1")
+_SQL_SET_CLAIM = "UPDATE queue SET claimed_until = ? WHERE seq = ?"
+_SQL_RELEASE = "UPDATE queue SET claimed_until = 0 WHERE id = ?"
+_SQL_EXTEND_CLAIM = "UPDATE queue SET claimed_until = ? WHERE id = ?"
+_SQL_HAS_DUE = "SELECT 1 FROM queue WHERE next_attempt_at <= ? AND claimed_until <= ? LIMIT 1"
+
+
+def _row_values(notification):
+    """队列表中用于索引的列和序列化后的通知：(优先级, 下一次尝试时间, 去重键, 正文)"""
+    body = json.dumps(notification_queue.compress_body(notification), separators=(',', ':'), ensure_ascii=False)
+    return (notification_queue.priority_of(notification), notification.get("next_attempt_at", 0),
+            notification.get("dedup_key"), body)
+
+
+class SqliteStateStore:
+    """SQLite（WAL 模式）后端
+
+    每个线程使用独立的连接（心跳循环和发送线程并发访问）；写事务以
+    BEGIN IMMEDIATE 开始，多个进程同时写入时由 SQLite 的锁排队等待。
+    """
+
+    def __init__(self, db_path=None, server_name="Unknown Server", claim_lease=None):
+        """
+        初始化 SQLite 后端
+
+        Args:
+            db_path: 数据库文件路径（默认 STATE_DB）
+            server_name: 迁移旧格式通知时使用的服务器名称
+            claim_lease: 领取通知的租期（秒）
+        """
+        self.db_path = db_path or STATE_DB
+        self.server_name = server_name
+        self.claim_lease = CLAIM_LEASE if claim_lease is None else claim_lease
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._migrate(conn)
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        """为旧数据库补上 dedup_key 列和索引"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(queue)")}
+        if "dedup_key" not in columns:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 其他进程可能已完成迁移
+                if "dedup_key" not in {row[1] for row in conn.execute("PRAGMA table_info(queue)")}:
+                    conn.execute(_SQL_ADD_DEDUP_KEY)
+                    for notification_id, body in conn.execute(_SQL_ALL).fetchall():
+                        conn.execute("UPDATE queue SET dedup_key = ? WHERE id = ?",
+                                     (notification_queue.dedup_key(json.loads(body)), notification_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        conn.execute(_SQL_DEDUP_INDEX)
+
+    @contextmanager
+    def _transaction(self):
+        """写事务（出错时回滚），数据库错误转换为 StateStoreError"""
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            raise StateStoreError(f"打开状态数据库失败: {e}")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            raise StateStoreError(f"状态数据库写入失败: {e}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _query(self, sql, params=()):
+        try:
+            return self._connect().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise StateStoreError(f"状态数据库读取失败: {e}")
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def read_state(self, name):
+        """读取状态，不存在时返回 None"""
+        rows = self._query(_SQL_GET_STATE, (name,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def write_state(self, name, value):
+        """写入状态"""
+        with self._transaction() as conn:
+            conn.execute(_SQL_PUT_STATE, (name, json.dumps(value)))
+
+    def _load(self, conn):
+        rows = conn.execute(_SQL_ALL).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def _decode(self, body):
+        return notification_queue.migrate_notification(json.loads(body), self.server_name)
+
+    def load_queue(self):
+        """读取整个队列（按发送顺序），读取失败时返回空列表"""
+        try:
+            return [self._decode(body) for body in self._load(self._connect()).values()]
+        except (sqlite3.Error, ValueError):
+            return []
+
+    def _replace(self, conn, existing, notifications):
+        """按 id 比较，只写入新增、变化和删除的行"""
+        kept = set()
+        for notification in notifications:
+            notification_id = notification_queue.ensure_id(notification)
+            kept.add(notification_id)
+            values = _row_values(notification)
+            if notification_id not in existing:
+                conn.execute(_SQL_INSERT, (notification_id,) + values)
+            elif existing[notification_id] != values[-1]:
+                conn.execute(_SQL_UPDATE, values + (notification_id,))
+        for notification_id in existing.keys() - kept:
+            conn.execute(_SQL_DELETE, (notification_id,))
+
+    def save_queue(self, notifications):
+        """整体替换队列"""
+        with self._transaction() as conn:
+            self._replace(conn, self._load(conn), notifications)
+
+    def modify_queue(self, func):
+        """在事务内读取-修改-写入队列
+
+        Args:
+            func: 参数为通知列表，返回 (新的通知列表, 结果)
+
+        Returns:
+            func 返回的结果
+        """
+        with self._transaction() as conn:
+            existing = self._load(conn)
+            notifications, result = func([self._decode(body) for body in existing.values()])
+            self._replace(conn, existing, notifications)
+            return result
+
+    def _trim(self, conn, max_size):
+        """超出上限时按优先级从低到高删除最旧的通知，返回被删除的通知"""
+        excess = conn.execute(_SQL_COUNT).fetchone()[0] - max_size
+        dropped = []
+        for priority in reversed(notification_queue.PRIORITY_LEVELS):
+            if excess <= 0:
+                break
+            for seq, body in conn.execute(_SQL_OLDEST, (priority, excess)).fetchall():
+                conn.execute(_SQL_DELETE_SEQ, (seq,))
+                dropped.append(self._decode(body))
+                excess -= 1
+        return dropped
+
+    def push(self, notification, max_size):
+        """在一个事务内加入通知：按去重键索引查找同类通知后只新增、替换或删除相关的行
+
+        Returns:
+            (结果, 队列长度, 被淘汰的通知列表)：结果同 NotificationQueue.push
+        """
+        key = notification_queue.prepare_push(notification)
+        now = time.time()
+        with self._transaction() as conn:
+            existing = None
+            row = conn.execute(_SQL_FIND_KEY, (key,)).fetchone() if key else None
+            if row:
+                existing = self._decode(row[1])
+            # 已被领取的通知可能正在发送
+            result, merged = notification_queue.resolve_push(existing, notification, bool(row) and row[2] > now)
+            if result == "added":
+                conn.execute(_SQL_INSERT, (notification["id"],) + _row_values(notification))
+            elif result == "superseded":
+                conn.execute(_SQL_SUPERSEDE, (merged["id"],) + _row_values(merged) + (row[0],))
+            elif result == "cancelled":
+                conn.execute(_SQL_DELETE, (row[0],))
+            dropped = self._trim(conn, max_size)
+            avoided_sends = notification_queue.AVOIDED_SENDS[result]
+            if avoided_sends:
+                self._add_avoided_sends(conn, avoided_sends)
+            return result, conn.execute(_SQL_COUNT).fetchone()[0], dropped
+
+    def claim(self, now=None):
+        """在事务中领取最重要的一条已到发送时间的通知
+
+        Returns:
+            dict 或 None: 领取到的通知；没有可发送的通知时返回 None
+        """
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            for priority in notification_queue.PRIORITY_LEVELS:
+                row = conn.execute(_SQL_CLAIM, (priority, now, now)).fetchone()
+                if row:
+                    conn.execute(_SQL_SET_CLAIM, (now + self.claim_lease, row[0]))
+                    return self._decode(row[1])
+        return None
+
+    def release(self, notification_id):
+        """释放领取但未处理的通知"""
+        with self._transaction() as conn:
+            conn.execute(_SQL_RELEASE, (notification_id,))
+
+    def iter_due(self, now=None):
+        """逐条领取已到发送时间的通知；迭代结束时释放仍未确认或更新的通知"""
+        now = time.time() if now is None else now
+        claimed = []
+        try:
+            while True:
+                notification = self.claim(now)
+                if notification is None:
+                    return
+                claimed.append(notification["id"])
+                yield notification
+        finally:
+            with self._transaction() as conn:
+                for notification_id in claimed:
+                    conn.execute(_SQL_RELEASE, (notification_id,))
+
+    def has_due(self, now=None):
+        """是否有已到发送时间的通知"""
+        now = time.time() if now is None else now
+        return bool(self._query(_SQL_HAS_DUE, (now, now)))
+
+    def begin_send(self, notification, now=None):
+        """发送前延长领取租期；领取期间入队的同类通知不会取消或合并它
+
+        Returns:
+            bool: 通知已不在队列中时返回 False，不应再发送
+        """
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            return conn.execute(_SQL_EXTEND_CLAIM, (now + self.claim_lease, notification["id"])).rowcount > 0
+
+    def end_send(self, notification):
+        """没有发送就停止时释放领取"""
+        self.release(notification["id"])
+
+    def ack(self, notification_id):
+        """确认通知已处理（删除）"""
+        with self._transaction() as conn:
+            conn.execute(_SQL_DELETE, (notification_id,))
+
+    def update(self, notification):
+        """保存通知的重试状态；通知已被删除或替代时忽略"""
+        with self._transaction() as conn:
+            conn.execute(_SQL_UPDATE, _row_values(notification) + (notification["id"],))
+
+    def drop(self, predicate):
+        """删除满足条件的通知，返回删除的条数"""
+        with self._transaction() as conn:
+            existing = self._load(conn)
+            dropped = [notification_id for notification_id, body in existing.items()
+                       if predicate(self._decode(body))]
+            for notification_id in dropped:
+                conn.execute(_SQL_DELETE, (notification_id,))
+            return len(dropped)
+
+    def checkpoint(self):
+        """将 WAL 中的内容写回数据库文件（不阻塞读写）"""
+        try:
+            self._connect().execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except sqlite3.Error as e:
+            logger.warning(f"状态数据库检查点失败: {e}")
+
+    @staticmethod
+    def _add_avoided_sends(conn, count):
+        row = conn.execute(_SQL_GET_STATE, ("avoided_sends",)).fetchone()
+        conn.execute(_SQL_PUT_STATE, ("avoided_sends", json.dumps((json.loads(row[0]) if row else 0) + count)))
+
+    def record_avoided_sends(self, count):
+        """累加因合并/取消而避免的发送次数"""
+        if count <= 0:
+            return
+        with self._transaction() as conn:
+            self._add_avoided_sends(conn, count)
+
+    def pop_avoided_sends(self):
+        """读取并清零避免的发送次数"""
+        with self._transaction() as conn:
+            row = conn.execute(_SQL_GET_STATE, ("avoided_sends",)).fetchone()
+            conn.execute(_SQL_PUT_STATE, ("avoided_sends", "0"))
+            return json.loads(row[0]) if row else 0
+
+
+_sqlite_stores = {}
+_sqlite_stores_lock = threading.Lock()
+
+
+def open_store(queue_path, status_path="/data/network_status.log", history_path="/data/network_history.log",
+               server_name="Unknown Server", backend=None):
+    """按 STATE_BACKEND 返回存储后端
+
+    文件后端每次按传入的路径创建（开销很小）；SQLite 后端按数据库路径复用，
+    保留各线程已打开的连接。
+    """
+    backend = backend or STATE_BACKEND
+    if backend == "sqlite":
+        with _sqlite_stores_lock:
+            store = _sqlite_stores.get(STATE_DB)
+            if store is None:
+                store = _sqlite_stores[STATE_DB] = SqliteStateStore(STATE_DB, server_name)
+            return store
+    return FileStateStore(queue_path, status_path, history_path, server_name)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+大队列读取内存基准测试
+对比 json.load 一次性加载与 iter_notifications 逐条解析旧格式队列文件的峰值内存
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import notification_queue
+
+BODY = "<html><body>" + "断电通知正文 " * 100 + "</body></html>"
+
+
+def build_queue(path, count):
+    """生成带已渲染 html_body 的旧格式队列文件"""
+    notifications = ({"type": "test", "subject": f"通知 {i}", "html_body": BODY} for i in range(count))
+    notification_queue._write_array(path, notifications)
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} {count:8d} 条  {elapsed:6.2f} 秒  峰值内存 {peak / 1024 / 1024:8.1f} MiB")
+
+
+def main(count=100000):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "pending_notifications.log")
+        build_queue(path, count)
+        print("=" * 70)
+        print(f"队列文件: {os.path.getsize(path) / 1024 / 1024:.1f} MiB，{count} 条通知")
+        print("=" * 70)
+
+        def load_all():
+            with open(path, 'r', encoding='utf-8') as f:
+                return len(json.load(f))
+
+        def stream():
+            return sum(1 for _ in notification_queue.iter_notifications(path))
+
+        measure("json.load", load_all)
+        measure("iter_notifications", stream)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
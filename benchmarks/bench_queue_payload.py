@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+队列正文压缩基准测试
+对比不同队列长度下明文保存与 zlib（预设字典）压缩保存已渲染正文的文件大小、
+写入耗时和读取（含发送时解压）耗时
+"""
+
+import os
+import sys
+import time
+import zlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import email_templates
+import notification_queue
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def build_notifications(count):
+    """生成带已渲染正文的通知（正文内容随序号变化）"""
+    notifications = []
+    for i in range(count):
+        power_off_ts = 1770000000 + i * 60
+        subject, html_body = email_templates.render("power_outage", server_name=f"server-{i % 50:02d}",
+                                                    power_off_time=email_templates.format_time(power_off_ts),
+                                                    power_on_time=email_templates.format_time(power_off_ts + 300 + i),
+                                                    duration_formatted=email_templates.format_duration(300 + i),
+                                                    stop_classification=email_templates.labels()["unclean_shutdown"])
+        notifications.append({"type": "test", "id": f"{i:032x}", "subject": subject, "html_body": html_body})
+    return notifications
+
+
+def measure(path, notifications, compression):
+    """写入并读取队列，返回 (文件大小, 写入秒数, 读取秒数)"""
+    notification_queue.QUEUE_COMPRESSION = compression
+    start = time.perf_counter()
+    notification_queue.write_notifications(path, notifications)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for notification in notification_queue.iter_notifications(path):
+        notification_queue.body_of(notification)
+    read_time = time.perf_counter() - start
+    return os.path.getsize(path), write_time, read_time
+
+
+def main():
+    sample = build_notifications(1)[0]["html_body"].encode('utf-8')
+    with_dict = zlib.compressobj(9, zdict=notification_queue._ZDICT_V1)
+    print("=" * 78)
+    print(f"单条正文: 明文 {len(sample)} 字节，zlib {len(zlib.compress(sample, 9))} 字节，"
+          f"zlib+字典 {len(with_dict.compress(sample) + with_dict.flush())} 字节")
+    print("=" * 78)
+    print(f"{'条数':>8} {'方式':<6} {'文件大小':>12} {'写入':>10} {'读取+解压':>12}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "pending_notifications.log")
+        for count in SIZES:
+            notifications = build_notifications(count)
+            for compression in ("none", "zlib"):
+                size, write_time, read_time = measure(path, notifications, compression)
+                print(f"{count:8d} {compression:<6} {size / 1024:10.1f}KB {write_time * 1000:8.1f}ms "
+                      f"{read_time * 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+状态文件编码基准测试
+对比 JSON 与二进制格式读写网络状态、网络历史的耗时及文件大小，
+以及通知队列（JSON 数组）的写入和读取耗时
+"""
+
+import os
+import sys
+import time
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import state_codec
+import notification_queue
+
+STATUS = {"timestamp": 1770000000, "internal_network": True, "external_network": False, "dns_resolution": True}
+HISTORY = {"last_internal_network": True, "last_external_network": False}
+
+
+def bench_state(path, kind, value, number=20000):
+    print(f"{state_codec.KIND_NAMES[kind]}:")
+    for fmt in ("json", "binary"):
+        write_time = timeit.timeit(lambda: state_codec.write_state(path, kind, value, fmt=fmt), number=number)
+        read_time = timeit.timeit(lambda: state_codec.read_state(path, kind), number=number)
+        print(f"  {fmt:<7} {os.path.getsize(path):5d} 字节  "
+              f"写入 {write_time / number * 1e6:7.1f} 微秒  读取 {read_time / number * 1e6:7.1f} 微秒")
+
+
+def bench_queue(path, count):
+    notifications = [{
+        "type": "network_status", "template_id": "network_status", "id": f"{i:032x}",
+        "timestamp": 1770000000 + i, "server_name": "跳板机",
+        "current_status": dict(STATUS, timestamp=1770000000 + i),
+        "previous_status": HISTORY, "dedup_key": "network_status:external",
+    } for i in range(count)]
+    print(f"通知队列（{count} 条）:")
+    start = time.perf_counter()
+    notification_queue._write_array(path, notifications)
+    write_time = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded = notification_queue.read_notifications(path)
+    read_time = time.perf_counter() - start
+    start = time.perf_counter()
+    streamed = sum(1 for _ in notification_queue.iter_notifications(path))
+    stream_time = time.perf_counter() - start
+    assert len(loaded) == streamed == count
+    print(f"  json    {os.path.getsize(path) / 1024:8.1f}KB  写入 {write_time * 1000:7.1f}ms  "
+          f"整体读取 {read_time * 1000:7.1f}ms  逐条读取 {stream_time * 1000:7.1f}ms")
+
+
+def main(count=10000):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print("=" * 78)
+        bench_state(os.path.join(temp_dir, "network_status.log"), state_codec.KIND_NETWORK_STATUS, STATUS)
+        bench_state(os.path.join(temp_dir, "network_history.log"), state_codec.KIND_NETWORK_HISTORY, HISTORY)
+        bench_queue(os.path.join(temp_dir, "pending_notifications.log"), count)
+        print("=" * 78)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+状态存储后端基准测试
+对比文件后端与 SQLite（WAL）后端在大量积压时的入队、检查和发送（领取 + 确认）耗时
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import state_store
+
+SIZES = (1000, 10000, 100000)
+
+
+def build_notifications(count):
+    return [{
+        "type": "network_status" if i % 3 else "power_outage", "id": f"{i:032x}",
+        "template_id": "network_status", "timestamp": 1770000000 + i, "server_name": "跳板机",
+        "current_status": {"internal_network": True, "external_network": bool(i % 2)},
+        "previous_status": {"last_internal_network": True, "last_external_network": not i % 2},
+    } for i in range(count)]
+
+
+def open_store(backend, temp_dir):
+    if backend == "sqlite":
+        return state_store.SqliteStateStore(os.path.join(temp_dir, "state.db"))
+    return state_store.FileStateStore(os.path.join(temp_dir, "pending_notifications.log"))
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench(backend, count):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = open_store(backend, temp_dir)
+        _, load_ms = timed(lambda: store.save_queue(build_notifications(count)))
+
+        extra = {"type": "test", "id": "extra", "subject": "新通知", "html_body": "<p>新通知</p>"}
+        _, enqueue_ms = timed(lambda: store.push(dict(extra), count + 1))
+        _, has_due_ms = timed(lambda: store.has_due())
+
+        def drain(limit):
+            sent = 0
+            for notification in store.iter_due():
+                store.ack(notification["id"])
+                sent += 1
+                if sent >= limit:
+                    break
+            store.checkpoint()
+            return sent
+
+        sent, drain_ms = timed(lambda: drain(1000))
+        print(f"{count:7d} {backend:<7} 写入积压 {load_ms:8.1f}ms  入队一条 {enqueue_ms:8.1f}ms  "
+              f"检查 {has_due_ms:6.2f}ms  发送 {sent} 条 {drain_ms:8.1f}ms")
+
+
+def main():
+    print("=" * 96)
+    for count in SIZES:
+        for backend in ("file", "sqlite"):
+            bench(backend, count)
+    print("=" * 96)
+
+
+if __name__ == "__main__":
+    main()
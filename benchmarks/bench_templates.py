@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+邮件模板渲染基准测试
+对比编译缓存的模板渲染与每次重新解析模板的耗时
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import email_templates
+from html_utils import escape_html
+
+OUTAGE_VALUES = {
+    "server_name": "跳板机 <primary>",
+    "power_off_time": "2026-02-06 10:00:00",
+    "power_on_time": "2026-02-06 10:05:00",
+    "duration_formatted": "00 小时 05 分钟 00 秒",
+    "stop_classification": "异常停止（没有正常停止记录）",
+}
+
+NETWORK_VALUES = {
+    "server_name": "跳板机",
+    "previous_internal": "正常",
+    "current_internal": "中断",
+    "previous_external": "正常",
+    "current_external": "正常",
+    "changed_at": "2026-02-06 10:05:00",
+    "dns_resolution": "正常",
+}
+
+
+def _uncached_render(template_id, values):
+    """每次读取并解析模板（未编译缓存时的代价）"""
+    path = os.path.join(email_templates.TEMPLATE_DIR, "zh_CN", f"{template_id}.html")
+    with open(path, 'r', encoding='utf-8') as f:
+        template = f.read()
+    return template.format(**{k: escape_html(v) for k, v in values.items()})
+
+
+def bench(label, func, number=20000):
+    seconds = timeit.timeit(func, number=number)
+    print(f"{label:<40} {seconds / number * 1e6:8.2f} µs/次")
+
+
+def main():
+    print("=" * 60)
+    print("邮件模板渲染基准测试")
+    print("=" * 60)
+    bench("power_outage（编译缓存）", lambda: email_templates.render("power_outage", **OUTAGE_VALUES))
+    bench("power_outage（每次解析）", lambda: _uncached_render("power_outage", OUTAGE_VALUES))
+    bench("network_status（编译缓存）", lambda: email_templates.render_body("network_status", **NETWORK_VALUES))
+    bench("network_status（每次解析）", lambda: _uncached_render("network_status", NETWORK_VALUES))
+    rows = [dict(OUTAGE_VALUES, server_name=f"host-{i}") for i in range(20)]
+    bench("outage_incident（20台主机）", lambda: email_templates.render(
+        "outage_incident", host_count=len(rows),
+        rows=email_templates.render_rows("outage_incident_row", rows)), number=5000)
+
+
+if __name__ == "__main__":
+    main()
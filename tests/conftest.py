@@ -28,6 +28,25 @@ def setup_resend_mock():
         del sys.modules['resend']
 
 
+@pytest.fixture(autouse=True, scope="session")
+def isolated_state_files():
+    """将熔断器、限速器状态、指标、停止标记和启动 ID 等共享状态文件放到临时目录，避免测试之间相互影响"""
+    state_dir = tempfile.mkdtemp()
+    original_env = os.environ.copy()
+    os.environ.update({
+        "CIRCUIT_BREAKER_FILE": os.path.join(state_dir, "circuit_breaker.json"),
+        "METRICS_FILE": os.path.join(state_dir, "metrics.prom"),
+        "RATE_LIMITER_FILE": os.path.join(state_dir, "rate_limiter.json"),
+        "SENDER_WAKE_SOCKET": os.path.join(state_dir, "sender_wake.sock"),
+        "SHUTDOWN_MARKER_FILE": os.path.join(state_dir, "shutdown_marker.json"),
+        "BOOT_ID_STATE_FILE": os.path.join(state_dir, "boot_id"),
+    })
+    yield state_dir
+    os.environ.clear()
+    os.environ.update(original_env)
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+
 @pytest.fixture
 def temp_data_dir():
     """创建临时数据目录用于测试"""
@@ -0,0 +1,43 @@
+import pytest
+import os
+from unittest.mock import patch
+
+
+class TestBootInfo:
+    """测试 boot_info.py 读取主机启动 ID 和内核启动时间"""
+
+    def test_boot_time_parsed_and_cached(self, temp_data_dir):
+        """测试从 /proc/stat 解析 btime，同一进程内只读取一次"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import boot_info
+
+        proc_stat = os.path.join(temp_data_dir, "stat")
+        with open(proc_stat, 'w') as f:
+            f.write("cpu  1 2 3 4\nintr 100\nbtime 1770000000\nprocesses 42\n")
+
+        boot_info.boot_time.cache_clear()
+        try:
+            with patch.object(boot_info, 'PROC_STAT', proc_stat):
+                assert boot_info.boot_time() == 1770000000
+                os.remove(proc_stat)
+                assert boot_info.boot_time() == 1770000000
+        finally:
+            boot_info.boot_time.cache_clear()
+
+    def test_store_and_compare_boot_id(self, temp_data_dir):
+        """测试保存启动 ID 后比较：相同为未重启，不同为已重启，没有保存过时无法判断"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import boot_info
+
+        boot_id_file = os.path.join(temp_data_dir, "boot_id")
+        assert boot_info.host_rebooted(boot_info.read_stored_boot_id(boot_id_file)) is None
+
+        with patch.object(boot_info, 'boot_id', return_value="boot-1"):
+            assert boot_info.store_boot_id(boot_id_file) == True
+            assert boot_info.store_boot_id(boot_id_file) == False
+            assert boot_info.host_rebooted(boot_info.read_stored_boot_id(boot_id_file)) == False
+
+        with patch.object(boot_info, 'boot_id', return_value="boot-2"):
+            assert boot_info.host_rebooted(boot_info.read_stored_boot_id(boot_id_file)) == True
@@ -0,0 +1,123 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+
+class TestCircuitBreaker:
+    """测试 circuit_breaker.py 的状态切换"""
+
+    def test_opens_after_consecutive_failures(self, temp_data_dir):
+        """测试连续失败达到阈值后打开熔断器"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.circuit_breaker import CircuitBreaker, STATE_OPEN
+
+        breaker = CircuitBreaker(os.path.join(temp_data_dir, "cb.json"), failure_threshold=3, cooldown=300)
+        for _ in range(3):
+            assert breaker.allow_request(now=1000) == True
+            breaker.record_failure(now=1000)
+
+        assert breaker.snapshot()["state"] == STATE_OPEN
+        assert breaker.allow_request(now=1100) == False
+
+    def test_half_open_allows_single_probe(self, temp_data_dir):
+        """测试冷却结束后只放行一个探测请求，成功后关闭"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN
+
+        breaker = CircuitBreaker(os.path.join(temp_data_dir, "cb.json"), failure_threshold=1, cooldown=300)
+        breaker.record_failure(now=1000)
+
+        assert breaker.allow_request(now=1300) == True
+        assert breaker.snapshot()["state"] == STATE_HALF_OPEN
+        assert breaker.allow_request(now=1301) == False
+
+        breaker.record_success(now=1302)
+        state = breaker.snapshot()
+        assert state["state"] == STATE_CLOSED
+        assert state["transitions"] == {"open": 1, "half_open": 1, "closed": 1}
+
+    def test_state_shared_between_instances(self, temp_data_dir):
+        """测试状态持久化到文件，其他进程（实例）可见"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.circuit_breaker import CircuitBreaker
+
+        state_file = os.path.join(temp_data_dir, "cb.json")
+        CircuitBreaker(state_file, failure_threshold=1, cooldown=300).record_failure(now=1000)
+
+        assert CircuitBreaker(state_file, failure_threshold=1, cooldown=300).allow_request(now=1010) == False
+
+    def test_open_circuit_pauses_drain_without_consuming_attempts(self, temp_data_dir, mock_env_vars):
+        """测试熔断器打开时不调用 API，剩余通知原样保留"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+        from app.circuit_breaker import CircuitBreaker
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        notifications = [
+            {"type": "test", "subject": "S1", "html_body": "<html>1</html>"},
+            {"type": "test", "subject": "S2", "html_body": "<html>2</html>"},
+        ]
+        with open(test_file, 'w') as f:
+            json.dump(notifications, f)
+
+        breaker = CircuitBreaker(os.path.join(temp_data_dir, "cb.json"), failure_threshold=1, cooldown=300)
+        breaker.record_failure()
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+
+        try:
+            with patch.object(heartbeat.email_sender, '_circuit_breaker', breaker), \
+                 patch('resend.Emails.send') as mock_resend:
+                heartbeat.process_pending_notifications()
+                mock_resend.assert_not_called()
+
+            remaining = heartbeat._load_pending_notifications()
+            assert [n["subject"] for n in remaining] == ["S1", "S2"]
+            assert all("attempts" not in n for n in remaining)
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+
+    def test_unchanged_state_not_rewritten(self, temp_data_dir):
+        """测试状态没有变化时不重写状态文件"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.circuit_breaker import CircuitBreaker
+
+        breaker = CircuitBreaker(os.path.join(temp_data_dir, "cb.json"), failure_threshold=3, cooldown=300)
+        with patch.object(breaker, '_write', wraps=breaker._write) as mock_write:
+            assert breaker.allow_request(now=1000) == True
+            breaker.record_success(now=1000)
+            mock_write.assert_not_called()
+
+            breaker.record_failure(now=1000)
+            assert mock_write.call_count == 1
+
+    def test_rate_limited_send_does_not_open_circuit(self, temp_data_dir, mock_env_vars):
+        """测试 Resend 返回 429 时不计入熔断失败"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_sender
+        from app.circuit_breaker import CircuitBreaker, STATE_CLOSED
+        from app.rate_limiter import TokenBucket
+
+        class RateLimitError(Exception):
+            pass
+
+        breaker = CircuitBreaker(os.path.join(temp_data_dir, "cb.json"), failure_threshold=1, cooldown=300)
+        limiter = TokenBucket(None, rate=1000, burst=1000)
+        with patch.object(email_sender, '_circuit_breaker', breaker), \
+             patch.object(email_sender, '_rate_limiter', limiter), \
+             patch.object(email_sender, 'SEND_MAX_ATTEMPTS', 1), \
+             patch('resend.Emails.send', side_effect=RateLimitError("rate limited")):
+            with pytest.raises(RateLimitError):
+                email_sender.deliver("key", "from@example.com", "to@example.com", "S", "<p>B</p>")
+
+        state = breaker.snapshot()
+        assert state["state"] == STATE_CLOSED
+        assert state["failures"] == 0
@@ -0,0 +1,119 @@
+import pytest
+import os
+import time
+import asyncio
+from unittest.mock import MagicMock, patch
+
+
+class TestDaemon:
+    """测试 daemon.py 的异步任务调度"""
+
+    def test_probes_run_concurrently(self, mock_env_vars):
+        """测试 DNS、内网和外网探测并发执行，结果与同步版本一致"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        def slow_ping(hosts, dns_cache, ping_args):
+            time.sleep(0.3)
+            return "114.114.114.114" in hosts
+
+        with patch.object(heartbeat, '_get_dns_cache', return_value=MagicMock()), \
+             patch.object(heartbeat, '_ping_any', side_effect=slow_ping), \
+             patch('app.heartbeat.socket.gethostbyname', return_value="1.2.3.4"):
+            started = time.monotonic()
+            status = asyncio.run(heartbeat.check_network_connectivity_async())
+            elapsed = time.monotonic() - started
+
+        assert status["internal_network"] == False
+        assert status["external_network"] == True
+        assert status["dns_resolution"] == True
+        assert elapsed < 0.55
+
+    def test_slow_sender_does_not_delay_heartbeat(self, temp_data_dir, mock_env_vars):
+        """测试发送通知阻塞时心跳仍按间隔写入，停止后任务全部退出"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import daemon
+
+        status = {"timestamp": int(time.time()), "internal_network": True, "external_network": True,
+                  "dns_resolution": True}
+        heartbeat_file_a = os.path.join(temp_data_dir, "heartbeat_a.log")
+        heartbeat_file_b = os.path.join(temp_data_dir, "heartbeat_b.log")
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+        writes = []
+        sends = []
+
+        async def probe(executor=None):
+            return status
+
+        def slow_send(network_status):
+            sends.append(network_status)
+            time.sleep(0.5)
+
+        markers = []
+
+        async def run_for(seconds):
+            d = daemon.Daemon(heartbeat_interval=0.05, probe_interval=10)
+            loop = asyncio.get_running_loop()
+            loop.call_later(seconds, d.stop, "SIGTERM")
+            # 发送仍在进行时标记已经是 clean（停止过程中被 SIGKILL 不会误判为断电）
+            loop.call_later(seconds + 0.05, lambda: markers.append(daemon.shutdown_marker.read_marker(marker_file)))
+            await d.run()
+
+        with patch.object(daemon.heartbeat, 'HEARTBEAT_FILE_A', heartbeat_file_a), \
+             patch.object(daemon.heartbeat, 'HEARTBEAT_FILE_B', heartbeat_file_b), \
+             patch.object(daemon.heartbeat, 'write_heartbeat', side_effect=writes.append), \
+             patch.object(daemon.heartbeat, 'check_network_connectivity_async', side_effect=probe), \
+             patch.object(daemon.heartbeat, 'save_network_status'), \
+             patch.object(daemon.heartbeat, 'check_and_send_pending_notifications', side_effect=slow_send), \
+             patch.object(daemon.heartbeat, 'check_disk_pressure'), \
+             patch.object(daemon.email_sender, 'export_metrics'), \
+             patch.object(daemon.metrics, 'write_textfile'), \
+             patch.object(daemon.Daemon, '_start_threads'), \
+             patch.object(daemon.shutdown_marker, 'SHUTDOWN_MARKER_FILE', marker_file), \
+             patch.object(daemon.boot_info, 'BOOT_ID_STATE_FILE', os.path.join(temp_data_dir, "boot_id")):
+            asyncio.run(run_for(0.4))
+
+        assert sends == [status]
+        assert [m["state"] for m in markers] == ["clean"]
+        assert len(writes) >= 5
+        assert writes[:2] == [heartbeat_file_a, heartbeat_file_b]
+        # 停止后写入正常停止标记
+        assert daemon.shutdown_marker.read_marker(marker_file)["state"] == "clean"
+
+    def test_busy_probes_do_not_delay_heartbeat(self, temp_data_dir, mock_env_vars):
+        """测试探测占满 IO 线程池时心跳仍按间隔写入"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import daemon
+
+        status = {"timestamp": int(time.time()), "internal_network": True, "external_network": True,
+                  "dns_resolution": True}
+        writes = []
+
+        async def slow_probe(executor=None):
+            loop = asyncio.get_running_loop()
+            # 所有 IO 线程都被阻塞的探测占用
+            await asyncio.gather(*(loop.run_in_executor(executor, time.sleep, 0.5)
+                                   for _ in range(daemon.PROBE_WORKERS)))
+            return status
+
+        async def run_for(seconds):
+            d = daemon.Daemon(heartbeat_interval=0.05, probe_interval=10)
+            asyncio.get_running_loop().call_later(seconds, d.stop, "SIGTERM")
+            await d.run()
+
+        with patch.object(daemon.heartbeat, 'write_heartbeat', side_effect=writes.append), \
+             patch.object(daemon.heartbeat, 'check_network_connectivity_async', side_effect=slow_probe), \
+             patch.object(daemon.heartbeat, 'save_network_status'), \
+             patch.object(daemon.heartbeat, 'check_and_send_pending_notifications'), \
+             patch.object(daemon.heartbeat, 'check_disk_pressure'), \
+             patch.object(daemon.email_sender, 'export_metrics'), \
+             patch.object(daemon.metrics, 'write_textfile'), \
+             patch.object(daemon.Daemon, '_start_threads'), \
+             patch.object(daemon.shutdown_marker, 'SHUTDOWN_MARKER_FILE', os.path.join(temp_data_dir, "marker")), \
+             patch.object(daemon.boot_info, 'BOOT_ID_STATE_FILE', os.path.join(temp_data_dir, "boot_id")):
+            asyncio.run(run_for(0.4))
+
+        assert len(writes) >= 5
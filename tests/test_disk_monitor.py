@@ -0,0 +1,72 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+MB = 1024 * 1024
+
+
+class TestDiskMonitor:
+    """测试 disk_monitor.py 的持续监控和降载"""
+
+    def test_hysteresis_alerts_once_per_episode(self):
+        """测试低于下限进入紧张状态、高于恢复值才解除，每次进入只返回一次 entered"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.disk_monitor import DiskMonitor
+
+        monitor = DiskMonitor("/data", low_mb=100, recover_mb=150, sample_interval=0)
+        readings = iter([500, 90, 80, 120, 140, 160, 90])
+        with patch('app.disk_monitor._free_bytes', side_effect=lambda path: next(readings) * MB):
+            transitions = [monitor.check(now=i) for i in range(7)]
+
+        assert transitions == [None, "entered", None, None, None, "exited", "entered"]
+        assert monitor.under_pressure == True
+
+    def test_sample_is_cached(self):
+        """测试采样间隔内不重复访问文件系统"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.disk_monitor import DiskMonitor
+
+        monitor = DiskMonitor("/data", sample_interval=60)
+        with patch('app.disk_monitor._free_bytes', return_value=500 * MB) as mock_free:
+            monitor.sample(now=0)
+            monitor.sample(now=30)
+            assert mock_free.call_count == 1
+            monitor.sample(now=61)
+            assert mock_free.call_count == 2
+
+    def test_entering_pressure_sheds_load(self, temp_data_dir, mock_env_vars):
+        """测试进入紧张状态时丢弃信息类通知、裁剪死信文件"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+        from app.disk_monitor import DiskMonitor
+
+        pending_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        dead_letter_file = os.path.join(temp_data_dir, "dead_letter_notifications.log")
+        with open(pending_file, 'w') as f:
+            json.dump([
+                {"type": "power_outage", "subject": "断电", "html_body": "<html>1</html>"},
+                {"type": "test", "subject": "信息", "html_body": "<html>2</html>"},
+            ], f)
+        with open(dead_letter_file, 'w') as f:
+            json.dump([{"subject": f"D{i}"} for i in range(5)], f)
+
+        monitor = DiskMonitor(temp_data_dir, low_mb=100, recover_mb=150, sample_interval=0)
+        try:
+            with patch.object(heartbeat, 'PENDING_NOTIFICATIONS_FILE', pending_file), \
+                 patch.object(heartbeat, 'DEAD_LETTER_FILE', dead_letter_file), \
+                 patch.object(heartbeat, 'DEAD_LETTER_KEEP_UNDER_PRESSURE', 2), \
+                 patch.object(heartbeat, '_disk_monitor', monitor), \
+                 patch('app.disk_monitor._free_bytes', return_value=50 * MB):
+                assert heartbeat.check_disk_pressure() == True
+                remaining = heartbeat._load_pending_notifications()
+
+            assert [n["subject"] for n in remaining] == ["断电"]
+            with open(dead_letter_file) as f:
+                assert [n["subject"] for n in json.load(f)] == ["D3", "D4"]
+            assert heartbeat.logger_config._disk_pressure == True
+        finally:
+            heartbeat.logger_config.set_disk_pressure(False)
@@ -0,0 +1,70 @@
+import pytest
+import os
+import socket
+from unittest.mock import patch
+
+
+class TestDNSCache:
+    """测试 dns_cache.py 的缓存行为"""
+
+    def test_ip_address_bypasses_dns(self):
+        """测试 IP 地址目标不经过 DNS"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.dns_cache import DNSCache
+
+        cache = DNSCache()
+        with patch('socket.gethostbyname') as mock_dns:
+            assert cache.probe_address("114.114.114.114") == "114.114.114.114"
+            mock_dns.assert_not_called()
+
+    def test_positive_result_cached_until_ttl(self):
+        """测试解析成功的结果在 TTL 内直接复用"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.dns_cache import DNSCache
+
+        cache = DNSCache(ttl=300, negative_ttl=60)
+        with patch('socket.gethostbyname', return_value="1.2.3.4") as mock_dns:
+            assert cache.resolve("example.com", now=1000) == "1.2.3.4"
+            assert cache.resolve("example.com", now=1200) == "1.2.3.4"
+            assert mock_dns.call_count == 1
+
+            cache.resolve("example.com", now=1301)
+            assert mock_dns.call_count == 2
+
+    def test_negative_result_keeps_stale_address(self):
+        """测试解析失败时负缓存并保留上一次成功的地址"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.dns_cache import DNSCache
+
+        cache = DNSCache(ttl=300, negative_ttl=60)
+        with patch('socket.gethostbyname', return_value="1.2.3.4"):
+            cache.resolve("example.com", now=1000)
+
+        with patch('socket.gethostbyname', side_effect=socket.gaierror("fail")) as mock_dns:
+            assert cache.resolve("example.com", now=1400) == "1.2.3.4"
+            # 负缓存期间不再重试
+            assert cache.resolve("example.com", now=1450) == "1.2.3.4"
+            assert mock_dns.call_count == 1
+
+        with patch('socket.gethostbyname', side_effect=socket.gaierror("fail")):
+            assert cache.resolve("unknown.invalid", now=1000) is None
+
+    def test_persisted_cache_used_without_dns(self, temp_data_dir):
+        """测试重启后直接使用持久化的（过期）地址进行探测"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.dns_cache import DNSCache
+
+        cache_file = os.path.join(temp_data_dir, "dns_cache.json")
+        cache = DNSCache(cache_file, ttl=1)
+        with patch('socket.gethostbyname', return_value="1.2.3.4"):
+            cache.resolve("example.com", now=1000)
+        cache.save()
+
+        reloaded = DNSCache(cache_file, ttl=1)
+        with patch('socket.gethostbyname') as mock_dns:
+            assert reloaded.probe_address("example.com") == "1.2.3.4"
+            mock_dns.assert_not_called()
@@ -0,0 +1,120 @@
+import pytest
+import os
+
+
+class TestEmailTemplates:
+    """测试 email_templates.py 与 html_utils.py 的模板渲染"""
+
+    def test_render_power_outage_escapes_values(self):
+        """测试断电邮件渲染时自动转义变量"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_templates
+
+        subject, html_body = email_templates.render(
+            "power_outage",
+            server_name="<script>x</script>",
+            power_off_time="2026-01-01 00:00:00",
+            power_on_time="2026-01-01 00:05:00",
+            duration_formatted="00 小时 05 分钟 00 秒",
+            stop_classification="按心跳间隔判断"
+        )
+
+        assert subject == "[断电警报] 服务器 <script>x</script> 发生异常断电"
+        assert "&lt;script&gt;x&lt;/script&gt;" in html_body
+        assert "<script>" not in html_body
+        assert "2026-01-01 00:05:00" in html_body
+
+    def test_render_locale_variant_and_fallback(self):
+        """测试按语言选择模板，不支持的语言回退到默认语言"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_templates
+
+        english = email_templates.render_subject("network_status", locale="en", server_name="A")
+        fallback = email_templates.render_subject("network_status", locale="fr", server_name="A")
+
+        assert english.startswith("[Network Status]")
+        assert fallback.startswith("[网络状态]")
+
+    def test_render_rows_not_double_escaped(self):
+        """测试已渲染的表格行不会被再次转义"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_templates
+
+        rows = email_templates.render_rows("outage_incident_row", [{
+            "server_name": "A&B",
+            "power_off_time": "t1",
+            "power_on_time": "t2",
+            "duration_formatted": "d"
+        }])
+        html_body = email_templates.render_body("outage_incident", host_count=1, rows=rows)
+
+        assert "<td><strong>A&amp;B</strong></td>" in html_body
+
+    def test_safe_format_email_content_uses_compiled_template(self):
+        """测试 safe_format_email_content 转义变量并复用编译结果"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import html_utils
+
+        template = "<p>{name}</p>"
+        assert html_utils.safe_format_email_content(template, name="<b>") == "<p>&lt;b&gt;</p>"
+        assert html_utils.compile_template(template) is html_utils.compile_template(template)
+
+    def test_render_power_outage_english_duration(self):
+        """测试英文邮件中的断电持续时间使用英文单位"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_templates
+
+        notification = {
+            "type": "power_outage",
+            "template_id": "power_outage",
+            "server_name": "A",
+            "power_off_ts": 1770000000,
+            "power_on_ts": 1770000000 + 3725,
+        }
+        _, english = email_templates.render_notification(notification, locale="en")
+        _, chinese = email_templates.render_notification(notification, locale="zh_CN")
+
+        assert "01 h 02 min 05 s" in english
+        assert "小时" not in english
+        assert "01 小时 02 分钟 05 秒" in chinese
+
+    def test_render_every_template_with_notification_fields(self):
+        """测试每种语言的每个模板都能用对应通知类型产生的字段渲染（模板新增变量时通知必须提供）"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import email_templates
+
+        # 与 main.py / heartbeat.py 生成的通知字段一致
+        outage = {
+            "type": "power_outage", "template_id": "power_outage", "timestamp": 1770000400,
+            "server_name": "跳板机", "power_off_ts": 1770000000, "power_on_ts": 1770000300,
+            "duration_seconds": 300, "stop_classification": "unclean_shutdown",
+            "host_rebooted": True, "boot_id": "b1",
+        }
+        notifications = {
+            "power_outage": outage,
+            "network_status": {
+                "type": "network_status", "template_id": "network_status", "timestamp": 1770000400,
+                "server_name": "跳板机",
+                "current_status": {"timestamp": 1770000400, "internal_network": False,
+                                   "external_network": True, "dns_resolution": True},
+                "previous_status": {"last_internal_network": True, "last_external_network": True},
+            },
+            "outage_incident": dict(outage, template_id="outage_incident", correlated=True,
+                                    incident=[outage, dict(outage, server_name="备用机")]),
+        }
+        assert set(notifications) == set(email_templates.VALUE_BUILDERS)
+
+        for locale in sorted(os.listdir(email_templates.TEMPLATE_DIR)):
+            template_ids = {name[:-len(".html")] for name in os.listdir(os.path.join(email_templates.TEMPLATE_DIR, locale))}
+            assert template_ids - {"outage_incident_row"} == set(notifications)
+            for template_id, notification in notifications.items():
+                subject, html_body = email_templates.render_notification(notification, locale=locale)
+                assert subject and "跳板机" in html_body
+            _, html_body = email_templates.render_notification(outage, locale=locale)
+            assert email_templates.labels(locale)["unclean_shutdown"] in html_body
@@ -0,0 +1,125 @@
+import pytest
+import os
+import time
+import threading
+
+
+def _wait_for(events, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return list(events)
+
+
+class TestFileWatcher:
+    """测试 file_watcher.py 的文件变化监听"""
+
+    @pytest.mark.skipif(not os.path.exists("/proc/sys/fs/inotify"), reason="需要 inotify")
+    def test_inotify_reports_write_and_replace(self, temp_data_dir):
+        """测试 inotify 模式下直接写入和原子替换都会触发回调，其他文件不会"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.file_watcher import FileWatcher
+
+        path = os.path.join(temp_data_dir, "network_status.log")
+        events = []
+        watcher = FileWatcher([path], events.append)
+        watcher.start()
+        try:
+            assert watcher.mode == "inotify"
+            with open(os.path.join(temp_data_dir, "other.log"), 'w') as f:
+                f.write("x")
+            with open(path, 'w') as f:
+                f.write("1")
+            assert _wait_for(events, 1) == [path]
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write("2")
+            os.replace(tmp_path, path)
+            assert _wait_for(events, 2) == [path, path]
+        finally:
+            watcher.stop(timeout=5)
+        assert not watcher.is_alive()
+
+    def test_polling_fallback(self, temp_data_dir):
+        """测试不使用 inotify 时按修改时间轮询"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.file_watcher import FileWatcher
+
+        path = os.path.join(temp_data_dir, "pending_notifications.log")
+        events = []
+        watcher = FileWatcher([path], events.append, poll_interval=0.05, use_inotify=False)
+        watcher.start()
+        try:
+            assert watcher.mode == "poll"
+            time.sleep(0.1)
+            assert events == []
+            with open(path, 'w') as f:
+                f.write("[]")
+            assert _wait_for(events, 1) == [path]
+        finally:
+            watcher.stop(timeout=5)
+
+    @pytest.mark.skipif(not os.path.exists("/proc/sys/fs/inotify"), reason="需要 inotify")
+    def test_queue_write_wakes_sender(self, temp_data_dir):
+        """测试队列文件被写入后立即唤醒发送线程"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.file_watcher import FileWatcher
+        from app.sender_worker import SenderWorker
+        from app import notification_queue
+
+        path = os.path.join(temp_data_dir, "pending_notifications.log")
+        drained = threading.Event()
+        sender = SenderWorker(lambda status: drained.set(), idle_interval=3600)
+        sender.start()
+        sender.notify({"external_network": True})
+        assert drained.wait(5)
+        drained.clear()
+
+        watcher = FileWatcher([path], lambda changed: sender.notify())
+        watcher.start()
+        try:
+            started = time.monotonic()
+            notification_queue.save_notifications(path, [{"type": "test", "subject": "S", "html_body": "<p></p>"}])
+            assert drained.wait(5)
+            assert time.monotonic() - started < 1
+        finally:
+            watcher.stop(timeout=5)
+            sender.stop(timeout=5)
+
+    @pytest.mark.skipif(not os.path.exists("/proc/sys/fs/inotify"), reason="需要 inotify")
+    def test_own_writes_do_not_rewake_sender(self, temp_data_dir):
+        """测试发送线程每次都改写队列文件（通知一直无法发送）时，自己的写入不会反复唤醒自己"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.file_watcher import FileWatcher
+        from app.sender_worker import SenderWorker
+        from app import notification_queue
+
+        path = os.path.join(temp_data_dir, "pending_notifications.log")
+        drains = []
+        watcher = FileWatcher([path], lambda changed: sender.notify(),
+                              ignore=notification_queue.written_by_this_process)
+
+        def drain(status):
+            drains.append(time.monotonic())
+            notification_queue.save_notifications(path, [{"type": "test", "id": "a"}])
+
+        sender = SenderWorker(drain, idle_interval=3600)
+        sender.start()
+        watcher.start()
+        try:
+            sender.notify({"external_network": True})
+            time.sleep(0.5)
+            assert len(drains) == 1
+
+            # 其他进程的写入仍然唤醒
+            with open(path, 'w') as f:
+                f.write('[{"type": "test", "id": "b"}]')
+            assert len(_wait_for(drains, 2)) == 2
+        finally:
+            watcher.stop(timeout=5)
+            sender.stop(timeout=5)
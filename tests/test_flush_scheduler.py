@@ -0,0 +1,71 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+
+class TestFlushScheduler:
+    """测试 flush_scheduler.py 的抖动与模拟功能"""
+
+    def test_compute_flush_delay_deterministic(self):
+        """测试同一主机同一事件的延迟固定且在窗口内"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import flush_scheduler
+
+        seed = flush_scheduler.host_seed("Test Server", hostname="host-1")
+        delay_1 = flush_scheduler.compute_flush_delay(seed, 1000, window=30)
+        delay_2 = flush_scheduler.compute_flush_delay(seed, 1000, window=30)
+
+        assert delay_1 == delay_2
+        assert 0 <= delay_1 < 30
+
+    def test_compute_flush_delay_zero_window(self):
+        """测试窗口为0时不延迟"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import flush_scheduler
+
+        assert flush_scheduler.compute_flush_delay(12345, 1000, window=0) == 0.0
+
+    def test_simulate_spreads_fleet(self):
+        """测试模拟结果的峰值明显低于主机数量"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import flush_scheduler
+
+        result = flush_scheduler.simulate(200, window=30, queue_len=2, send_interval=1)
+
+        assert result["total"] == 400
+        assert result["peak"] < 200
+
+    def test_recovery_applies_jitter(self, temp_data_dir, mock_env_vars):
+        """测试外网恢复且队列非空时先随机等待再发送"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([{"type": "test", "subject": "Test", "html_body": "<html>Test</html>"}], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+        heartbeat._last_external_network = False
+
+        try:
+            with patch('app.heartbeat.process_pending_notifications') as mock_process, \
+                 patch('app.heartbeat.flush_scheduler.compute_flush_delay', return_value=5.0), \
+                 patch('app.heartbeat.time.sleep') as mock_sleep:
+                heartbeat.check_and_send_pending_notifications({"external_network": True})
+
+                mock_sleep.assert_called_once_with(5.0)
+                mock_process.assert_called_once()
+
+                # 外网持续正常时不再等待
+                mock_sleep.reset_mock()
+                heartbeat.check_and_send_pending_notifications({"external_network": True})
+                mock_sleep.assert_not_called()
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+            heartbeat._last_external_network = None
@@ -147,7 +147,7 @@ class TestHeartbeatFunctionality:
                 "<html><body>Test</body></html>"
             )
 
-            assert result == True
+            assert result == (True, None)
             mock_resend.assert_called_once()
 
     def test_send_email_with_resend_missing_config(self, mock_env_vars):
@@ -172,7 +172,7 @@ class TestHeartbeatFunctionality:
                 "<html>Test</html>"
             )
 
-            assert result == False
+            assert result == (False, None)
         finally:
             # 恢复原始值
             heartbeat.RESEND_API_KEY = original_api_key
@@ -188,12 +188,13 @@ class TestHeartbeatFunctionality:
         with patch('resend.Emails.send') as mock_resend:
             mock_resend.side_effect = Exception("API Error")
 
-            result = heartbeat.send_email_with_resend(
+            sent, error = heartbeat.send_email_with_resend(
                 "Test Subject",
                 "<html>Test</html>"
             )
 
-            assert result == False
+            assert sent == False
+            assert str(error) == "API Error"
 
     def test_process_pending_notifications_empty(self, temp_data_dir):
         """测试处理空的待发送通知队列"""
@@ -240,7 +241,7 @@ class TestHeartbeatFunctionality:
         heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
         
         try:
-            with patch('app.heartbeat.send_email_with_resend', return_value=True) as mock_send:
+            with patch('app.heartbeat.send_email_with_resend', return_value=(True, None)) as mock_send:
                 heartbeat.process_pending_notifications()
 
                 assert mock_send.call_count == 2
@@ -274,8 +275,8 @@ class TestHeartbeatFunctionality:
         heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
         
         try:
-            def send_side_effect(subject, body):
-                return "Success" in subject
+            def send_side_effect(subject, body, idempotency_key=None):
+                return "Success" in subject, None
 
             with patch('app.heartbeat.send_email_with_resend', side_effect=send_side_effect) as mock_send:
                 heartbeat.process_pending_notifications()
@@ -287,6 +288,45 @@ class TestHeartbeatFunctionality:
         finally:
             heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
 
+    def test_open_circuit_does_not_rewrite_queue(self, temp_data_dir):
+        """测试熔断器打开时发送不改写队列文件（队列文件监听不会反复唤醒发送），通知也不标记为发送中"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+        from app.circuit_breaker import CircuitBreaker
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([{"type": "test", "id": "a", "subject": "A", "html_body": "<p>A</p>"}], f)
+
+        def queue_state():
+            st = os.stat(test_file)
+            return st.st_ino, st.st_mtime_ns
+
+        breaker = CircuitBreaker(None, failure_threshold=1)
+        breaker.record_failure()
+        before = queue_state()
+        with patch.object(heartbeat, 'PENDING_NOTIFICATIONS_FILE', test_file), \
+             patch.object(heartbeat.email_sender, 'get_circuit_breaker', return_value=breaker), \
+             patch('app.heartbeat.send_email_with_resend') as mock_send:
+            for _ in range(3):
+                heartbeat.process_pending_notifications()
+            mock_send.assert_not_called()
+        assert queue_state() == before
+
+        # 检查之后熔断器才打开：发送中标记被清除，同样不改写队列文件
+        with patch.object(heartbeat, 'PENDING_NOTIFICATIONS_FILE', test_file), \
+             patch.object(heartbeat, 'RESEND_API_KEY', "key"), \
+             patch.object(heartbeat, 'SENDER_FROM_ADDRESS', "from@example.com"), \
+             patch.object(heartbeat, 'RECIPIENT_EMAIL', "to@example.com"), \
+             patch.object(heartbeat.email_sender, 'send_paused', return_value=None), \
+             patch.object(heartbeat.email_sender, 'deliver', side_effect=heartbeat.CircuitOpenError("open")):
+            heartbeat.process_pending_notifications()
+            queued = heartbeat._load_pending_notifications()
+        assert queue_state() == before
+        assert [n["id"] for n in queued] == ["a"]
+        assert "sending_until" not in queued[0]
+
     def test_check_and_send_pending_notifications_with_network(self, temp_data_dir):
         """测试有网络时发送待处理通知"""
         import sys
@@ -0,0 +1,99 @@
+import pytest
+import os
+import json
+import logging
+
+
+class TestLoggerConfig:
+    """测试 logger_config.py 的异步结构化日志"""
+
+    def test_json_records_with_structured_fields(self, temp_data_dir):
+        """测试文件日志为 JSON，extra 字段独立输出"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import logger_config
+
+        log_file = os.path.join(temp_data_dir, "power_monitor.log")
+        logger_config.setup_logging(log_file=log_file, level="INFO", module_levels={}, console=False)
+        try:
+            logger = logger_config.get_logger("heartbeat")
+            logger.info("心跳更新 %s", "ok", extra={"phase": "heartbeat", "duration_ms": 12, "queue_len": 3})
+        finally:
+            logger_config.shutdown_logging()
+
+        with open(log_file, 'r', encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        assert entry["msg"] == "心跳更新 ok"
+        assert entry["logger"] == "power_monitor.heartbeat"
+        assert entry["level"] == "INFO"
+        assert (entry["phase"], entry["duration_ms"], entry["queue_len"]) == ("heartbeat", 12, 3)
+
+    def test_per_module_levels(self, temp_data_dir):
+        """测试按模块设置日志级别"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import logger_config
+
+        levels = logger_config.parse_levels("file_lock=WARNING, retry_utils=debug, bad=NOPE")
+        assert levels == {"file_lock": logging.WARNING, "retry_utils": logging.DEBUG}
+
+        log_file = os.path.join(temp_data_dir, "power_monitor.log")
+        logger_config.setup_logging(log_file=log_file, level="INFO", module_levels=levels, console=False)
+        try:
+            logger_config.get_logger("file_lock").info("不应输出")
+            logger_config.get_logger("retry_utils").debug("应输出")
+        finally:
+            logger_config.shutdown_logging()
+            for name in levels:
+                logger_config.get_logger(name).setLevel(logging.NOTSET)
+
+        with open(log_file, 'r', encoding='utf-8') as f:
+            messages = [json.loads(line)["msg"] for line in f]
+        assert messages == ["应输出"]
+
+    def test_rotated_segments_compressed_and_retained(self, temp_data_dir):
+        """测试轮转出的日志段在后台压缩，总大小超出预算时删除最旧的日志段"""
+        import sys
+        import gzip
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import logger_config
+
+        log_file = os.path.join(temp_data_dir, "power_monitor.log")
+        handler = logger_config.CompressingRotatingFileHandler(
+            log_file, max_bytes=2000, retention_bytes=1500, compression="gzip")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            for i in range(200):
+                # 每条内容不同，避免压缩率过高
+                handler.emit(logging.LogRecord("t", logging.INFO, "", 0, os.urandom(40).hex(), (), None))
+            assert handler.wait_idle(10)
+        finally:
+            handler.close()
+
+        segments = [name for name in os.listdir(temp_data_dir) if name.startswith("power_monitor.log.")]
+        assert segments
+        assert all(name.endswith(".gz") for name in segments)
+        assert sum(os.path.getsize(os.path.join(temp_data_dir, name)) for name in segments) <= 1500
+        with gzip.open(os.path.join(temp_data_dir, sorted(segments)[-1]), 'rt') as f:
+            assert f.readline().strip()
+
+    def test_disk_pressure_drops_info_records(self, temp_data_dir):
+        """测试磁盘空间紧张时文件日志只保留 WARNING 及以上级别，控制台只停止 DEBUG"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import logger_config
+
+        debug = logging.LogRecord("t", logging.DEBUG, "", 0, "debug", (), None)
+        info = logging.LogRecord("t", logging.INFO, "", 0, "info", (), None)
+        warning = logging.LogRecord("t", logging.WARNING, "", 0, "warning", (), None)
+
+        logger_config.set_disk_pressure(True)
+        try:
+            assert logger_config._file_filter(info) == False
+            assert logger_config._file_filter(warning) == True
+            assert logger_config._debug_filter(debug) == False
+            assert logger_config._debug_filter(info) == True
+        finally:
+            logger_config.set_disk_pressure(False)
+        assert logger_config._file_filter(info) == True
+        assert logger_config._debug_filter(debug) == True
@@ -348,6 +348,31 @@ class TestMainFunctionality:
             main.NETWORK_STATUS_FILE = original_status_file
             main.NETWORK_HISTORY_FILE = original_history_file
 
+    @patch('app.main.send_email_with_resend')
+    def test_check_network_status_changes_enqueue_only(self, mock_send_email, temp_data_dir):
+        """测试不立即发送时，外网正常也只将网络状态变化通知加入队列"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+
+        test_status_file = os.path.join(temp_data_dir, "network_status.log")
+        test_history_file = os.path.join(temp_data_dir, "network_history.log")
+        with open(test_status_file, 'w') as f:
+            json.dump({"timestamp": int(time.time()), "internal_network": False,
+                       "external_network": True, "dns_resolution": True}, f)
+        with open(test_history_file, 'w') as f:
+            json.dump({"last_internal_network": True, "last_external_network": True}, f)
+
+        with patch.object(main, 'NETWORK_STATUS_FILE', test_status_file), \
+             patch.object(main, 'NETWORK_HISTORY_FILE', test_history_file), \
+             patch.object(main, '_add_pending_notification') as mock_add:
+            main.check_network_status_changes(send_immediately=False)
+
+            mock_send_email.assert_not_called()
+            mock_add.assert_called_once()
+            assert mock_add.call_args[0][0]["current_status"]["internal_network"] == False
+            assert main._load_network_history()["last_internal_network"] == False
+
     @patch('app.main.send_email_with_resend')
     def test_check_network_status_changes_expired_data(self, mock_send_email, temp_data_dir):
         """测试网络状态数据过期的情况"""
@@ -450,4 +475,115 @@ class TestMainFunctionality:
             main.main()
 
         # 验证添加了待发送通知
-        mock_add_notification.assert_called_once()
\ No newline at end of file
+        mock_add_notification.assert_called_once()
+
+
+def _run_boot_check(heartbeat_files, marker_file, gap_seconds, boot_id_file=None):
+    """写入指定间隔之前的心跳后运行启动检查，返回 _add_pending_notification 的 mock"""
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from app import main
+
+    file_a, file_b = heartbeat_files
+    last_alive = int(time.time()) - gap_seconds
+    for path in (file_a, file_b):
+        with open(path, 'w') as f:
+            f.write(str(last_alive))
+
+    with patch.object(main, 'HEARTBEAT_FILE_A', file_a), \
+         patch.object(main, 'HEARTBEAT_FILE_B', file_b), \
+         patch.object(main, 'OUTAGE_THRESHOLD', 180), \
+         patch.object(main.shutdown_marker, 'SHUTDOWN_MARKER_FILE', marker_file), \
+         patch.object(main.boot_info, 'BOOT_ID_STATE_FILE', boot_id_file or marker_file + ".boot_id"), \
+         patch('app.main.check_network_status_changes'), \
+         patch('app.main._add_pending_notification') as mock_add:
+        main.main()
+    return mock_add
+
+
+class TestShutdownMarker:
+    """测试启动检查根据停止标记区分正常重启和异常断电"""
+
+    def test_clean_shutdown_not_reported(self, heartbeat_files, temp_data_dir):
+        """测试正常停止后即使停机超过阈值也不报告断电，标记读取后删除"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import shutdown_marker
+
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+        shutdown_marker.mark_clean("SIGTERM", path=marker_file)
+
+        mock_add = _run_boot_check(heartbeat_files, marker_file, gap_seconds=3600)
+
+        mock_add.assert_not_called()
+        assert not os.path.exists(marker_file)
+
+    def test_unclean_shutdown_reported_below_threshold(self, heartbeat_files, temp_data_dir):
+        """测试没有正常停止记录时即使停机时间低于阈值也报告断电，通知中包含分类"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import shutdown_marker
+        from app import email_templates
+
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+        shutdown_marker.mark_running(path=marker_file)
+
+        mock_add = _run_boot_check(heartbeat_files, marker_file, gap_seconds=30)
+
+        mock_add.assert_called_once()
+        notification = mock_add.call_args[0][0]
+        assert notification["stop_classification"] == shutdown_marker.UNCLEAN_SHUTDOWN
+        _, html_body = email_templates.render_notification(notification)
+        assert "异常停止" in html_body
+
+    def test_no_marker_falls_back_to_threshold(self, heartbeat_files, temp_data_dir):
+        """测试没有停止标记时按心跳间隔判断"""
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+
+        assert _run_boot_check(heartbeat_files, marker_file, gap_seconds=30).call_count == 0
+        mock_add = _run_boot_check(heartbeat_files, marker_file, gap_seconds=600)
+        assert mock_add.call_args[0][0]["stop_classification"] == "unknown"
+
+
+class TestBootIdClassification:
+    """测试启动检查根据启动 ID 区分主机重启和容器重启"""
+
+    def test_same_boot_id_is_not_outage(self, heartbeat_files, temp_data_dir):
+        """测试启动 ID 未变化（只是容器重启）时即使没有正常停止记录也不报告断电"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+        boot_id_file = os.path.join(temp_data_dir, "boot_id")
+        main.shutdown_marker.mark_running(path=marker_file)
+        with open(boot_id_file, 'w') as f:
+            f.write("boot-1")
+
+        with patch.object(main.boot_info, 'boot_id', return_value="boot-1"):
+            mock_add = _run_boot_check(heartbeat_files, marker_file, 3600, boot_id_file)
+
+        mock_add.assert_not_called()
+
+    def test_host_reboot_uses_kernel_boot_time(self, heartbeat_files, temp_data_dir):
+        """测试主机重启后以内核启动时间作为通电时间"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+
+        marker_file = os.path.join(temp_data_dir, "shutdown_marker.json")
+        boot_id_file = os.path.join(temp_data_dir, "boot_id")
+        main.shutdown_marker.mark_running(path=marker_file)
+        with open(boot_id_file, 'w') as f:
+            f.write("boot-1")
+        btime = int(time.time()) - 600
+
+        with patch.object(main.boot_info, 'boot_id', return_value="boot-2"), \
+             patch.object(main.boot_info, 'boot_time', return_value=btime):
+            mock_add = _run_boot_check(heartbeat_files, marker_file, 900, boot_id_file)
+
+        notification = mock_add.call_args[0][0]
+        assert notification["power_on_ts"] == btime
+        assert notification["duration_seconds"] == notification["power_on_ts"] - notification["power_off_ts"]
+        assert notification["host_rebooted"] == True
+        assert notification["boot_id"] == "boot-2"
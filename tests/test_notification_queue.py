@@ -0,0 +1,400 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+import time
+
+
+class TestNotificationQueue:
+    """测试 notification_queue.py 的队列格式与迁移"""
+
+    def test_migrate_legacy_power_outage(self):
+        """测试带 html_body 的旧断电通知迁移为结构化格式"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        legacy = {
+            "type": "power_outage",
+            "timestamp": 1770343500,
+            "power_off_time": "2026-02-06 10:00:00",
+            "power_on_time": "2026-02-06 10:05:00",
+            "duration_formatted": "00 小时 05 分钟 00 秒",
+            "duration_seconds": 300,
+            "subject": "[断电警报] 服务器 A 发生异常断电",
+            "html_body": "<html>...</html>"
+        }
+        migrated = notification_queue.migrate_notification(legacy, "A")
+
+        assert migrated["template_id"] == "power_outage"
+        assert migrated["server_name"] == "A"
+        assert migrated["power_on_ts"] - migrated["power_off_ts"] == 300
+        assert "html_body" not in migrated
+
+    def test_unmigratable_legacy_kept_as_is(self):
+        """测试缺少结构化字段的旧通知原样保留"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        legacy = {"type": "power_outage", "subject": "S", "html_body": "<html>B</html>"}
+        assert notification_queue.migrate_notification(legacy, "A") == legacy
+
+    def test_structured_notification_rendered_at_send(self, temp_data_dir, mock_env_vars):
+        """测试队列中只保存结构化字段，发送时才渲染"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        now = int(time.time())
+        notification = {
+            "type": "power_outage",
+            "template_id": "power_outage",
+            "timestamp": now,
+            "server_name": "Test Server",
+            "power_off_ts": now - 300,
+            "power_on_ts": now
+        }
+        with open(test_file, 'w') as f:
+            json.dump([notification], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+
+        try:
+            with patch('app.heartbeat.send_email_with_resend', return_value=(True, None)) as mock_send:
+                heartbeat.process_pending_notifications()
+
+                subject, html_body = mock_send.call_args[0]
+                assert "Test Server" in subject
+                assert "00 小时 05 分钟 00 秒" in html_body
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+
+    def _network_notification(self, prev_internal, cur_internal):
+        return {
+            "type": "network_status",
+            "template_id": "network_status",
+            "server_name": "Test Server",
+            "current_status": {"timestamp": int(time.time()), "internal_network": cur_internal,
+                               "external_network": False, "dns_resolution": False},
+            "previous_status": {"last_internal_network": prev_internal, "last_external_network": False}
+        }
+
+    def test_network_flap_cancelled(self):
+        """测试 A→B 后 B→A 的网络变化相互抵消"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        queue = notification_queue.NotificationQueue()
+        assert queue.push(self._network_notification(True, False)) == "added"
+        assert queue.push(self._network_notification(False, True)) == "cancelled"
+        assert len(queue) == 0
+        assert queue.find("network_status:internal") is None
+        assert queue.avoided_sends == 2
+
+    def test_network_changes_keep_net_change(self):
+        """测试 A→B、B→A、A→B 只保留一条净变化"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        queue = notification_queue.NotificationQueue()
+        queue.push(self._network_notification(True, False))
+        queue.push(self._network_notification(False, True))
+        queue.push(self._network_notification(True, False))
+
+        remaining = queue.to_list()
+        assert len(remaining) == 1
+        assert remaining[0]["previous_status"]["last_internal_network"] == True
+        assert remaining[0]["current_status"]["internal_network"] == False
+
+    def test_add_pending_notification_supersedes_and_reports(self, temp_data_dir):
+        """测试入队时合并同类通知，并在发送时报告避免的发送次数"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        original_main_file = main.PENDING_NOTIFICATIONS_FILE
+        original_heartbeat_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        main.PENDING_NOTIFICATIONS_FILE = test_file
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+
+        try:
+            main._add_pending_notification(self._network_notification(True, False))
+            main._add_pending_notification(self._network_notification(False, True))
+            main._add_pending_notification(self._network_notification(True, False))
+
+            assert len(main._load_pending_notifications()) == 1
+
+            with patch('app.heartbeat.send_email_with_resend', return_value=(True, None)) as mock_send:
+                heartbeat.process_pending_notifications()
+                assert mock_send.call_count == 1
+            assert not os.path.exists(test_file + ".stats")
+        finally:
+            main.PENDING_NOTIFICATIONS_FILE = original_main_file
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_heartbeat_file
+
+    def test_pop_in_priority_order(self):
+        """测试按优先级出队：断电 > 网络 > 信息类"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        queue = notification_queue.NotificationQueue([
+            {"type": "info", "subject": "i"},
+            self._network_notification(True, False),
+            {"type": "power_outage", "subject": "p"},
+        ])
+
+        assert [queue.pop()["type"] for _ in range(3)] == ["power_outage", "network_status", "info"]
+        assert queue.pop() is None
+
+    def test_trim_evicts_lowest_priority_first(self):
+        """测试队列满时先淘汰低优先级通知"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        queue = notification_queue.NotificationQueue()
+        queue.push({"type": "power_outage", "subject": "p1"})
+        for i in range(5):
+            queue.push({"type": "info", "subject": f"i{i}"})
+        queue.push({"type": "power_outage", "subject": "p2"})
+
+        dropped = queue.trim(3)
+
+        assert [n["subject"] for n in dropped] == ["i0", "i1", "i2", "i3"]
+        assert [n["subject"] for n in queue.to_list()] == ["p1", "p2", "i4"]
+
+    def test_schedule_retry_backoff(self):
+        """测试跨周期重试的指数退避与最大尝试次数"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        notification = {"type": "info"}
+        with patch.object(notification_queue, "RETRY_BASE_DELAY", 60), \
+             patch.object(notification_queue, "RETRY_MAX_DELAY", 200), \
+             patch.object(notification_queue, "RETRY_MAX_ATTEMPTS", 3):
+            assert notification_queue.schedule_retry(notification, "ConnectionError", now=1000) == True
+            assert notification["next_attempt_at"] == 1060
+            assert notification_queue.schedule_retry(notification, "ConnectionError", now=1060) == True
+            assert notification["next_attempt_at"] == 1180
+            assert notification_queue.schedule_retry(notification, "ConnectionError", now=1180) == False
+            assert notification["next_attempt_at"] == 1380
+            assert notification["attempts"] == 3
+            assert notification["last_error"] == "ConnectionError"
+
+        assert notification_queue.is_due(notification, now=1379) == False
+        assert notification_queue.is_due(notification, now=1380) == True
+
+    def test_failed_notification_waits_for_next_attempt(self, temp_data_dir):
+        """测试发送失败的通知在退避时间内不再尝试"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([{"type": "test", "subject": "S", "html_body": "<html>B</html>"}], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+
+        try:
+            with patch('app.heartbeat.send_email_with_resend', return_value=(False, None)) as mock_send:
+                heartbeat.process_pending_notifications()
+                heartbeat.process_pending_notifications()
+                assert mock_send.call_count == 1
+
+            remaining = heartbeat._load_pending_notifications()
+            assert remaining[0]["attempts"] == 1
+            assert remaining[0]["next_attempt_at"] > time.time()
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+
+    def test_permanent_failure_moved_to_dead_letter(self, temp_data_dir, mock_env_vars):
+        """测试永久失败的通知移入死信文件"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        class ValidationError(Exception):
+            pass
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        dead_letter_file = os.path.join(temp_data_dir, "dead_letter_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([{"type": "test", "subject": "S", "html_body": "<html>B</html>"}], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        original_dead_letter = heartbeat.DEAD_LETTER_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+        heartbeat.DEAD_LETTER_FILE = dead_letter_file
+
+        try:
+            with patch('resend.Emails.send', side_effect=ValidationError("Invalid `to` field")) as mock_send:
+                heartbeat.process_pending_notifications()
+                # 永久错误不做即时重试
+                assert mock_send.call_count == 1
+
+            assert heartbeat._load_pending_notifications() == []
+            with open(dead_letter_file, 'r') as f:
+                dead_letters = json.load(f)
+            assert dead_letters[0]["last_error"] == "ValidationError"
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+            heartbeat.DEAD_LETTER_FILE = original_dead_letter
+
+    def test_legacy_items_get_stable_ids(self, temp_data_dir):
+        """测试旧通知按内容得到稳定的 id，重复读取不变"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([{"type": "test", "subject": "S", "html_body": "<html>B</html>"}], f)
+
+        first = notification_queue.read_notifications(test_file)
+        second = notification_queue.read_notifications(test_file)
+        assert first[0]["id"] == second[0]["id"]
+        assert notification_queue.idempotency_key(first[0]) == f"notification/{first[0]['id']}"
+
+    def test_drain_acks_each_item_and_keeps_new_items(self, temp_data_dir, mock_env_vars):
+        """测试逐条确认：中途崩溃不重发已送达的通知，发送期间新加入的通知不会丢失"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([
+                {"type": "test", "subject": "S1", "html_body": "<html>1</html>"},
+                {"type": "test", "subject": "S2", "html_body": "<html>2</html>"},
+            ], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+
+        keys = []
+
+        def send_side_effect(subject, html_body, idempotency_key=None):
+            keys.append(idempotency_key)
+            if subject == "S1":
+                # 发送期间其他进程加入新通知
+                heartbeat.notification_queue.save_notifications(
+                    test_file,
+                    heartbeat._load_pending_notifications() +
+                    [{"type": "test", "id": "new", "subject": "S3", "html_body": "<html>3</html>"}]
+                )
+                return True, None
+            raise KeyboardInterrupt  # 模拟发送第二封时进程被终止
+
+        try:
+            with patch('app.heartbeat.send_email_with_resend', side_effect=send_side_effect):
+                with pytest.raises(KeyboardInterrupt):
+                    heartbeat.process_pending_notifications()
+
+            remaining = heartbeat._load_pending_notifications()
+            assert [n["subject"] for n in remaining] == ["S2", "S3"]
+            assert all(key.startswith("notification/") for key in keys)
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
+
+    def test_streaming_reader_matches_json_load(self, temp_data_dir):
+        """测试逐条解析的结果与 json.load 一致（元素跨越读取块边界）"""
+        import sys
+        import io
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        items = [{"type": "test", "subject": f"通知 {i}", "html_body": "<p>" + "x" * i + "</p>", "n": 12345}
+                 for i in range(20)]
+        text = " [\n" + ",\n ".join(json.dumps(item, ensure_ascii=False) for item in items) + "\n] "
+
+        assert list(notification_queue.iter_json_array(io.StringIO(text), chunk_size=7)) == items
+        assert list(notification_queue.iter_json_array(io.StringIO(""), chunk_size=7)) == []
+        with pytest.raises(json.JSONDecodeError):
+            list(notification_queue.iter_json_array(io.StringIO('[{"a": 1}, {"b"'), chunk_size=7))
+
+    def test_journal_applied_and_compacted(self, temp_data_dir):
+        """测试确认日志在读取时生效，压缩后合并到队列文件"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        with open(test_file, 'w') as f:
+            json.dump([
+                {"type": "test", "id": "a", "subject": "A", "html_body": "<p>A</p>"},
+                {"type": "test", "id": "b", "subject": "B", "html_body": "<p>B</p>"},
+            ], f)
+
+        notification_queue.ack_notification(test_file, "a")
+        notification_queue.update_notification(
+            test_file, {"type": "test", "id": "b", "subject": "B", "html_body": "<p>B</p>", "attempts": 1})
+
+        streamed = list(notification_queue.iter_notifications(test_file))
+        assert [(n["id"], n.get("attempts")) for n in streamed] == [("b", 1)]
+        assert notification_queue.read_notifications(test_file) == streamed
+
+        assert notification_queue.main(["compact", test_file]) == 0
+        assert not os.path.exists(test_file + ".journal")
+        with open(test_file, 'r') as f:
+            assert json.load(f) == streamed
+
+    def test_sending_mark_journals_only_id(self, temp_data_dir):
+        """测试发送中标记只记录 id 和到期时间，读取时作为字段更新应用"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        notification = {"type": "test", "id": "a", "subject": "A", "html_body": "<p>A</p>"}
+        with open(test_file, 'w') as f:
+            json.dump([notification], f)
+
+        assert notification_queue.mark_sending(test_file, notification, 1000)
+        with open(test_file + ".journal") as f:
+            assert [json.loads(line) for line in f] == [{"sending": "a", "until": 1000}]
+        queued = notification_queue.read_notifications(test_file)
+        assert queued == [dict(notification, sending_until=1000)]
+        assert list(notification_queue.iter_notifications(test_file)) == queued
+
+        # 重试状态更新保留在标记之后的发送中标记，清除标记后恢复原样
+        notification_queue.update_notification(test_file, dict(notification, attempts=1))
+        assert notification_queue.mark_sending(test_file, notification, 2000)
+        assert notification_queue.read_notifications(test_file) == [dict(notification, attempts=1, sending_until=2000)]
+        notification_queue.clear_sending(test_file, notification)
+        assert notification_queue.read_notifications(test_file) == [dict(notification, attempts=1)]
+
+    def test_rendered_body_compressed_on_disk(self, temp_data_dir):
+        """测试较大的已渲染正文压缩保存，发送时解压得到原内容"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import notification_queue
+        from app import email_templates
+
+        body = "<html><body>\n    <p>服务器 <strong>web-01</strong> 测试通知</p>\n" + "    <p></p>\n" * 50 + "</body></html>"
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        notification_queue.save_notifications(test_file, [
+            {"type": "test", "id": "a", "subject": "A", "html_body": body},
+            {"type": "test", "id": "b", "subject": "B", "html_body": "<p>B</p>"},
+        ])
+
+        with open(test_file, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        assert "html_body" not in stored[0] and stored[0]["html_body_z"].startswith("z1:")
+        assert stored[1]["html_body"] == "<p>B</p>"
+        assert os.path.getsize(test_file) < len(body.encode('utf-8'))
+
+        loaded = notification_queue.load_notifications(test_file)
+        assert email_templates.render_notification(loaded[0]) == ("A", body)
+        with pytest.raises(ValueError):
+            notification_queue.body_of({"html_body_z": "z9:AAAA"})
@@ -0,0 +1,130 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+import time
+
+
+class TestOutageCorrelation:
+    """测试 outage_correlation.py 的站点级事件关联"""
+
+    def test_disabled_without_spool_dir(self):
+        """测试未配置 spool 目录时不启用关联"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import outage_correlation
+
+        with patch.object(outage_correlation, "OUTAGE_SPOOL_DIR", ""):
+            assert outage_correlation.is_enabled() == False
+            assert outage_correlation.record_outage("A", 1, 2) == False
+
+    def test_claim_incident_groups_overlapping_hosts(self, temp_data_dir):
+        """测试重叠的断电窗口被合并到同一个事件"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import outage_correlation
+
+        now = int(time.time())
+        with patch.object(outage_correlation, "OUTAGE_SPOOL_DIR", temp_data_dir):
+            outage_correlation.record_outage("服务器A", now - 600, now)
+            outage_correlation.record_outage("服务器B", now - 590, now + 5)
+            # 与前两台不重叠的历史断电
+            outage_correlation.record_outage("服务器C", now - 90000, now - 86400)
+
+            records, owner = outage_correlation.claim_incident("服务器A", now - 600, now)
+            assert owner == "服务器A"
+            assert [r["server_name"] for r in records] == ["服务器A", "服务器B"]
+
+            # B 的记录已被 A 认领，B 不应再单独报告
+            records_b, owner_b = outage_correlation.claim_incident("服务器B", now - 590, now + 5)
+            assert records_b == []
+            assert owner_b == "服务器A"
+
+    def test_hosts_settling_simultaneously_send_once(self, temp_data_dir):
+        """测试两台主机同时结束关联窗口时只有一台认领整个事件"""
+        import sys
+        import threading
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import outage_correlation
+
+        now = int(time.time())
+        hosts = [("服务器A", now - 600, now), ("服务器B", now - 590, now + 5)]
+        try_claim = outage_correlation._try_claim
+
+        def slow_claim(record_path, claimer):
+            # 拉长两次认领之间的间隔，让两台主机交错执行
+            time.sleep(0.05)
+            return try_claim(record_path, claimer)
+
+        barrier = threading.Barrier(len(hosts))
+        results = {}
+
+        def settle(host):
+            barrier.wait()
+            results[host[0]] = outage_correlation.claim_incident(*host)
+
+        with patch.object(outage_correlation, "OUTAGE_SPOOL_DIR", temp_data_dir), \
+             patch.object(outage_correlation, "_try_claim", side_effect=slow_claim):
+            for host in hosts:
+                outage_correlation.record_outage(*host)
+            threads = [threading.Thread(target=settle, args=(host,)) for host in hosts]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        senders = {name: records for name, (records, owner) in results.items() if records}
+        assert len(senders) == 1
+        (owner, records), = senders.items()
+        assert [r["server_name"] for r in records] == ["服务器A", "服务器B"]
+        assert all(result_owner == owner for _, result_owner in results.values())
+
+    def test_generate_incident_email_escapes_names(self):
+        """测试站点级事件邮件列出全部主机并转义名称"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import outage_correlation
+
+        now = int(time.time())
+        records = [
+            {"server_name": "<b>A</b>", "power_off_ts": now - 300, "power_on_ts": now},
+            {"server_name": "B", "power_off_ts": now - 310, "power_on_ts": now},
+        ]
+        subject, html_body = outage_correlation.generate_incident_email(records)
+
+        assert "2 台服务器" in subject
+        assert "&lt;b&gt;A&lt;/b&gt;" in html_body
+        assert "<b>A</b>" not in html_body
+
+    def test_process_pending_defers_until_settled(self, temp_data_dir):
+        """测试关联窗口结束前断电通知保留在队列中"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+
+        test_file = os.path.join(temp_data_dir, "pending_notifications.log")
+        now = int(time.time())
+        notification = {
+            "type": "power_outage",
+            "server_name": "服务器A",
+            "power_off_ts": now - 600,
+            "power_on_ts": now,
+            "subject": "Outage",
+            "html_body": "<html>Outage</html>"
+        }
+        with open(test_file, 'w') as f:
+            json.dump([notification], f)
+
+        original_file = heartbeat.PENDING_NOTIFICATIONS_FILE
+        heartbeat.PENDING_NOTIFICATIONS_FILE = test_file
+        spool_dir = os.path.join(temp_data_dir, "spool")
+
+        try:
+            with patch.object(heartbeat.outage_correlation, "OUTAGE_SPOOL_DIR", spool_dir), \
+                 patch('app.heartbeat.send_email_with_resend', return_value=(True, None)) as mock_send:
+                heartbeat.process_pending_notifications()
+
+                mock_send.assert_not_called()
+                assert len(heartbeat._load_pending_notifications()) == 1
+        finally:
+            heartbeat.PENDING_NOTIFICATIONS_FILE = original_file
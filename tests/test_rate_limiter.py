@@ -0,0 +1,77 @@
+import pytest
+import os
+from unittest.mock import patch
+
+
+class TestTokenBucket:
+    """测试 rate_limiter.py 的令牌桶"""
+
+    def test_burst_then_wait_for_refill(self, temp_data_dir):
+        """测试突发用完令牌后按速率等待"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.rate_limiter import TokenBucket
+
+        bucket = TokenBucket(os.path.join(temp_data_dir, "rl.json"), rate=2, burst=2)
+        assert bucket.reserve(now=1000) == 0
+        assert bucket.reserve(now=1000) == 0
+        assert bucket.reserve(now=1000) == pytest.approx(0.5)
+        assert bucket.reserve(now=1000.5) == 0
+
+    def test_rate_limited_halves_rate_and_honors_retry_after(self, temp_data_dir):
+        """测试收到 429 后速率减半，并在 Retry-After 期间暂停"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.rate_limiter import TokenBucket
+
+        bucket = TokenBucket(os.path.join(temp_data_dir, "rl.json"), rate=2, burst=2, min_rate=0.1)
+        bucket.reserve(now=1000)
+        bucket.on_rate_limited(retry_after=10, now=1000)
+
+        assert bucket.snapshot()["rate"] == 1.0
+        assert bucket.reserve(now=1005) == pytest.approx(5)
+        assert bucket.reserve(now=1010) == 0
+
+        for _ in range(10):
+            bucket.on_success()
+        assert bucket.snapshot()["rate"] == 2.0
+
+    def test_state_shared_between_processes(self, temp_data_dir):
+        """测试共享数据目录的多个实例使用同一个令牌桶"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.rate_limiter import TokenBucket
+
+        state_file = os.path.join(temp_data_dir, "rl.json")
+        TokenBucket(state_file, rate=1, burst=1).reserve(now=1000)
+
+        assert TokenBucket(state_file, rate=1, burst=1).reserve(now=1000) == pytest.approx(1)
+
+    def test_acquire_times_out(self, temp_data_dir):
+        """测试等待时间超出时限时抛出 RateLimitExceeded"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.rate_limiter import TokenBucket, RateLimitExceeded
+
+        bucket = TokenBucket(os.path.join(temp_data_dir, "rl.json"), rate=0.1, burst=1)
+        bucket.acquire(timeout=1)
+        with patch('time.sleep') as mock_sleep:
+            with pytest.raises(RateLimitExceeded):
+                bucket.acquire(timeout=1)
+            mock_sleep.assert_not_called()
+
+    def test_denied_reserve_not_written(self, temp_data_dir):
+        """测试没有取得令牌时不重写状态文件，之后仍按时间补充"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.rate_limiter import TokenBucket
+
+        bucket = TokenBucket(os.path.join(temp_data_dir, "rl.json"), rate=1, burst=1)
+        assert bucket.reserve(now=1000) == 0
+        with patch.object(bucket, '_write', wraps=bucket._write) as mock_write:
+            assert bucket.reserve(now=1000.25) == pytest.approx(0.75)
+            assert bucket.reserve(now=1000.5) == pytest.approx(0.5)
+            mock_write.assert_not_called()
+
+            assert bucket.reserve(now=1001) == 0
+            assert mock_write.call_count == 1
@@ -0,0 +1,85 @@
+import pytest
+import os
+import asyncio
+from unittest.mock import patch
+
+
+class TestRetryWithDeadline:
+    """测试 retry_utils.py 的错误分类和带时间预算的重试"""
+
+    def test_classify_by_type_and_status_code(self):
+        """测试按异常类型和状态码分类错误"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.retry_utils import classify_error, ERROR_PERMANENT, ERROR_RETRYABLE
+
+        class ValidationError(Exception):
+            pass
+
+        class HttpError(Exception):
+            def __init__(self, code):
+                super().__init__("request failed")
+                self.code = code
+
+        assert classify_error(ValidationError("收件人无效")) == ERROR_PERMANENT
+        assert classify_error(HttpError(403)) == ERROR_PERMANENT
+        assert classify_error(HttpError(429)) == ERROR_RETRYABLE
+        assert classify_error(HttpError(503)) == ERROR_RETRYABLE
+        assert classify_error(ConnectionError("reset")) == ERROR_RETRYABLE
+        # 不再根据异常文本判断
+        assert classify_error(Exception("unauthorized 500")) == ERROR_RETRYABLE
+
+    def test_retry_after_header(self):
+        """测试读取 Retry-After（秒数和 HTTP 日期）"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.retry_utils import get_retry_after
+
+        class RateLimitError(Exception):
+            def __init__(self, headers):
+                super().__init__("rate limited")
+                self.headers = headers
+
+        assert get_retry_after(RateLimitError({"Retry-After": "7"})) == 7.0
+        date_error = RateLimitError({"Retry-After": "Thu, 01 Jan 1970 00:01:40 GMT"})
+        assert get_retry_after(date_error, now=90) == 10.0
+        assert get_retry_after(Exception("no header")) is None
+
+    def test_stops_when_wait_exceeds_budget(self):
+        """测试 Retry-After 超出总时间预算时立即放弃"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.retry_utils import retry_with_deadline
+
+        class RateLimitError(Exception):
+            retry_after = 60
+
+        calls = []
+
+        def func():
+            calls.append(1)
+            raise RateLimitError("rate limited")
+
+        with patch('time.sleep') as mock_sleep:
+            with pytest.raises(RateLimitError):
+                retry_with_deadline(func, max_attempts=5, budget=10)
+            mock_sleep.assert_not_called()
+        assert len(calls) == 1
+
+    def test_async_variant_retries_until_success(self):
+        """测试 asyncio 版本在失败后重试并返回结果"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.retry_utils import async_retry_with_deadline
+
+        attempts = []
+
+        async def func():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("reset")
+            return "ok"
+
+        result = asyncio.run(async_retry_with_deadline(func, max_attempts=4, budget=5, base_delay=0.01))
+        assert result == "ok"
+        assert len(attempts) == 3
@@ -0,0 +1,130 @@
+import pytest
+import os
+import time
+import threading
+
+
+class TestSenderWorker:
+    """测试 sender_worker.py 的后台发送线程"""
+
+    def test_notify_runs_drain_with_latest_status(self):
+        """测试唤醒后以最新的网络状态调用发送函数"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.sender_worker import SenderWorker
+
+        received = []
+        done = threading.Event()
+
+        def drain(status):
+            received.append(status)
+            done.set()
+
+        worker = SenderWorker(drain, idle_interval=60)
+        worker.start()
+        try:
+            worker.notify({"external_network": True})
+            assert done.wait(2)
+            assert received == [{"external_network": True}]
+        finally:
+            worker.stop(timeout=2)
+        assert not worker.is_alive()
+
+    def test_slow_drain_does_not_block_notify(self):
+        """测试发送过程缓慢时，心跳循环的唤醒调用立即返回"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.sender_worker import SenderWorker
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def drain(status):
+            started.set()
+            release.wait(5)
+
+        worker = SenderWorker(drain, idle_interval=60)
+        worker.start()
+        try:
+            worker.notify({"external_network": True})
+            assert started.wait(2)
+            finished = threading.Event()
+            threading.Thread(target=lambda: (worker.notify({"external_network": True}), finished.set())).start()
+            assert finished.wait(0.5)
+        finally:
+            release.set()
+            worker.stop(timeout=2)
+
+    def test_drain_error_keeps_worker_alive(self):
+        """测试发送函数抛出异常后线程继续运行"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.sender_worker import SenderWorker
+
+        calls = []
+        second = threading.Event()
+
+        def drain(status):
+            calls.append(status)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            second.set()
+
+        worker = SenderWorker(drain, idle_interval=0.05)
+        worker.start()
+        try:
+            worker.notify({"external_network": True})
+            assert second.wait(2)
+            assert worker.is_alive()
+        finally:
+            worker.stop(timeout=2)
+
+    def test_wake_socket_notifies_worker(self, temp_data_dir):
+        """测试通过 Unix 套接字唤醒发送线程，停止时不必等待超时"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app.sender_worker import WakeListener, wake_sender
+
+        if not hasattr(__import__('socket'), "AF_UNIX"):
+            pytest.skip("平台不支持 Unix 套接字")
+
+        path = os.path.join(temp_data_dir, "wake.sock")
+        assert wake_sender(path) == False  # 没有监听者时静默忽略
+
+        woken = threading.Event()
+        listener = WakeListener(woken.set, path=path)
+        assert listener.bind()
+        listener.start()
+        try:
+            assert wake_sender(path) == True
+            assert woken.wait(2)
+        finally:
+            started = time.monotonic()
+            listener.stop(timeout=3)
+        assert time.monotonic() - started < 0.5
+        assert not listener.is_alive()
+        assert not os.path.exists(path)
+
+
+class TestRecoveryProbe:
+    """测试 heartbeat.py 外网中断期间的快速恢复探测"""
+
+    def test_recovery_wakes_sender_before_next_cycle(self, mock_env_vars):
+        """测试外网恢复后立即唤醒发送线程"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import heartbeat
+        from unittest.mock import patch, MagicMock
+
+        sender = MagicMock()
+        recovered = {"timestamp": 1, "internal_network": True, "external_network": True, "dns_resolution": True}
+
+        with patch.object(heartbeat, 'HEARTBEAT_INTERVAL', 0.5), \
+             patch.object(heartbeat, 'RECOVERY_PROBE_INTERVAL', 0.05), \
+             patch('app.heartbeat.probe_external_network', side_effect=[False, True]), \
+             patch('app.heartbeat.check_network_connectivity', return_value=recovered), \
+             patch('app.heartbeat.save_network_status') as mock_save:
+            heartbeat.wait_for_next_cycle(sender, {"external_network": False})
+
+        sender.notify.assert_called_once_with(recovered)
+        mock_save.assert_called_once_with(recovered)
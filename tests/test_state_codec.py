@@ -0,0 +1,64 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+
+class TestStateCodec:
+    """测试 state_codec.py 的二进制状态文件格式"""
+
+    def test_status_and_history_round_trip(self, temp_data_dir):
+        """测试网络状态和历史记录以固定长度记录保存并原样读回"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import state_codec
+
+        status = {"timestamp": 1770000000, "internal_network": True, "external_network": False,
+                  "dns_resolution": True}
+        history = {"last_internal_network": False, "last_external_network": True}
+        status_file = os.path.join(temp_data_dir, "network_status.log")
+        history_file = os.path.join(temp_data_dir, "network_history.log")
+
+        state_codec.write_state(status_file, state_codec.KIND_NETWORK_STATUS, status, fmt="binary")
+        state_codec.write_state(history_file, state_codec.KIND_NETWORK_HISTORY, history, fmt="binary")
+
+        assert os.path.getsize(status_file) == 6 + 9
+        assert state_codec.read_state(status_file, state_codec.KIND_NETWORK_STATUS) == status
+        assert state_codec.read_state(history_file, state_codec.KIND_NETWORK_HISTORY) == history
+        with pytest.raises(state_codec.StateFormatError):
+            state_codec.read_state(status_file, state_codec.KIND_NETWORK_HISTORY)
+
+    def test_legacy_json_detected(self, temp_data_dir, mock_env_vars):
+        """测试切换为二进制格式后仍能读取旧的 JSON 文件，写入时转换"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+
+        history_file = os.path.join(temp_data_dir, "network_history.log")
+        history = {"last_internal_network": True, "last_external_network": False}
+        with open(history_file, 'w') as f:
+            json.dump(history, f)
+
+        with patch.object(main, 'NETWORK_HISTORY_FILE', history_file), \
+             patch.object(main.state_store.state_codec, 'STATE_FORMAT', "binary"):
+            assert main._load_network_history() == history
+            main._save_network_history(history)
+            with open(history_file, 'rb') as f:
+                assert f.read(4) == b"PMST"
+            assert main._load_network_history() == history
+
+    def test_dump_cli(self, temp_data_dir, capsys):
+        """测试 dump 命令输出可读的 JSON"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import state_codec
+
+        status_file = os.path.join(temp_data_dir, "network_status.log")
+        state_codec.write_state(status_file, state_codec.KIND_NETWORK_STATUS,
+                                {"timestamp": 1, "internal_network": True, "external_network": True,
+                                 "dns_resolution": False}, fmt="binary")
+
+        assert state_codec.main(["dump", status_file]) == 0
+        output = capsys.readouterr().out
+        assert "binary v1 network_status" in output
+        assert '"dns_resolution": false' in output
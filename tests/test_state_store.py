@@ -0,0 +1,221 @@
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+
+def _open(backend, temp_data_dir):
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from app import state_store
+
+    if backend == "sqlite":
+        return state_store.SqliteStateStore(os.path.join(temp_data_dir, "state.db"))
+    return state_store.FileStateStore(os.path.join(temp_data_dir, "pending_notifications.log"),
+                                      os.path.join(temp_data_dir, "network_status.log"),
+                                      os.path.join(temp_data_dir, "network_history.log"))
+
+
+def _network_change(previous_external, current_external):
+    return {"type": "network_status",
+            "previous_status": {"last_internal_network": True, "last_external_network": previous_external},
+            "current_status": {"internal_network": True, "external_network": current_external}}
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+class TestStateStore:
+    """测试 state_store.py 的文件后端和 SQLite 后端行为一致"""
+
+    def test_state_round_trip(self, temp_data_dir, backend):
+        """测试网络状态和历史记录的读写"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import state_store
+
+        store = _open(backend, temp_data_dir)
+        assert store.read_state(state_store.STATE_NETWORK_HISTORY) is None
+
+        history = {"last_internal_network": True, "last_external_network": False}
+        store.write_state(state_store.STATE_NETWORK_HISTORY, history)
+        assert store.read_state(state_store.STATE_NETWORK_HISTORY) == history
+
+    def test_modify_drain_and_ack(self, temp_data_dir, backend):
+        """测试入队后按优先级领取，确认的通知被删除，重试的通知等待下一次尝试"""
+        store = _open(backend, temp_data_dir)
+
+        def push(notifications):
+            notifications.extend([
+                {"type": "test", "id": "info", "subject": "信息", "html_body": "<p>1</p>"},
+                {"type": "power_outage", "id": "outage", "subject": "断电", "html_body": "<p>2</p>"},
+            ])
+            return notifications, len(notifications)
+
+        assert store.modify_queue(push) == 2
+        assert store.has_due(now=1000) == True
+
+        drained = []
+        for notification in store.iter_due(now=1000):
+            drained.append(notification["id"])
+            if notification["id"] == "outage":
+                store.ack(notification["id"])
+            else:
+                notification["next_attempt_at"] = 2000
+                store.update(notification)
+        store.checkpoint()
+
+        assert drained == ["outage", "info"]
+        assert [n["id"] for n in store.load_queue()] == ["info"]
+        assert store.has_due(now=1500) == False
+        assert store.has_due(now=2000) == True
+
+    def test_unprocessed_items_released(self, temp_data_dir, backend):
+        """测试中途停止发送时未处理的通知保留在队列中，下一轮可再次发送"""
+        store = _open(backend, temp_data_dir)
+        store.save_queue([
+            {"type": "test", "id": "a", "subject": "A", "html_body": "<p>A</p>"},
+            {"type": "test", "id": "b", "subject": "B", "html_body": "<p>B</p>"},
+        ])
+
+        for notification in store.iter_due(now=1000):
+            store.ack(notification["id"])
+            break
+
+        assert [n["id"] for n in store.iter_due(now=1001)] == ["b"]
+        assert store.drop(lambda n: n["id"] == "b") == 1
+        assert store.load_queue() == []
+
+    def test_avoided_sends_counter(self, temp_data_dir, backend):
+        """测试避免发送次数累加后读取并清零"""
+        store = _open(backend, temp_data_dir)
+        store.record_avoided_sends(2)
+        store.record_avoided_sends(3)
+
+        assert store.pop_avoided_sends() == 5
+        assert store.pop_avoided_sends() == 0
+
+    def test_push_merges_cancels_and_trims(self, temp_data_dir, backend):
+        """测试入队时同类网络通知合并或抵消，重复断电通知被忽略，超出上限时淘汰低优先级通知"""
+        store = _open(backend, temp_data_dir)
+
+        outage = {"type": "power_outage", "server_name": "s", "power_off_ts": 100}
+        assert store.push(dict(outage), 10)[:2] == ("added", 1)
+        assert store.push(dict(outage), 10)[:2] == ("duplicate", 1)
+
+        assert store.push(_network_change(True, False), 10)[:2] == ("added", 2)
+        result, queue_len, dropped = store.push(_network_change(False, True), 10)
+        assert (result, queue_len, dropped) == ("cancelled", 1, [])
+
+        store.push(_network_change(True, False), 10)
+        assert store.push(_network_change(False, True), 10)[0] == "cancelled"
+        store.push(_network_change(True, False), 10)
+        # 内网在两次外网变化之间中断：合并后的净变化仍然存在
+        merged_change = _network_change(False, True)
+        merged_change["previous_status"]["last_internal_network"] = False
+        merged_change["current_status"]["internal_network"] = False
+        assert store.push(merged_change, 10)[0] == "superseded"
+        queued = store.load_queue()
+        assert [n["type"] for n in queued] == ["power_outage", "network_status"]
+        assert queued[1]["superseded_count"] == 1
+        assert queued[1]["previous_status"]["last_external_network"] == True
+
+        store.push({"type": "test", "subject": "信息"}, 10)
+        result, queue_len, dropped = store.push({"type": "test", "subject": "信息 2"}, 2)
+        assert (result, queue_len) == ("added", 2)
+        assert [n["subject"] for n in dropped] == ["信息", "信息 2"]
+        assert store.pop_avoided_sends() == 1 + 2 + 2 + 1
+
+    def test_cancel_during_drain(self, temp_data_dir, backend):
+        """测试发送方读取通知后到达的反向变化：旧通知不再单独发出，或反向变化也被保留发送"""
+        store = _open(backend, temp_data_dir)
+        store.push(_network_change(True, False), 10)
+
+        sent = []
+        for notification in store.iter_due():
+            if not sent and len(store.load_queue()) == 1:
+                # 发送方已读取“外网中断”，发送前外网恢复
+                store.push(_network_change(False, True), 10)
+            if store.begin_send(notification):
+                sent.append(notification["current_status"]["external_network"])
+                store.ack(notification["id"])
+        for notification in store.iter_due():
+            assert store.begin_send(notification)
+            sent.append(notification["current_status"]["external_network"])
+            store.ack(notification["id"])
+
+        # 不能只发出过期的“外网中断”而丢失“外网恢复”
+        assert sent in ([], [False, True])
+        assert store.load_queue() == []
+
+    def test_change_during_send_not_cancelled(self, temp_data_dir, backend):
+        """测试通知已标记为发送中时，反向变化单独入队而不是取消它"""
+        store = _open(backend, temp_data_dir)
+        store.push(_network_change(True, False), 10)
+
+        sent = []
+        for notification in store.iter_due():
+            assert store.begin_send(notification)
+            # 正在调用发送 API 时外网恢复，之后又中断
+            assert store.push(_network_change(False, True), 10)[0] == "added"
+            assert store.push(_network_change(True, False), 10)[0] == "cancelled"
+            assert store.push(_network_change(False, True), 10)[0] == "added"
+            sent.append(notification["current_status"]["external_network"])
+            store.ack(notification["id"])
+            break
+        store.checkpoint()
+
+        queued = store.load_queue()
+        assert [n["current_status"]["external_network"] for n in queued] == [True]
+        assert "sending_until" not in queued[0]
+        assert sent == [False]
+
+
+class TestSqliteMigration:
+    """测试旧版本 SQLite 数据库的迁移"""
+
+    def test_dedup_key_column_added(self, temp_data_dir):
+        """测试打开没有 dedup_key 列的数据库时补上该列并回填，之后可以按去重键合并"""
+        import sys
+        import sqlite3
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import state_store
+
+        db_path = os.path.join(temp_data_dir, "state.db")
+        body = {"type": "power_outage", "id": "old", "server_name": "s", "power_off_ts": 100}
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE queue (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE,"
+                     " priority INTEGER NOT NULL, next_attempt_at REAL NOT NULL DEFAULT 0,"
+                     " claimed_until REAL NOT NULL DEFAULT 0, body TEXT NOT NULL)")
+        conn.execute("INSERT INTO queue (id, priority, body) VALUES (?, ?, ?)", ("old", 0, json.dumps(body)))
+        conn.commit()
+        conn.close()
+
+        store = state_store.SqliteStateStore(db_path)
+        assert store.push({"type": "power_outage", "server_name": "s", "power_off_ts": 100}, 10)[:2] == \
+            ("duplicate", 1)
+        assert [n["id"] for n in store.load_queue()] == ["old"]
+
+
+class TestSqliteBackendIntegration:
+    """测试 STATE_BACKEND=sqlite 时 main.py 入队、heartbeat.py 发送"""
+
+    def test_enqueue_and_drain(self, temp_data_dir, mock_env_vars):
+        """测试通过 SQLite 后端入队和发送通知"""
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from app import main
+        from app import heartbeat
+
+        notification = {"type": "test", "subject": "S1", "html_body": "<html>1</html>"}
+        with patch.object(main.state_store, 'STATE_BACKEND', "sqlite"), \
+             patch.object(main.state_store, 'STATE_DB', os.path.join(temp_data_dir, "state.db")), \
+             patch.object(main.state_store, '_sqlite_stores', {}), \
+             patch('app.main.is_under_pressure', return_value=False), \
+             patch('app.heartbeat.send_email_with_resend', return_value=(True, None)) as mock_send:
+            assert main._add_pending_notification(notification) == True
+            assert [n["subject"] for n in heartbeat._load_pending_notifications()] == ["S1"]
+
+            heartbeat.process_pending_notifications()
+
+            mock_send.assert_called_once()
+            assert heartbeat._load_pending_notifications() == []
+        assert not os.path.exists(os.path.join(temp_data_dir, "pending_notifications.log"))